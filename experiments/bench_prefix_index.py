@@ -0,0 +1,120 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+
+Benchmark of ruleset matching with the prefix index against the compiled expression
+(one expression per rule) on synthetic rules and flows.
+
+Example usage:
+
+```sh
+python -m experiments.bench_prefix_index --n_rules 10000 100000
+```
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import polars as pl
+
+# Add parent directory to path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from nirs.iptables.compiled import CompiledRuleset
+from nirs.iptables.match import with_ip_int_columns
+from nirs.iptables.parser import parse_iptables_rule
+from nirs.iptables.prefix_index import PrefixIndex
+
+
+def random_ips(rng: np.random.Generator, n: int) -> list[str]:
+    octets = rng.integers(0, 256, size=(n, 4))
+    return [f"{a}.{b}.{c}.{d}" for a, b, c, d in octets]
+
+
+def random_rules(rng: np.random.Generator, n: int) -> list[dict]:
+    formats = [
+        "-A FORWARD -s {ip}/{prefix} -j DROP",
+        "-A FORWARD -d {ip}/{prefix} -j DROP",
+        "-A FORWARD -d {ip}/{prefix} -p {protocol} -j DROP",
+        "-A FORWARD -d {ip}/{prefix} -p {protocol} --dport {port} -j DROP",
+    ]
+    rules = []
+    for ip in random_ips(rng, n):
+        rule_str = formats[rng.integers(0, len(formats))].format(
+            ip=ip,
+            prefix=rng.choice([32, 32, 32, 24, 16]),
+            protocol=rng.choice(["tcp", "udp"]),
+            port=rng.integers(1, 1024),
+        )
+        rules.append(parse_iptables_rule(rule_str))
+    return rules
+
+
+def random_flows(rng: np.random.Generator, n: int) -> pl.DataFrame:
+    X = pl.DataFrame({
+        "idx": np.arange(n),
+        "src_ip": random_ips(rng, n),
+        "dst_ip": random_ips(rng, n),
+        "src_port": rng.integers(1, 65536, n),
+        "dst_port": rng.integers(1, 1024, n),
+        "protocol": rng.choice(["tcp", "udp", "icmp"], n),
+        "src_data": rng.integers(0, 2, n),
+        "dst_data": rng.integers(0, 2, n),
+    })
+    return with_ip_int_columns(X)
+
+
+def timeit(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - tic)
+    return best
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Prefix index benchmark.")
+    parser.add_argument("--n_rules", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--n_flows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--max_expr_rules",
+        type=int,
+        default=1_000,
+        help="Run the expression baseline only up to this number of rules. Default: 1000.",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    X = random_flows(rng, args.n_flows)
+
+    for n_rules in sorted(set(args.n_rules + [min(args.max_expr_rules, min(args.n_rules))])):
+        rules = random_rules(rng, n_rules)
+
+        tic = time.perf_counter()
+        index = PrefixIndex(rules)
+        build_time = time.perf_counter() - tic
+
+        index_time = timeit(lambda: index.evaluate(X))
+        mask, _ = index.evaluate(X)
+
+        print(f"rules={n_rules:>7} flows={args.n_flows}")
+        print(f"  prefix index: build {build_time:.3f}s, match {index_time:.3f}s ({mask.sum()} blocked)")
+
+        if n_rules <= args.max_expr_rules:
+            compiled = CompiledRuleset(rules, index_min_rules=n_rules + 1)
+            expr_time = timeit(lambda: compiled.evaluate(X), repeat=1)
+            expr_mask, _ = compiled.evaluate(X)
+            assert (expr_mask == mask).all()
+            print(f"  expression:   match {expr_time:.3f}s")
@@ -26,11 +26,146 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
 from nirs.eval import eval_nirs
+from nirs.replay import eval_nirs_replay
+from nirs.streaming import eval_nirs_streaming, write_flows
+from nirs.scheduler import EventScheduler, eval_nirs_events
+from nirs.metrics import OnlineMetrics, time_to_block
 from nirs.datasets import load_dataset
-from nirs import WindowNIRS, HeuristicNIRS, OllamaNIRS
+from nirs import WindowNIRS, HeuristicNIRS, OllamaNIRS, SetCoverNIRS
 from nids.utils import apply_quantile_threshold
 
 from nirs.parse_args import get_args, get_resfile_name
+from nirs.memory import MemoryTracker, peak_rss_bytes
+from nirs.profiling import StageTimer
+
+
+def get_nirs_factory(
+    nirs_name: str,
+    max_alert_window_idle_ms: float,
+    max_alert_window_len_ms: float,
+    benign_traffic_window_len_ms: float,
+    max_rules: int,
+    eps: float = 0.1,
+    k_prompt: int = 10,
+    max_window_bytes: int | None = None,
+    top_k: int = 1,
+    prefix_lengths: tuple[int, ...] | None = None,
+    compact_ruleset: bool = False,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 300.0,
+    max_retries: int = 3,
+):
+    """
+    Args:
+        nirs_name (str): base, heuristic, setcover or ollama.
+        eps (float): max fraction of blocked flows in benign_window (HeuristicNIRS and SetCoverNIRS only).
+        k_prompt (int): max number of examples from each window in the LLM prompt (OllamaNIRS only).
+        max_window_bytes (int | None): byte budget of the NIRS windows.
+        top_k (int): max number of rules added at each update (HeuristicNIRS only).
+        prefix_lengths (tuple[int, ...] | None): lengths of the networks that can be blocked (HeuristicNIRS and SetCoverNIRS only),
+            None for the default of the NIRS.
+        compact_ruleset (bool): compact the ruleset after each update (see `Ruleset.compact`).
+        connect_timeout, read_timeout (float): timeouts in seconds of the requests to the Ollama server (OllamaNIRS only).
+        max_retries (int): max number of retries of a failed request to the Ollama server (OllamaNIRS only).
+
+    Returns:
+        Callable[[], WindowNIRS]: function creating a new NIRS.
+    """
+
+    # keep the default prefix lengths of the NIRS unless they are given
+    prefix_kwargs = {} if prefix_lengths is None else {"prefix_lengths": tuple(prefix_lengths)}
+
+    match nirs_name:
+        case "base":
+            # NOTE: BaseNIRS does nothing and should only be used for debugging
+            NIRS_Factory = lambda: WindowNIRS(
+                max_alert_window_idle_ms=max_alert_window_idle_ms,
+                max_alert_window_len_ms=max_alert_window_len_ms,
+                benign_traffic_window_len_ms=benign_traffic_window_len_ms,
+                max_rules=max_rules,
+                compact_ruleset=compact_ruleset,
+                max_window_bytes=max_window_bytes,
+            )
+        case "heuristic":
+            NIRS_Factory = lambda: HeuristicNIRS(
+                max_alert_window_idle_ms=max_alert_window_idle_ms,
+                max_alert_window_len_ms=max_alert_window_len_ms,
+                benign_traffic_window_len_ms=benign_traffic_window_len_ms,
+                max_rules=max_rules,
+                frac_benign_tolerance=eps,
+                compact_ruleset=compact_ruleset,
+                max_window_bytes=max_window_bytes,
+                top_k=top_k,
+                **prefix_kwargs,
+            )
+        case "setcover":
+            NIRS_Factory = lambda: SetCoverNIRS(
+                max_alert_window_idle_ms=max_alert_window_idle_ms,
+                max_alert_window_len_ms=max_alert_window_len_ms,
+                benign_traffic_window_len_ms=benign_traffic_window_len_ms,
+                max_rules=max_rules,
+                frac_benign_tolerance=eps,
+                **prefix_kwargs,
+                compact_ruleset=compact_ruleset,
+                max_window_bytes=max_window_bytes,
+            )
+
+        case "ollama":
+            NIRS_Factory = lambda: OllamaNIRS(
+                max_alert_window_idle_ms=max_alert_window_idle_ms,
+                max_alert_window_len_ms=max_alert_window_len_ms,
+                benign_traffic_window_len_ms=benign_traffic_window_len_ms,
+                max_rules=max_rules,
+                num_examples_prompt=k_prompt,
+                compact_ruleset=compact_ruleset,
+                max_window_bytes=max_window_bytes,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                max_retries=max_retries,
+            )
+
+        case _:
+            raise NotImplementedError
+
+    return NIRS_Factory
+
+
+def run_eval(
+    df: pl.DataFrame,
+    nirs: WindowNIRS,
+    update_time_ms: float,
+    seed: int,
+    memory_tracker: MemoryTracker | None = None,
+    replay_speed: float | None = None,
+    scheduler: EventScheduler | None = None,
+    metrics: OnlineMetrics | None = None,
+    streaming_file: str | None = None,
+) -> pl.DataFrame:
+    if streaming_file is not None:
+        # out-of-core evaluation of the flows written to disk (the dataset is sorted, so are the results)
+        write_flows(df, streaming_file)
+        print(f"Flows saved to {streaming_file}")
+        streaming_output = os.path.splitext(streaming_file)[0] + "_results.parquet"
+        eval_nirs_streaming(streaming_file, nirs, streaming_output, update_time_ms, seed, memory_tracker=memory_tracker, metrics=metrics)
+        return pl.read_parquet(streaming_output)
+
+    if scheduler is not None:
+        res_df = eval_nirs_events(df, nirs, scheduler, seed, memory_tracker=memory_tracker, metrics=metrics)
+        print(f"Updates: {len(scheduler.update_times)}")
+        return res_df
+
+    if replay_speed is None:
+        return eval_nirs(df, nirs, update_time_ms, seed, memory_tracker=memory_tracker, metrics=metrics)
+
+    res_df, updates_df = eval_nirs_replay(
+        df, nirs, update_time_ms, seed, speed=replay_speed, memory_tracker=memory_tracker, metrics=metrics
+    )
+
+    print(f"Updates: {len(updates_df)}")
+    print(f"Mean update time: {updates_df['update_seconds'].mean()} seconds")
+    print(f"Mean activation delay: {(updates_df['t_active'] - updates_df['t_update']).mean() / 1000} seconds (trace time)")
+
+    return res_df
 
 
 def eval_nirs_real(
@@ -40,6 +175,11 @@ def eval_nirs_real(
     fpr: float,
     update_time_ms: float,
     seed: int,
+    memory_tracker: MemoryTracker | None = None,
+    replay_speed: float | None = None,
+    scheduler: EventScheduler | None = None,
+    metrics: OnlineMetrics | None = None,
+    streaming_file: str | None = None,
 ) -> pl.DataFrame:
     # build a single dataframe for everything
     df = df.with_columns(
@@ -59,7 +199,7 @@ def eval_nirs_real(
     print(f"FPR: {real_fpr}")
     print(f"TPR: {tpr}")
 
-    res_df = eval_nirs(df, nirs, update_time_ms, seed)
+    res_df = run_eval(df, nirs, update_time_ms, seed, memory_tracker, replay_speed, scheduler, metrics, streaming_file)
 
     return res_df
 
@@ -69,6 +209,11 @@ def eval_nirs_ideal(
     nirs: WindowNIRS,
     update_time_ms: float,
     seed: int,
+    memory_tracker: MemoryTracker | None = None,
+    replay_speed: float | None = None,
+    scheduler: EventScheduler | None = None,
+    metrics: OnlineMetrics | None = None,
+    streaming_file: str | None = None,
 ) -> pl.DataFrame:
     # build a single dataframe for everything
     df = df.with_columns(
@@ -77,7 +222,7 @@ def eval_nirs_ideal(
         pl.col("label").alias("is_alert"),
     )
 
-    res_df = eval_nirs(df, nirs, update_time_ms, seed)
+    res_df = run_eval(df, nirs, update_time_ms, seed, memory_tracker, replay_speed, scheduler, metrics, streaming_file)
 
     return res_df
 
@@ -106,36 +251,49 @@ if __name__ == "__main__":
     print(f"FPR: {fpr}")
     print(f"Update time: {update_time_ms}")
     print(f"Seed: {seed}")
+    print(f"Compact ruleset: {args.compact_ruleset}")
+
+    if args.nirs == "heuristic":
+        print(f"Epsilon: {args.eps}")
+        print(f"Rules per update: {args.top_k}")
+        print(f"Prefix lengths: {args.prefix_lengths}")
+    elif args.nirs == "setcover":
+        print(f"Epsilon: {args.eps}")
+        print(f"Prefix lengths: {args.prefix_lengths}")
+    elif args.nirs == "ollama":
+        print(f"Number of flow examples in the LLM prompt: {args.k_prompt}")
+        print(f"Ollama timeouts: {args.connect_timeout}s (connect), {args.read_timeout}s (read), retries: {args.max_retries}")
+
+    NIRS_Factory = get_nirs_factory(
+        nirs_name,
+        max_alert_window_idle_ms=max_alert_window_idle_ms,
+        max_alert_window_len_ms=max_alert_window_len_ms,
+        benign_traffic_window_len_ms=benign_traffic_window_len_ms,
+        max_rules=max_rules,
+        eps=args.eps,
+        k_prompt=args.k_prompt,
+        max_window_bytes=args.max_window_bytes,
+        top_k=args.top_k,
+        prefix_lengths=args.prefix_lengths,
+        compact_ruleset=args.compact_ruleset,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        max_retries=args.max_retries,
+    )
 
-    match args.nirs:
-        case "base":
-            # NOTE: BaseNIRS does nothing and should only be used for debugging
-            NIRS_Factory = lambda: WindowNIRS(
-                max_alert_window_idle_ms=max_alert_window_idle_ms,
-                max_alert_window_len_ms=max_alert_window_len_ms,
-                benign_traffic_window_len_ms=benign_traffic_window_len_ms,
-                max_rules=max_rules,
-            )
-        case "heuristic":
-            print(f"Epsilon: {args.eps}")
-            NIRS_Factory = lambda: HeuristicNIRS(
-                max_alert_window_idle_ms=max_alert_window_idle_ms,
-                max_alert_window_len_ms=max_alert_window_len_ms,
-                benign_traffic_window_len_ms=benign_traffic_window_len_ms,
-                max_rules=max_rules,
-                frac_benign_tolerance=args.eps,
-            )
-
-        case "ollama":
-            print(f"Number of flow examples in the LLM prompt: {args.k_prompt}")
-            NIRS_Factory = lambda: OllamaNIRS(
-                max_alert_window_idle_ms=max_alert_window_idle_ms,
-                max_alert_window_len_ms=max_alert_window_len_ms,
-                benign_traffic_window_len_ms=benign_traffic_window_len_ms,
-                max_rules=max_rules,
-                num_examples_prompt=args.k_prompt,
+    memory_tracker = MemoryTracker() if args.memory_file is not None else None
+    metrics = OnlineMetrics(by="type") if args.metrics_file is not None else None
+
+    match args.schedule:
+        case "grid":
+            scheduler = None
+        case "events":
+            print(f"Min interval: {args.min_interval_ms}, debounce: {args.debounce_ms}, max delay: {args.max_delay_ms}")
+            scheduler = EventScheduler(
+                min_interval_ms=args.min_interval_ms,
+                debounce_ms=args.debounce_ms,
+                max_delay_ms=args.max_delay_ms,
             )
-
         case _:
             raise NotImplementedError
 
@@ -146,16 +304,39 @@ if __name__ == "__main__":
 
     if args.nids == "ideal":
         nirs = NIRS_Factory()
-        res_df = eval_nirs_ideal(df, nirs, update_time_ms, seed)
+        if args.trace_file is not None:
+            nirs.timer = StageTimer()
+        res_df = eval_nirs_ideal(
+            df, nirs, update_time_ms, seed, memory_tracker, args.replay_speed, scheduler, metrics, args.streaming_file
+        )
     else:
         nids_pred = pl.read_csv(
             f"results/temp/nids/{args.nids}_{args.dataset}_seed{args.seed}_pred.csv"
         )["pred"]
         nirs = NIRS_Factory()
-        res_df = eval_nirs_real(df, nirs, nids_pred, fpr, update_time_ms, seed)
+        if args.trace_file is not None:
+            nirs.timer = StageTimer()
+        res_df = eval_nirs_real(
+            df, nirs, nids_pred, fpr, update_time_ms, seed, memory_tracker, args.replay_speed, scheduler, metrics, args.streaming_file
+        )
 
     toc = time.perf_counter()
     print(f"Time: {toc - tic}")
+    print(f"Peak RSS: {peak_rss_bytes() / 2**20:.1f} MiB")
+
+    if metrics is not None:
+        metrics.to_polars().write_csv(args.metrics_file)
+        print(metrics.time_to_block())
+        print(f"Metrics saved to {args.metrics_file}")
+
+    if memory_tracker is not None:
+        memory_tracker.write_jsonl(args.memory_file)
+        print(f"Memory usage saved to {args.memory_file}")
+
+    if args.trace_file is not None:
+        nirs.timer.write_jsonl(args.trace_file)
+        print(nirs.timer.summary())
+        print(f"Trace saved to {args.trace_file}")
 
     outdir = "results/temp"
     if not os.path.exists(outdir):
@@ -169,7 +350,16 @@ if __name__ == "__main__":
         args.eps, 
         args.k_prompt, 
         seed, 
-        update_time_ms
+        update_time_ms,
+        args.top_k,
+        args.prefix_lengths,
+        args.replay_speed,
+        args.schedule,
+        args.min_interval_ms,
+        args.debounce_ms,
+        args.max_delay_ms,
+        args.max_window_bytes,
+        args.compact_ruleset,
     )
 
     outfile = os.path.join(outdir, outfile)
@@ -187,3 +377,6 @@ if __name__ == "__main__":
 
     print(f"CBR: {cbr}")
     print(f"WBR: {wbr}")
+
+    if args.replay_speed is not None:
+        print(time_to_block(df, res_df, by="type"))
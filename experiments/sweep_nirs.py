@@ -0,0 +1,267 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+
+Parameter sweep of `experiments/run_nirs.py` over fpr x seed x update_time_ms x max_window_bytes x compact_ruleset
+x eps, top_k and prefix_lengths (or k_prompt), for the parameters that apply to the NIRS.
+
+The dataset is loaded and preprocessed once, written to an uncompressed Arrow IPC file and
+memory-mapped by the worker processes, which run the evaluations in parallel with a bounded
+number of Polars threads each. Configurations whose result file already exists are skipped.
+
+Example usage:
+
+```sh
+python -m experiments.sweep_nirs --nirs heuristic --fpr 0.001 0.01 0.1 --seed 1 2 3 4 5 --n_workers 8
+python -m experiments.sweep_nirs --nirs heuristic --top_k 1 3 --prefix_lengths 32 32,24 32,24,16
+```
+"""
+import argparse
+import contextlib
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import polars as pl
+
+# Add parent directory to path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from experiments.run_nirs import eval_nirs_ideal, eval_nirs_real, get_nirs_factory
+from nirs.datasets import load_dataset
+from nirs.parse_args import DEFAULT_EPS, get_nids_pred_filename, get_resfile_name
+
+MAX_ALERT_WINDOW_IDLE_MS = 60_000
+MAX_ALERT_WINDOW_LEN_MS = 600_000
+BENIGN_TRAFFIC_WINDOW_LEN_MS = 600_000
+MAX_RULES = 10
+
+# dataset shared by the jobs of a worker process (memory-mapped, see `init_worker`)
+_df: pl.DataFrame | None = None
+
+
+def get_sweep_args():
+
+    parser = argparse.ArgumentParser(
+        prog="sweep_nirs", description="Parallel parameter sweep of NIRS experiments.", epilog=""
+    )
+
+    parser.add_argument("--nids", type=str, default="rf", help="NIDS to be used for the experiments. Options: ideal, rf.")
+    parser.add_argument("--dataset", type=str, default="nb15", help="dataset to be used for the experiments. Options: nb15.")
+    parser.add_argument("--nirs", type=str, default="heuristic", help="NIRS to be used for the experiments. Options: base, heuristic, setcover, ollama.")
+    parser.add_argument("--fpr", type=float, nargs="+", default=[0.1], help="False positive rates.")
+    parser.add_argument("--eps", type=float, nargs="+", default=[DEFAULT_EPS], help="Values of eps (HeuristicNIRS and SetCoverNIRS only).")
+    parser.add_argument("--top_k", type=int, nargs="+", default=[1], help="Values of top_k (HeuristicNIRS only).")
+    parser.add_argument(
+        "--prefix_lengths",
+        type=lambda s: tuple(int(prefix_len) for prefix_len in s.split(",")),
+        nargs="+",
+        default=[None],
+        help="Sets of prefix lengths, comma-separated, e.g. 32 32,24 32,24,16 (HeuristicNIRS and SetCoverNIRS only). Default: the default of the NIRS.",
+    )
+    parser.add_argument("--k_prompt", type=int, nargs="+", default=[10], help="Values of k_prompt (OllamaNIRS only).")
+    parser.add_argument(
+        "--max_window_bytes",
+        type=int,
+        nargs="+",
+        default=[None],
+        help="Byte budgets of the NIRS windows. Default: no budget.",
+    )
+    parser.add_argument(
+        "--compact_ruleset",
+        type=int,
+        nargs="+",
+        choices=[0, 1],
+        default=[0],
+        help="Whether the ruleset is compacted after each update (0: no, 1: yes). Default: 0.",
+    )
+    parser.add_argument("--update_time_ms", type=int, nargs="+", default=[1_800_000], help="Update times in milliseconds.")
+    parser.add_argument("--seed", type=int, nargs="+", default=[42], help="Seeds used for PRNG.")
+    parser.add_argument("--n_workers", type=int, default=os.cpu_count(), help="Number of worker processes. Default: number of CPUs.")
+    parser.add_argument(
+        "--polars_threads",
+        type=int,
+        default=1,
+        help="Max number of Polars threads per worker process. Default: 1.",
+    )
+    parser.add_argument("--outdir", type=str, default="results/temp", help="Output directory. Default: results/temp.")
+
+    return parser.parse_args()
+
+
+def get_jobs(args) -> list[dict]:
+    """
+    Returns:
+        list[dict]: the configurations of the grid whose result file does not exist yet.
+    """
+
+    # parameters that do not apply to the NIRS are not swept
+    eps_list = args.eps if args.nirs in ["heuristic", "setcover"] else args.eps[:1]
+    top_k_list = args.top_k if args.nirs == "heuristic" else [1]
+    prefix_lengths_list = args.prefix_lengths if args.nirs in ["heuristic", "setcover"] else [None]
+    k_prompt_list = args.k_prompt if args.nirs == "ollama" else args.k_prompt[:1]
+
+    jobs = {}
+    for fpr, seed, update_time_ms, max_window_bytes, compact_ruleset, eps, top_k, prefix_lengths, k_prompt in itertools.product(
+        args.fpr,
+        args.seed,
+        args.update_time_ms,
+        args.max_window_bytes,
+        [bool(compact) for compact in args.compact_ruleset],
+        eps_list,
+        top_k_list,
+        prefix_lengths_list,
+        k_prompt_list,
+    ):
+        outfile = get_resfile_name(
+            args.nids,
+            args.dataset,
+            args.nirs,
+            fpr,
+            eps,
+            k_prompt,
+            seed,
+            update_time_ms,
+            top_k,
+            prefix_lengths,
+            max_window_bytes=max_window_bytes,
+            compact_ruleset=compact_ruleset,
+        )
+        outfile = os.path.join(args.outdir, outfile)
+
+        if os.path.exists(outfile):
+            print(f"Skipping {outfile} (already exists)")
+            continue
+
+        jobs[outfile] = {
+            "nids": args.nids,
+            "dataset": args.dataset,
+            "nirs": args.nirs,
+            "fpr": fpr,
+            "eps": eps,
+            "top_k": top_k,
+            "prefix_lengths": prefix_lengths,
+            "k_prompt": k_prompt,
+            "max_window_bytes": max_window_bytes,
+            "compact_ruleset": compact_ruleset,
+            "seed": seed,
+            "update_time_ms": update_time_ms,
+            "outfile": outfile,
+        }
+
+    return list(jobs.values())
+
+
+def init_worker(data_file: str) -> None:
+    global _df
+    _df = pl.read_ipc(data_file, memory_map=True)
+
+
+def run_job(job: dict) -> tuple[str, float, float, float]:
+    """
+    Evaluate one configuration on the shared dataset and write its results (same file as `run_nirs`).
+    The output of the evaluation is written to a log file next to the results.
+
+    Returns:
+        tuple[str, float, float, float]: result file, CBR, WBR and evaluation time in seconds.
+    """
+
+    NIRS_Factory = get_nirs_factory(
+        job["nirs"],
+        max_alert_window_idle_ms=MAX_ALERT_WINDOW_IDLE_MS,
+        max_alert_window_len_ms=MAX_ALERT_WINDOW_LEN_MS,
+        benign_traffic_window_len_ms=BENIGN_TRAFFIC_WINDOW_LEN_MS,
+        max_rules=MAX_RULES,
+        eps=job["eps"],
+        k_prompt=job["k_prompt"],
+        max_window_bytes=job["max_window_bytes"],
+        top_k=job["top_k"],
+        prefix_lengths=job["prefix_lengths"],
+        compact_ruleset=job["compact_ruleset"],
+    )
+
+    outfile = job["outfile"]
+    logfile = os.path.splitext(outfile)[0] + ".log"
+
+    tic = time.perf_counter()
+
+    with open(logfile, "w") as f, contextlib.redirect_stdout(f):
+        if job["nids"] == "ideal":
+            res_df = eval_nirs_ideal(_df, NIRS_Factory(), job["update_time_ms"], job["seed"])
+        else:
+            nids_pred = pl.read_csv(
+                os.path.join("results/temp/nids", get_nids_pred_filename(job["nids"], job["dataset"], job["seed"]))
+            )["pred"]
+            res_df = eval_nirs_real(_df, NIRS_Factory(), nids_pred, job["fpr"], job["update_time_ms"], job["seed"])
+
+    toc = time.perf_counter()
+
+    # write to a temporary file first, so that an interrupted job is not skipped by the next sweep
+    res_df.write_csv(outfile + ".tmp")
+    os.replace(outfile + ".tmp", outfile)
+
+    res_df = res_df.with_columns(_df["label"])
+
+    cbr = res_df.filter(pl.col("label") == 1)["is_blocked"].mean()
+    wbr = res_df.filter(pl.col("label") == 0)["is_blocked"].mean()
+
+    return outfile, cbr, wbr, toc - tic
+
+
+if __name__ == "__main__":
+    args = get_sweep_args()
+
+    if not os.path.exists(args.outdir):
+        os.makedirs(args.outdir)
+
+    jobs = get_jobs(args)
+    print(f"{len(jobs)} configurations to run")
+
+    if len(jobs) == 0:
+        sys.exit(0)
+
+    # inherited by the worker processes, which import Polars after the pool is created
+    os.environ["POLARS_MAX_THREADS"] = str(args.polars_threads)
+
+    tic = time.perf_counter()
+
+    df = load_dataset(args.dataset)
+    data_file = os.path.join(args.outdir, f".sweep_{args.dataset}.arrow")
+    # uncompressed, so that the workers memory-map it instead of each holding a copy
+    df.write_ipc(data_file, compression="uncompressed")
+    del df
+
+    print(f"Dataset loaded in {time.perf_counter() - tic:.1f}s")
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(args.n_workers, len(jobs)),
+            mp_context=mp.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(data_file,),
+        ) as executor:
+            futures = {executor.submit(run_job, job): job for job in jobs}
+
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    outfile, cbr, wbr, elapsed = future.result()
+                except Exception as e:
+                    print(f"Failed {job['outfile']}: {e!r}")
+                    continue
+
+                print(f"Results saved to {outfile} (CBR: {cbr:.4f}, WBR: {wbr:.4f}, time: {elapsed:.1f}s)")
+    finally:
+        os.remove(data_file)
+
+    print(f"Time: {time.perf_counter() - tic}")
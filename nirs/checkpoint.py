@@ -0,0 +1,119 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import polars as pl
+
+CHECKPOINT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def save_checkpoint(checkpoint_dir: str, state: dict) -> str:
+    """
+    Write a checkpoint as Arrow IPC files (one per DataFrame or NumPy array in `state`) plus
+    a JSON manifest with the other values.
+
+    Each checkpoint goes to its own subdirectory, and `checkpoint_dir/manifest.json` is replaced
+    atomically once it is complete, so an interrupted save leaves the previous checkpoint usable.
+    Older checkpoints are deleted.
+
+    Args:
+        checkpoint_dir (str): directory of the checkpoints.
+        state (dict): JSON-serializable values, DataFrames and NumPy arrays. Nested dicts
+            (e.g. the state of the NIRS) are supported.
+
+    Returns:
+        str: path of the new checkpoint.
+    """
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    previous = _read_manifest(checkpoint_dir)
+    name = f"ckpt_{0 if previous is None else previous['counter'] + 1:08d}"
+    path = os.path.join(checkpoint_dir, name)
+    os.makedirs(path, exist_ok=True)
+
+    def encode(value, key: str):
+        if isinstance(value, dict):
+            return {k: encode(v, f"{key}.{k}") for k, v in value.items()}
+        if isinstance(value, pl.DataFrame):
+            value.write_ipc(os.path.join(path, f"{key}.arrow"), compression="lz4")
+            return {"__frame__": f"{key}.arrow"}
+        if isinstance(value, np.ndarray):
+            pl.DataFrame({"values": value}).write_ipc(os.path.join(path, f"{key}.arrow"), compression="lz4")
+            return {"__array__": f"{key}.arrow"}
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    contents = {k: encode(v, k) for k, v in state.items()}
+    with open(os.path.join(path, "state.json"), "w") as f:
+        json.dump(contents, f)
+
+    manifest = {
+        "version": CHECKPOINT_VERSION,
+        "counter": 0 if previous is None else previous["counter"] + 1,
+        "checkpoint": name,
+    }
+    with open(os.path.join(checkpoint_dir, MANIFEST_FILE + ".tmp"), "w") as f:
+        json.dump(manifest, f)
+    os.replace(os.path.join(checkpoint_dir, MANIFEST_FILE + ".tmp"), os.path.join(checkpoint_dir, MANIFEST_FILE))
+
+    for entry in os.listdir(checkpoint_dir):
+        if entry.startswith("ckpt_") and entry != name:
+            shutil.rmtree(os.path.join(checkpoint_dir, entry), ignore_errors=True)
+
+    return path
+
+
+def load_checkpoint(checkpoint_dir: str) -> dict | None:
+    """
+    Args:
+        checkpoint_dir (str): directory of the checkpoints.
+
+    Returns:
+        dict | None: the state of the last complete checkpoint (as passed to `save_checkpoint`),
+            or None if there is no checkpoint.
+    """
+
+    manifest = _read_manifest(checkpoint_dir)
+    if manifest is None:
+        return None
+
+    if manifest["version"] != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {manifest['version']} in {checkpoint_dir}")
+
+    path = os.path.join(checkpoint_dir, manifest["checkpoint"])
+    with open(os.path.join(path, "state.json")) as f:
+        contents = json.load(f)
+
+    def decode(value):
+        if isinstance(value, dict):
+            if "__frame__" in value:
+                return pl.read_ipc(os.path.join(path, value["__frame__"]), memory_map=False)
+            if "__array__" in value:
+                return pl.read_ipc(os.path.join(path, value["__array__"]), memory_map=False)["values"].to_numpy()
+            return {k: decode(v) for k, v in value.items()}
+        return value
+
+    return {k: decode(v) for k, v in contents.items()}
+
+
+def _read_manifest(checkpoint_dir: str) -> dict | None:
+    manifest_file = os.path.join(checkpoint_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file) as f:
+        return json.load(f)
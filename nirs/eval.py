@@ -9,38 +9,208 @@ You should have received a copy of the license along with this
 program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
 """
 
+import math
 
 import numpy as np
 import polars as pl
 
 from nirs import BaseNIRS
+from nirs.checkpoint import load_checkpoint, save_checkpoint
+from nirs.iptables.match import with_ip_int_columns
+from nirs.memory import MemoryTracker
+from nirs.metrics import OnlineMetrics
+from nirs.profiling import StageTimer
 
 def seed_all(seed: int):
     np.random.seed(seed)
 
 
+def window_bounds(timestamps: np.ndarray, t_current: float, update_time_ms: float) -> tuple[int, int]:
+    """
+    Positions of the flows of the window starting at t_current, i.e. with timestamp between t_current and
+    t_current + update_time_ms (both included), in sorted timestamps.
+    """
+    i_start = np.searchsorted(timestamps, t_current, side="left")
+    i_end = np.searchsorted(timestamps, t_current + update_time_ms, side="right")
+    return int(i_start), int(i_end)
+
+
+def n_idle_windows(timestamps: np.ndarray, i_start: int, t_current: float, update_time_ms: float) -> int:
+    """
+    Number of windows to skip from an empty window at t_current, staying on the grid t_current + k * update_time_ms:
+    the clock lands on the first window (the last one of the grid) that contains the next flow, as when moving
+    one window at a time. Since windows include both of their ends, a flow on the grid at t_current + k * update_time_ms
+    is first contained in the window starting at t_current + (k - 1) * update_time_ms.
+
+    Args:
+        timestamps (np.ndarray): sorted timestamps of the flows.
+        i_start (int): position of the first flow after t_current (see `window_bounds`).
+        t_current (float): start of the empty window.
+        update_time_ms (float): length of the windows.
+
+    Returns:
+        int: number of windows to skip (at least 1).
+    """
+    if i_start >= len(timestamps):
+        return 1
+    return max(1, math.ceil((timestamps[i_start] - t_current) / update_time_ms) - 1)
+
+
+def apply_window_rules(nirs: BaseNIRS, df_window: pl.DataFrame, inter_subnet: np.ndarray) -> np.ndarray:
+    """
+    Apply the current rules of the NIRS to the flows of a window that cross the firewall.
+
+    Args:
+        nirs (BaseNIRS): NIRS being evaluated.
+        df_window (DataFrame): flows of the window, with a contiguous "idx" column.
+        inter_subnet (np.ndarray): True for the flows crossing the firewall.
+
+    Returns:
+        np.ndarray: True for the flows of the window blocked by the rules.
+    """
+
+    idx_offset = df_window["idx"][0]
+
+    with nirs.timer.stage("apply_rules", n_flows=int(inter_subnet.sum()), n_rules=len(nirs.ruleset)):
+        idx_blocked = nirs.apply_rules(df_window.filter(pl.Series(inter_subnet)))
+
+    # (only the flows of the current window)
+    idx_blocked = np.asarray(idx_blocked, dtype=np.int64) - idx_offset
+    idx_blocked = idx_blocked[(idx_blocked >= 0) & (idx_blocked < len(df_window))]
+    idx_blocked = idx_blocked[inter_subnet[idx_blocked]]
+
+    blocked_by_current_rules = np.zeros(len(df_window), dtype=bool)
+    blocked_by_current_rules[idx_blocked] = True
+    return blocked_by_current_rules
+
+
+def window_update_flows(
+    df_window: pl.DataFrame,
+    is_blocked: np.ndarray,
+    blocked_by_current_rules: np.ndarray,
+    is_alert: np.ndarray,
+    inter_subnet: np.ndarray,
+    has_data: np.ndarray,
+) -> pl.DataFrame | None:
+    """
+    Flows of a window to update the NIRS with: the flows that went through the firewall, if some alerts were
+    not blocked (None otherwise).
+    """
+
+    alert_not_blocked = is_alert & inter_subnet & ~is_blocked & has_data
+
+    if not alert_not_blocked.any():
+        return None
+
+    print(df_window.filter(pl.Series(alert_not_blocked))["src_ip", "dst_ip", "src_data", "dst_data"])
+
+    return df_window.filter(pl.Series(~blocked_by_current_rules & inter_subnet & has_data))
+
+
+def eval_window(
+    nirs: BaseNIRS,
+    df_window: pl.DataFrame,
+    is_blocked: np.ndarray,
+    is_alert: np.ndarray,
+    inter_subnet: np.ndarray,
+    has_data: np.ndarray,
+) -> bool:
+    """
+    One step of the evaluation loop, on the flows of the current window:
+    - apply the current rules to the flows crossing the firewall
+    - mark the blocked flows (in place in `is_blocked`)
+    - if some alerts were not blocked, update the NIRS with the flows that went through
+
+    Args:
+        nirs (BaseNIRS): NIRS being evaluated.
+        df_window (DataFrame): flows of the window, with a contiguous "idx" column.
+        is_blocked (np.ndarray): blocked state of the flows of the window (updated in place).
+        is_alert (np.ndarray): alert flag of the flows of the window.
+        inter_subnet (np.ndarray): True for the flows crossing the firewall.
+        has_data (np.ndarray): True for the flows with src_data > 0 or dst_data > 0.
+
+    Returns:
+        bool: True if the NIRS was updated.
+    """
+
+    # apply current rules to the flows crossing the firewall in the current window
+    blocked_by_current_rules = apply_window_rules(nirs, df_window, inter_subnet)
+    is_blocked |= blocked_by_current_rules
+
+    df_update = window_update_flows(df_window, is_blocked, blocked_by_current_rules, is_alert, inter_subnet, has_data)
+    if df_update is None:
+        return False
+
+    # update rules
+    with nirs.timer.stage("update", n_flows=len(df_update)) as record:
+        nirs.update(df_update)
+        record["n_rules"] = len(nirs.ruleset)
+
+    return True
+
+
 def eval_nirs(
     df: pl.DataFrame,
     nirs: BaseNIRS,
     update_time_ms: float = 30_000,
     seed: int | None = None,
+    checkpoint_dir: str | None = None,
+    checkpoint_every: int = 100,
+    timer: StageTimer | None = None,
+    memory_tracker: MemoryTracker | None = None,
+    metrics: OnlineMetrics | None = None,
 ) -> pl.DataFrame:
     """
     Evaluates a network intrusion detection system (NIRS) on a DataFrame of network traffic data containing basic flow information.
 
+    For a WindowNIRS, the flows and bytes matched by each rule in each window are available after the
+    evaluation as a DataFrame with `nirs.rule_counters.to_polars()`.
+
     Args:
         df (DataFrame): DataFrame with columns: timestamp, src_ip, dst_ip, protocol, src_port, dst_port, is_alert.
         nirs (BaseNIRS): An extension of BaseNIRS to be evaluated.
         update_time_ms (float): Time interval in milliseconds between NIRS updates.
         seed (int | None): Seed for random number generator
+        checkpoint_dir (str | None): if set, the state of the evaluation (clock, blocked flows, NIRS state)
+            is saved in this directory every `checkpoint_every` windows, and the evaluation resumes from
+            the last checkpoint found there (see `nirs.checkpoint`).
+        checkpoint_every (int): number of evaluated windows between two checkpoints.
+        timer (StageTimer | None): if set, records the wall time of each stage of each iteration
+            (window slicing, apply_rules, update and the stages of the NIRS), see `nirs.profiling`.
+        memory_tracker (MemoryTracker | None): if set, records the estimated size of the NIRS windows, the ruleset
+            and the evaluation frame, and the peak RSS of the process, after each update (see `nirs.memory`).
+        metrics (OnlineMetrics | None): if set, updated after each window with the flows whose blocked state is
+            final (requires a label column), and stops the evaluation early when `metrics.should_stop()`.
     """
 
+    if timer is not None:
+        nirs.timer = timer
+
     if seed is not None:
         seed_all(seed)
 
+    # the evaluation slices time windows with binary search, which requires flows sorted by timestamp
+    # (load_nb15 already sorts them); the original order is restored in the results
+    order = None
+    if not df["timestamp"].is_sorted():
+        order = np.argsort(df["timestamp"].to_numpy(), kind="stable")
+        df = df[order]
+
     # initialize columns
+    df = with_ip_int_columns(df)
     df = df.with_columns(pl.Series(values=np.arange(len(df)), name="idx"))
-    df = df.with_columns(pl.Series(values=np.zeros(len(df)), name="is_blocked"))
+
+    timestamps = df["timestamp"].to_numpy()
+    is_alert = (df["is_alert"] == 1).fill_null(False).to_numpy()
+    inter_subnet = df["inter_subnet"].fill_null(False).to_numpy()
+    has_data = ((df["src_data"] > 0) | (df["dst_data"] > 0)).fill_null(False).to_numpy()
+
+    # blocked state of every flow, only written for the flows of the current window
+    is_blocked = np.zeros(len(df), dtype=bool)
+
+    # alert_suffix[i] is True if there is at least one alert among flows i, i+1, ...
+    alert_suffix = np.zeros(len(df) + 1, dtype=bool)
+    alert_suffix[:-1] = np.flip(np.logical_or.accumulate(np.flip(is_alert)))
 
     # iteration counter
     it = 0
@@ -48,13 +218,30 @@ def eval_nirs(
     t_current = df["timestamp"].min()
     t_min = t_current
 
-    while (
-        len(df.filter(pl.col("timestamp") > t_current).filter(pl.col("is_alert") == 1))
-        > 0
-    ):
+    if checkpoint_dir is not None:
+        state = load_checkpoint(checkpoint_dir)
+        if state is not None:
+            if state["n_flows"] != len(df) or state["update_time_ms"] != update_time_ms:
+                raise ValueError(f"Checkpoint in {checkpoint_dir} was saved by a different evaluation")
+
+            t_current, it = state["t_current"], state["it"]
+            is_blocked[:] = state["is_blocked"]
+            nirs.load_state_dict(state["nirs"])
+            np.random.set_state(state["random_state"])
+            print("Resuming from checkpoint at", (t_current - t_min) / 1000, "seconds")
+
+    # windows evaluated since the last checkpoint
+    n_windows = 0
+
+    # flows before i_final are past the evaluation windows (for the online metrics)
+    i_final = np.searchsorted(timestamps, t_current, side="left")
+    if metrics is not None and i_final > 0:
+        metrics.update(it, t_current, df.slice(0, i_final), is_blocked[:i_final])
+
+    while alert_suffix[np.searchsorted(timestamps, t_current, side="right")]:
         """
         Evaluation loop:
-        - apply rules at time t_current to all df
+        - apply rules at time t_current to the flows between t_current and t_next
         - get to t_next (t_current + update_time_ms)
         - update blocked (only between t_current t_next)
         - update rules
@@ -63,70 +250,75 @@ def eval_nirs(
 
         print("Current time:", (t_current - t_min) / 1000, "seconds")
 
-        # if no connections in current window, move to next window
-        if (
-            len(
-                df.filter(pl.col("timestamp") >= t_current).filter(
-                    pl.col("timestamp") <= t_current + update_time_ms
-                )
-            )
-            == 0
-        ):
-            t_current += update_time_ms
-            it += 1
-            continue
-
-        # apply current rules
-        idx_blocked = nirs.apply_rules(df)
+        nirs.timer.iteration = it
 
         # ensure minimum update time
         t_next = t_current + update_time_ms
 
-        # update blocked (only between t_current t_next)
-        df = df.with_columns(
-            pl.when(
-                pl.col("idx").is_in(idx_blocked)
-                & (pl.col("timestamp") <= t_next)
-                & (pl.col("timestamp") >= t_current)
-                & pl.col("inter_subnet")
-            )
-            .then(1)
-            .otherwise(pl.col("is_blocked"))
-            .alias("is_blocked")
-        )
+        # flows between t_current and t_next (both included)
+        with nirs.timer.stage("window") as record:
+            i_start, i_end = window_bounds(timestamps, t_current, update_time_ms)
+            record["n_flows"] = i_end - i_start
 
-        df_alert_not_blocked = df.filter(
-            (pl.col("is_alert") == 1)
-            & (pl.col("timestamp") <= t_next)
-            & (pl.col("timestamp") >= t_current)
-            & pl.col("inter_subnet")
-            & (pl.col("is_blocked") == 0)
-            & ((pl.col("src_data") > 0) | (pl.col("dst_data") > 0))
-        )
-
-        if len(df_alert_not_blocked) == 0:
-            t_current += update_time_ms
-            it += 1
+        # if no connections in current window, jump to the window of the next flow
+        # (staying on the grid t_min + k * update_time_ms)
+        if i_end == i_start:
+            n_skipped = n_idle_windows(timestamps, i_start, t_current, update_time_ms)
+            t_current += n_skipped * update_time_ms
+            it += n_skipped
             continue
 
-        print(df_alert_not_blocked["src_ip", "dst_ip", "src_data", "dst_data"])
-
-        # update rules
-        nirs.update(
-            df.filter(
-                ~(pl.col("idx").is_in(idx_blocked))
-                & (pl.col("timestamp") <= t_next)
-                & (pl.col("timestamp") >= t_current)
-                & pl.col("inter_subnet")
-                & ((pl.col("src_data") > 0) | (pl.col("dst_data") > 0))
-            )
+        window = slice(i_start, i_end)
+        is_updated = eval_window(
+            nirs,
+            df.slice(i_start, i_end - i_start),
+            is_blocked[window],
+            is_alert[window],
+            inter_subnet[window],
+            has_data[window],
         )
 
+        if is_updated and memory_tracker is not None:
+            memory_tracker.record(it, **nirs.memory_usage(), eval_frame_bytes=df.estimated_size())
+
         t_current = t_next
 
         it += 1
 
-    res_df = df[["timestamp", "is_blocked"]]
+        if metrics is not None:
+            # flows before t_current are not part of any later window
+            i_new = np.searchsorted(timestamps, t_current, side="left")
+            metrics.update(it, t_current, df.slice(i_final, i_new - i_final), is_blocked[i_final:i_new])
+            i_final = i_new
+
+            if metrics.should_stop():
+                print("Stopping early at", (t_current - t_min) / 1000, "seconds")
+                break
+
+        n_windows += 1
+        if checkpoint_dir is not None and n_windows >= checkpoint_every:
+            with nirs.timer.stage("checkpoint"):
+                save_checkpoint(checkpoint_dir, {
+                    "t_current": t_current,
+                    "it": it,
+                    "n_flows": len(df),
+                    "update_time_ms": update_time_ms,
+                    "is_blocked": is_blocked,
+                    "nirs": nirs.state_dict(),
+                    "random_state": np.random.get_state(legacy=False),
+                })
+            n_windows = 0
+
+    if metrics is not None and i_final < len(df):
+        metrics.update(it, None, df.slice(i_final), is_blocked[i_final:])
+
+    res_df = pl.DataFrame({
+        "timestamp": df["timestamp"],
+        "is_blocked": is_blocked.astype(np.float64),
+    })
+
+    if order is not None:
+        res_df = res_df[np.argsort(order)]
 
     for rule in nirs.ruleset:
         print(str(rule))
@@ -1,2 +1,5 @@
 from .rule import IptablesRule
-from .parser import InvalidIptablesRule
\ No newline at end of file
+from .parser import InvalidIptablesRule
+from .compiled import CompiledRuleset
+from .ruleset import Ruleset
+from .counters import RuleCounters
\ No newline at end of file
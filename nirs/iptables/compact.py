@@ -0,0 +1,195 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import ipaddress
+from bisect import bisect_right
+
+
+def _ipv4_network(ip: str) -> ipaddress.IPv4Network | None:
+    network = ipaddress.ip_network(ip, strict=False)
+    if network.version != 4:
+        return None
+    return network
+
+
+def _format_network(network: ipaddress.IPv4Network) -> str:
+    if network.prefixlen == network.max_prefixlen:
+        return str(network.network_address)
+    return str(network)
+
+
+class _NetworkSet:
+    """Disjoint, sorted CIDR blocks, with fast "is this network inside one of the blocks" queries."""
+
+    def __init__(self, networks: list[ipaddress.IPv4Network]):
+        self.networks = list(ipaddress.collapse_addresses(networks))
+        self.starts = [int(network.network_address) for network in self.networks]
+
+    def covers(self, network: ipaddress.IPv4Network) -> bool:
+        # collapsed blocks are maximal, so a CIDR inside their union is inside a single block
+        i = bisect_right(self.starts, int(network.network_address)) - 1
+        return i >= 0 and network.subnet_of(self.networks[i])
+
+
+def compact_rules(rules: list[dict]) -> list[dict]:
+    """
+    Compact a DROP-only ruleset without changing the set of blocked flows:
+    - rules shadowed by broader rules (e.g. `-s 10.0.0.1 -p tcp` when `-s 10.0.0.0/24` exists) are dropped;
+    - rules on the same field, protocol and port are aggregated into minimal CIDR blocks
+      (e.g. `-s 10.0.0.0` and `-s 10.0.0.1` become `-s 10.0.0.0/31`).
+
+    Since all the rules DROP, their order does not change which flows are blocked. The compacted
+    rules keep the chain order of the most recent rule they replace, so that eviction still drops
+    the oldest rules first. Rules that are not modified are returned as the same dict objects.
+
+    Args:
+        rules (list[dict]): parsed rules (see `parse_iptables_rule`), in chain order.
+
+    Returns:
+        list[dict]: compacted rules, in chain order.
+    """
+
+    # rules without any IP condition, e.g. `-A FORWARD -p icmp -j DROP`: protocol -> [positions]
+    catch_all: dict[str, list[int]] = {}
+    # rules on a single IPv4 field: (field, protocol, dst_port) -> [(network, position)]
+    single_field: dict[tuple[str, str, str], list[tuple[ipaddress.IPv4Network, int]]] = {}
+    # rules on both IPv4 fields: [(src network, dst network, position)]
+    both_fields: list[tuple[ipaddress.IPv4Network, ipaddress.IPv4Network, int]] = []
+    # rules that are only dropped when a catch-all rule covers them (IPv6, source ports)
+    opaque: list[int] = []
+
+    for position, rule in enumerate(rules):
+        src_ip, dst_ip, protocol = rule["src_ip"], rule["dst_ip"], rule["protocol"]
+
+        if rule["src_port"] != "any":
+            opaque.append(position)
+            continue
+
+        if src_ip == "any" and dst_ip == "any":
+            catch_all.setdefault(protocol, []).append(position)
+            continue
+
+        src_network = _ipv4_network(src_ip) if src_ip != "any" else None
+        dst_network = _ipv4_network(dst_ip) if dst_ip != "any" else None
+
+        if (src_ip != "any" and src_network is None) or (dst_ip != "any" and dst_network is None):
+            opaque.append(position)
+        elif dst_network is None:
+            # --dport is ignored by the matcher when there is no destination
+            single_field.setdefault(("src_ip", protocol, "any"), []).append((src_network, position))
+        elif src_network is None:
+            dst_port = rule["dst_port"] if rule["dst_port"] == "any" else str(int(rule["dst_port"]))
+            single_field.setdefault(("dst_ip", protocol, dst_port), []).append((dst_network, position))
+        else:
+            both_fields.append((src_network, dst_network, position))
+
+    def is_caught_all(protocol: str) -> bool:
+        return "any" in catch_all or protocol in catch_all
+
+    # (position, rule dict)
+    compacted: list[tuple[int, dict]] = []
+
+    # catch-all rules: `-A FORWARD -j DROP` covers everything else
+    if "any" in catch_all:
+        position = max(catch_all["any"])
+        return [rules[position]]
+
+    for protocol, positions in catch_all.items():
+        compacted.append((max(positions), rules[max(positions)]))
+
+    # union of the networks of each group of single-field rules
+    covering = {key: _NetworkSet([network for network, _ in entries]) for key, entries in single_field.items()}
+
+    def single_field_covers(field: str, protocol: str, dst_port: str, network: ipaddress.IPv4Network) -> bool:
+        return any(
+            covering[key].covers(network)
+            for key in {(field, "any", dst_port), (field, protocol, dst_port)}
+            if key in covering
+        )
+
+    for (field, protocol, dst_port), entries in single_field.items():
+        if is_caught_all(protocol):
+            continue
+
+        # shadowing by the rules matching any protocol on the same field and port
+        if protocol != "any":
+            entries = [(network, position) for network, position in entries if not single_field_covers(field, "any", dst_port, network)]
+
+        blocks = _NetworkSet([network for network, _ in entries])
+        constituents: dict[int, list[tuple[ipaddress.IPv4Network, int]]] = {}
+        for network, position in entries:
+            i = bisect_right(blocks.starts, int(network.network_address)) - 1
+            constituents.setdefault(i, []).append((network, position))
+
+        for i, block in enumerate(blocks.networks):
+            position = max(position for _, position in constituents[i])
+
+            original = [p for network, p in constituents[i] if network == block]
+            if len(original) > 0:
+                # the block is one of the existing rules
+                compacted.append((position, rules[max(original)]))
+                continue
+
+            template = rules[position]
+            compacted.append((position, {
+                "option": template["option"],
+                "table": template["table"],
+                "src_ip": _format_network(block) if field == "src_ip" else "any",
+                "dst_ip": _format_network(block) if field == "dst_ip" else "any",
+                "protocol": protocol,
+                "src_port": "any",
+                "dst_port": dst_port,
+                "jump": template["jump"],
+            }))
+
+    # rules on both fields, shadowed either by single-field rules or by other rules on both fields
+    for src_network, dst_network, position in both_fields:
+        rule = rules[position]
+        protocol = rule["protocol"]
+        dst_port = rule["dst_port"] if rule["dst_port"] == "any" else str(int(rule["dst_port"]))
+
+        if is_caught_all(protocol):
+            continue
+        if single_field_covers("src_ip", protocol, "any", src_network):
+            continue
+        if single_field_covers("dst_ip", protocol, dst_port, dst_network):
+            continue
+
+        def covers(other_position: int, other_src: ipaddress.IPv4Network, other_dst: ipaddress.IPv4Network) -> bool:
+            other = rules[other_position]
+            other_port = other["dst_port"] if other["dst_port"] == "any" else str(int(other["dst_port"]))
+            return (
+                other["protocol"] in ("any", protocol)
+                and other_port == dst_port
+                and src_network.subnet_of(other_src)
+                and dst_network.subnet_of(other_dst)
+            )
+
+        is_shadowed = False
+        for other_src, other_dst, other_position in both_fields:
+            if other_position == position or not covers(other_position, other_src, other_dst):
+                continue
+            # identical rules: keep the most recent one
+            is_same = rules[other_position]["protocol"] == protocol and other_src == src_network and other_dst == dst_network
+            if not is_same or other_position > position:
+                is_shadowed = True
+                break
+
+        if not is_shadowed:
+            compacted.append((position, rule))
+
+    for position in opaque:
+        if not is_caught_all(rules[position]["protocol"]):
+            compacted.append((position, rules[position]))
+
+    compacted.sort(key=lambda item: item[0])
+
+    return [rule for _, rule in compacted]
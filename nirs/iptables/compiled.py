@@ -0,0 +1,97 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+from functools import cached_property
+
+import numpy as np
+import polars as pl
+
+from .match import rule_expr, with_ip_int_columns
+from .prefix_index import PrefixIndex
+
+# above this size, matching through the prefix index is faster than evaluating one expression per rule
+INDEX_MIN_RULES = 64
+
+
+class CompiledRuleset:
+    """
+    A ruleset compiled into a single Polars expression, so that a DataFrame of flows is
+    matched against all the rules in one scan instead of one scan per rule.
+
+    The expression returns, for each flow, the position of the first rule matching it
+    (as iptables would do when walking the chain), or null if no rule matches.
+    """
+
+    def __init__(self, rules: list[dict], index_min_rules: int = INDEX_MIN_RULES):
+        """
+        Args:
+            rules (list[dict]): parsed rules (see `parse_iptables_rule`), in chain order.
+            index_min_rules (int): rulesets with at least this many rules are matched through a
+                `PrefixIndex` instead of the expression, whose cost grows with the number of rules.
+        """
+        self.rules = list(rules)
+
+        self.index = None
+        if len(self.rules) >= index_min_rules:
+            self.index = PrefixIndex(self.rules)
+
+    @cached_property
+    def first_match_expr(self) -> pl.Expr:
+        """Int32 expression, position of the first rule matching each flow (null if no rule matches)."""
+        if len(self.rules) == 0:
+            return pl.lit(None, dtype=pl.Int32).alias("first_rule")
+
+        return pl.coalesce(
+            [pl.when(rule_expr(rule)).then(pl.lit(i, dtype=pl.Int32)) for i, rule in enumerate(self.rules)]
+        ).alias("first_rule")
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def expr(self) -> pl.Expr:
+        """Boolean expression, true for the flows matched by any rule."""
+        return self.first_match_expr.is_not_null().alias("is_blocked")
+
+    def evaluate(self, X: pl.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Match all the rules against a DataFrame of flows in a single pass.
+
+        Args:
+            X (DataFrame): DataFrame with columns: src_ip, dst_ip, protocol, src_port, dst_port, src_data, dst_data.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: boolean mask of the blocked flows, and index of the
+                first rule matching each flow (-1 if no rule matches).
+        """
+
+        if len(self.rules) == 0:
+            return np.zeros(len(X), dtype=bool), np.full(len(X), -1, dtype=np.int32)
+
+        if self.index is not None:
+            return self.index.evaluate(X)
+
+        X = with_ip_int_columns(X)
+        # with_columns (rather than select) broadcasts rules without conditions, e.g. `-A FORWARD -j DROP`
+        first_rule = X.with_columns(self.first_match_expr)["first_rule"]
+
+        mask = first_rule.is_not_null().to_numpy()
+        first_rule = first_rule.fill_null(-1).to_numpy()
+
+        return mask, first_rule
+
+    def not_blocked(self, X: pl.DataFrame) -> pl.DataFrame:
+        """Flows of X that no rule matches (same as `X.filter(~self.expr)`, through the prefix index of large rulesets)."""
+        if len(self.rules) == 0:
+            return X
+
+        mask, _ = self.evaluate(X)
+        return X.filter(pl.Series(~mask))
@@ -0,0 +1,102 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import numpy as np
+import polars as pl
+
+from .rule import IptablesRule
+
+
+class RuleCounters:
+    """
+    Per-rule flow and byte counters, similar to `iptables -L -v`.
+
+    Each call to `record` corresponds to one application of the ruleset (e.g. one evaluation window).
+    As in iptables, a flow is counted only for the first rule that matches it.
+    """
+
+    def __init__(self):
+        self._windows: list[tuple[int, int | None, int | None, tuple[IptablesRule, ...], np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def __len__(self):
+        return len(self._windows)
+
+    def record(self, rules: tuple[IptablesRule, ...], X: pl.DataFrame, first_rule: np.ndarray) -> None:
+        """
+        Args:
+            rules (tuple[IptablesRule, ...]): the rules that were applied, in chain order.
+            X (DataFrame): the flows the rules were applied to, with columns: timestamp, src_data, dst_data.
+            first_rule (np.ndarray): index of the first rule matching each flow (-1 if no rule matches).
+        """
+
+        matched = first_rule >= 0
+        positions = first_rule[matched]
+
+        flows = np.bincount(positions, minlength=len(rules))
+        src_data = np.bincount(positions, weights=X["src_data"].fill_null(0).to_numpy()[matched], minlength=len(rules))
+        dst_data = np.bincount(positions, weights=X["dst_data"].fill_null(0).to_numpy()[matched], minlength=len(rules))
+
+        t_start, t_end = None, None
+        if len(X) > 0:
+            t_start, t_end = int(X["timestamp"].min()), int(X["timestamp"].max())
+
+        self._windows.append((len(self._windows), t_start, t_end, rules, flows, src_data, dst_data))
+
+    def to_polars(self) -> pl.DataFrame:
+        """
+        Returns:
+            DataFrame: one row per (window, rule), with columns: window, t_start, t_end, rule_pos, rule, flows, src_data, dst_data.
+        """
+
+        frames = [
+            pl.DataFrame(
+                {
+                    "window": np.full(len(rules), window, dtype=np.int64),
+                    "t_start": pl.Series([t_start] * len(rules), dtype=pl.Int64),
+                    "t_end": pl.Series([t_end] * len(rules), dtype=pl.Int64),
+                    "rule_pos": np.arange(len(rules), dtype=np.int64),
+                    "rule": pl.Series([str(rule) for rule in rules], dtype=pl.String),
+                    "flows": flows.astype(np.int64),
+                    "src_data": src_data.astype(np.int64),
+                    "dst_data": dst_data.astype(np.int64),
+                }
+            )
+            for window, t_start, t_end, rules, flows, src_data, dst_data in self._windows
+        ]
+
+        if len(frames) == 0:
+            return pl.DataFrame(schema={
+                "window": pl.Int64,
+                "t_start": pl.Int64,
+                "t_end": pl.Int64,
+                "rule_pos": pl.Int64,
+                "rule": pl.String,
+                "flows": pl.Int64,
+                "src_data": pl.Int64,
+                "dst_data": pl.Int64,
+            })
+
+        return pl.concat(frames, how="vertical")
+
+    def totals(self) -> pl.DataFrame:
+        """
+        Counters summed over all windows, one row per rule (rules that never matched have zero counters).
+        """
+        return (
+            self.to_polars()
+            .group_by("rule", maintain_order=True)
+            .agg(
+                pl.len().alias("windows"),
+                pl.col("flows").sum(),
+                pl.col("src_data").sum(),
+                pl.col("dst_data").sum(),
+            )
+        )
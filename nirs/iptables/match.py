@@ -9,40 +9,93 @@ You should have received a copy of the license along with this
 program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
 """
 
+import ipaddress
+
 import numpy as np
 import polars as pl
 
+IP_INT_SUFFIX = "_int"
+IP_COLUMNS = ["src_ip", "dst_ip"]
+
 
-def is_in_subnet(x: str, subnet: str):
+def ip_to_uint32(col: str) -> pl.Expr:
     """
-    Check if an IP address is in a given subnet.
-    
+    Convert a column of dotted IPv4 strings into UInt32 integers.
+
+    Anything that is not a valid IPv4 address (e.g. IPv6 addresses) is mapped to null,
+    so that it never matches an IPv4 network.
+
     Args:
-        x (str): IP address, e.g. "10.2.0.4"
-        subnet (str): subnet, e.g. "10.2.0.0/16"
+        col (str): name of the column containing IP addresses, e.g. "src_ip"
 
     Returns:
-        bool: True if x is in subnet, False otherwise.
+        pl.Expr: UInt32 expression, e.g. "10.2.0.4" -> 167903236
+    """
+
+    fields = pl.col(col).str.split_exact(".", 3).struct
+    octets = [fields.field(f"field_{i}").cast(pl.UInt32, strict=False) for i in range(4)]
+
+    value = octets[0] * (1 << 24) + octets[1] * (1 << 16) + octets[2] * (1 << 8) + octets[3]
+    # (split_exact ignores the fields after the fourth one, e.g. in "1.2.3.4.5")
+    has_four_fields = pl.col(col).str.count_matches(".", literal=True) == 3
+    is_valid = pl.all_horizontal([has_four_fields] + [octet <= 255 for octet in octets])
+
+    return pl.when(is_valid).then(value).otherwise(None).cast(pl.UInt32).alias(col)
+
+
+def uint32_to_ip(expr: pl.Expr) -> pl.Expr:
     """
+    Inverse of `ip_to_uint32`: format UInt32 integers as dotted IPv4 strings.
+
+    Args:
+        expr (pl.Expr): UInt32 expression, e.g. 167903236
+
+    Returns:
+        pl.Expr: String expression, e.g. "10.2.0.4"
+    """
+
+    octets = [(expr // (1 << shift) % 256).cast(pl.Utf8) for shift in [24, 16, 8, 0]]
+    return pl.concat_str(octets, separator=".")
+
+
+def with_ip_int_columns(X: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Add the UInt32 representation of src_ip and dst_ip (columns src_ip_int, dst_ip_int),
+    unless they are already present. Meant to be called once per dataset, so that subnet
+    matching does not need to parse IP strings again.
+    """
+
+    if isinstance(X, pl.LazyFrame):
+        columns = X.collect_schema().names()
+    else:
+        columns = X.columns
+
+    missing = [col for col in IP_COLUMNS if f"{col}{IP_INT_SUFFIX}" not in columns]
+    if len(missing) == 0:
+        return X
+
+    return X.with_columns([ip_to_uint32(col).alias(f"{col}{IP_INT_SUFFIX}") for col in missing])
 
-    netmask = subnet.split("/")[1]
-    if netmask == "32":
-        return x == subnet.split("/")[0]
-    elif netmask == "24":
-        ip_net = ".".join(subnet.split(".")[:3])
-        return x.startswith(ip_net)
-    elif netmask == "16":
-        ip_net = ".".join(subnet.split(".")[:2])
-        return x.startswith(ip_net)
-    elif netmask == "8":
-        ip_net = ".".join(subnet.split(".")[:1])
-        return x.startswith(ip_net)
-    return False
 
 def match_ip(col: str, ip: str):
-    if "/" in ip[-4:]:
-        return pl.col(col).map_elements(lambda x: is_in_subnet(x, ip), return_dtype=pl.Boolean)
-    return pl.col(col) == ip
+    """
+    Match a column of IP addresses against a host or a network (any netmask from /0 to /32).
+
+    IPv4 networks are matched with a mask-and-compare on the UInt32 column `<col>_int`
+    (see `with_ip_int_columns`). IPv6 hosts fall back to string comparison.
+    """
+
+    network = ipaddress.ip_network(ip, strict=False)
+
+    if network.version == 4:
+        netmask = int(network.netmask)
+        network_address = int(network.network_address)
+        return (pl.col(f"{col}{IP_INT_SUFFIX}") & pl.lit(netmask, dtype=pl.UInt32)) == network_address
+
+    if network.prefixlen == network.max_prefixlen:
+        return pl.col(col) == ip
+
+    return pl.lit(False)
 
 def match_port(col: str, port: str):
     return pl.col(col) == int(port)
@@ -50,6 +103,44 @@ def match_port(col: str, port: str):
 def match_data(col: str):
     return pl.col(col) > 0
 
+def rule_expr(rule: dict) -> pl.Expr:
+    """
+    Build a single boolean expression matching the flows blocked by a rule.
+    The expression expects the columns src_ip_int and dst_ip_int (see `with_ip_int_columns`).
+
+    Args:
+        rule (dict): Dictionary with keys: protcol, src_ip, dst_ip, src_port, dst_port
+
+    Returns:
+        pl.Expr: Boolean expression, true for the flows matching the rule
+    """
+
+    expr = pl.lit(True)
+
+    if rule["protocol"] != "any":
+        expr = expr & (pl.col("protocol") == rule["protocol"])
+
+    if rule["src_ip"] != "any":
+        expr = expr & ((match_ip("src_ip", rule["src_ip"]) & match_data("src_data")) | (match_ip("dst_ip", rule["src_ip"]) & match_data("dst_data")))
+
+    if rule["dst_ip"] != "any" and rule["src_port"] == "any" and rule["dst_port"] == "any":
+        # case -A INPUT -d <dst_ip>[/<subnet>] -p <protocol> -j DROP
+        expr = expr & ((match_ip("dst_ip", rule["dst_ip"]) & match_data("src_data")) | (match_ip("src_ip", rule["dst_ip"]) & match_data("dst_data")))
+
+    elif rule["dst_ip"] != "any" and rule["src_port"] == "any" and rule["dst_port"] != "any":
+        # case -A INPUT -d <dst_ip>[/<subnet>] -p <protocol> --dport <dst_port> -j DROP
+        # the protocol being != any is verified by the parser
+        expr = expr & (
+            (
+                match_ip("src_ip", rule["dst_ip"]) & match_port("src_port", rule["dst_port"]) & match_data("src_data")
+            ) | (
+                match_ip("dst_ip", rule["dst_ip"]) & match_port("dst_port", rule["dst_port"]) & match_data("dst_data")
+            )
+        )
+
+    return expr
+
+
 def match_rule_df(X: pl.DataFrame, rule: dict) -> np.ndarray:
     """
     Rule matching function for polars dataframe of network traffic data.
@@ -74,25 +165,6 @@ def match_rule_df(X: pl.DataFrame, rule: dict) -> np.ndarray:
         np.ndarray: Array of indices of blocked alerts
     """
 
-    if rule["protocol"] != "any":
-        X = X.filter(pl.col("protocol") == rule["protocol"])
-
-    if rule["src_ip"] != "any":
-        X = X.filter((match_ip("src_ip", rule["src_ip"]) & match_data("src_data")) | (match_ip("dst_ip", rule["src_ip"]) & match_data("dst_data")))
-
-    if rule["dst_ip"] != "any" and rule["src_port"] == "any" and rule["dst_port"] == "any":
-        # case -A INPUT -d <dst_ip>[/<subnet>] -p <protocol> -j DROP
-        X = X.filter((match_ip("dst_ip", rule["dst_ip"]) & match_data("src_data")) | (match_ip("src_ip", rule["dst_ip"]) & match_data("dst_data")))
+    X = with_ip_int_columns(X)
 
-    elif rule["dst_ip"] != "any" and rule["src_port"] == "any" and rule["dst_port"] != "any":
-        # case -A INPUT -d <dst_ip>[/<subnet>] -p <protocol> --dport <dst_port> -j DROP
-        # the protocol being != any is verified by the parser
-        X = X.filter(
-            (
-                match_ip("src_ip", rule["dst_ip"]) & match_port("src_port", rule["dst_port"]) & match_data("src_data")
-            ) | (
-                match_ip("dst_ip", rule["dst_ip"]) & match_port("dst_port", rule["dst_port"]) & match_data("dst_data")
-            )
-        )
-        
-    return X["idx"].to_numpy()
+    return X.filter(rule_expr(rule))["idx"].to_numpy()
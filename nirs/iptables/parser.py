@@ -166,4 +166,30 @@ def parse_iptables_rule(rule: str) -> dict:
     if not is_valid_rule_dict(result):
         raise InvalidIptablesRule
 
-    return result
\ No newline at end of file
+    return result
+
+def format_iptables_rule(rule_dict: dict) -> str:
+    """
+    Inverse of `parse_iptables_rule`: write a parsed rule back as an iptables rule string.
+
+    Args:
+        rule_dict (dict): parsed rule, e.g. {"option": "-A", "table": "FORWARD", "src_ip": "10.2.0.0/24", ..., "jump": "DROP"}
+
+    Returns:
+        str: iptables rule, e.g. `-A FORWARD -s 10.2.0.0/24 -j DROP`
+    """
+
+    tokens = [rule_dict["option"], rule_dict["table"]]
+
+    if rule_dict.get("src_ip", "any") != "any":
+        tokens += ["-s", rule_dict["src_ip"]]
+    if rule_dict.get("dst_ip", "any") != "any":
+        tokens += ["-d", rule_dict["dst_ip"]]
+    if rule_dict.get("protocol", "any") != "any":
+        tokens += ["-p", rule_dict["protocol"]]
+    if rule_dict.get("dst_port", "any") != "any":
+        tokens += ["--dport", str(rule_dict["dst_port"])]
+
+    tokens += ["-j", rule_dict["jump"]]
+
+    return " ".join(tokens)
@@ -0,0 +1,231 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import ipaddress
+
+import numpy as np
+import polars as pl
+
+from .match import rule_expr, with_ip_int_columns
+
+NO_MATCH = np.iinfo(np.int64).max
+
+# Rules are indexed by the IP field they constrain. The matching semantics of each kind
+# are the same as in `rule_expr`:
+# - "src":   -s <ip>[/<subnet>] [-p <protocol>]
+# - "dst":   -d <ip>[/<subnet>] [-p <protocol>]
+# - "dport": -d <ip>[/<subnet>] -p <protocol> --dport <port>
+INDEXED_KINDS = ["src", "dst", "dport"]
+
+
+def get_rule_kind(rule: dict) -> str | None:
+    """
+    Returns the kind of an IPv4 rule that can be indexed by prefix, or None if the rule
+    must be matched with its expression (e.g. rules on both src and dst, or on IPv6 networks).
+    """
+
+    if rule["src_port"] != "any":
+        return None
+
+    if rule["src_ip"] != "any" and rule["dst_ip"] == "any":
+        kind, ip = "src", rule["src_ip"]
+    elif rule["src_ip"] == "any" and rule["dst_ip"] != "any":
+        kind, ip = ("dst", rule["dst_ip"]) if rule["dst_port"] == "any" else ("dport", rule["dst_ip"])
+    else:
+        return None
+
+    if ipaddress.ip_network(ip, strict=False).version != 4:
+        return None
+
+    if kind == "dport" and not 0 <= int(rule["dst_port"]) < (1 << 16):
+        return None
+
+    return kind
+
+
+def _make_keys(network: np.ndarray, port: np.ndarray, protocol_code: np.ndarray) -> np.ndarray:
+    # 64-bit key: | protocol code (16 bits) | port (16 bits) | masked IPv4 address (32 bits) |
+    return (protocol_code.astype(np.uint64) << np.uint64(48)) | (port.astype(np.uint64) << np.uint64(32)) | network.astype(np.uint64)
+
+
+class PrefixIndex:
+    """
+    IPv4 prefix index over a ruleset, keyed by protocol and destination port.
+
+    The index is a prefix trie flattened by level: for each prefix length used by the rules,
+    it keeps a sorted table of (protocol, port, network) keys with the position of the first
+    rule owning that key. A batch of flows is looked up with one vectorized binary search per
+    level, so the matching cost grows with the number of distinct prefix lengths (at most 33)
+    and only logarithmically with the number of rules.
+
+    Rules that cannot be indexed (see `get_rule_kind`) are matched with their expression.
+    """
+
+    def __init__(self, rules: list[dict]):
+        """
+        Args:
+            rules (list[dict]): parsed rules (see `parse_iptables_rule`), in chain order.
+        """
+        self.rules = list(rules)
+
+        protocols = sorted({rule["protocol"] for rule in self.rules if rule["protocol"] != "any"})
+        # code 0 is reserved for "any" protocol
+        self.protocol_codes = {protocol: code + 1 for code, protocol in enumerate(protocols)}
+
+        entries = {kind: {} for kind in INDEXED_KINDS}
+        self.fallback_positions = []
+
+        for position, rule in enumerate(self.rules):
+            kind = get_rule_kind(rule)
+            if kind is None:
+                self.fallback_positions.append(position)
+                continue
+
+            ip = rule["src_ip"] if kind == "src" else rule["dst_ip"]
+            network = ipaddress.ip_network(ip, strict=False)
+            port = int(rule["dst_port"]) if kind == "dport" else 0
+            protocol_code = self.protocol_codes.get(rule["protocol"], 0)
+
+            level = entries[kind].setdefault(network.prefixlen, ([], [], [], []))
+            level[0].append(int(network.network_address))
+            level[1].append(port)
+            level[2].append(protocol_code)
+            level[3].append(position)
+
+        # kind -> prefix length -> (sorted keys, first rule position for each key, has "any" protocol, has specific protocol)
+        self.tables: dict[str, dict[int, tuple[np.ndarray, np.ndarray, bool, bool]]] = {kind: {} for kind in INDEXED_KINDS}
+
+        for kind, levels in entries.items():
+            for prefixlen, (networks, ports, protocol_codes, positions) in sorted(levels.items()):
+                protocol_codes = np.asarray(protocol_codes, dtype=np.uint64)
+                keys = _make_keys(np.asarray(networks), np.asarray(ports), protocol_codes)
+                positions = np.asarray(positions, dtype=np.int64)
+
+                # keep, for each key, the earliest rule in the chain
+                order = np.lexsort((positions, keys))
+                keys, positions = keys[order], positions[order]
+                is_first = np.ones(len(keys), dtype=bool)
+                is_first[1:] = keys[1:] != keys[:-1]
+
+                self.tables[kind][prefixlen] = (
+                    keys[is_first],
+                    positions[is_first],
+                    bool((protocol_codes == 0).any()),
+                    bool((protocol_codes != 0).any()),
+                )
+
+        self.fallback_rules = [self.rules[position] for position in self.fallback_positions]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _lookup(
+        self,
+        kind: str,
+        ip: np.ndarray,
+        is_valid: np.ndarray,
+        protocol_code: np.ndarray,
+        port: np.ndarray,
+        best: np.ndarray,
+    ) -> np.ndarray:
+
+        if len(self.tables[kind]) == 0:
+            return best
+
+        # only look up the flows that can match (valid IP, port and data)
+        rows = np.flatnonzero(is_valid)
+        ip, protocol_code, port = ip[rows], protocol_code[rows], port[rows]
+        no_protocol = np.zeros_like(protocol_code)
+        best_rows = best[rows]
+
+        for prefixlen, (keys, positions, has_any, has_specific) in self.tables[kind].items():
+            netmask = np.uint64(((1 << 32) - 1) ^ ((1 << (32 - prefixlen)) - 1))
+            network = ip & netmask
+
+            for protocol, enabled in ((no_protocol, has_any), (protocol_code, has_specific)):
+                if not enabled:
+                    continue
+                query = _make_keys(network, port, protocol)
+                pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+                hit = keys[pos] == query
+                best_rows = np.where(hit, np.minimum(best_rows, positions[pos]), best_rows)
+
+        best[rows] = best_rows
+        return best
+
+    def evaluate(self, X: pl.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Match all the rules against a DataFrame of flows.
+
+        Args:
+            X (DataFrame): DataFrame with columns: src_ip, dst_ip, protocol, src_port, dst_port, src_data, dst_data.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: boolean mask of the blocked flows, and index of the
+                first rule matching each flow (-1 if no rule matches).
+        """
+
+        X = with_ip_int_columns(X)
+        best = np.full(len(X), NO_MATCH, dtype=np.int64)
+
+        if len(self.rules) == 0:
+            return best < 0, np.full(len(X), -1, dtype=np.int32)
+
+        def ip_array(col: str):
+            ip = X[f"{col}_int"]
+            return ip.fill_null(0).to_numpy().astype(np.uint64), ip.is_not_null().to_numpy()
+
+        def port_array(col: str):
+            port = X[col]
+            is_valid = (port >= 0) & (port < (1 << 16))
+            return port.fill_null(0).clip(0, (1 << 16) - 1).to_numpy().astype(np.uint64), is_valid.fill_null(False).to_numpy()
+
+        src_ip, src_ip_valid = ip_array("src_ip")
+        dst_ip, dst_ip_valid = ip_array("dst_ip")
+        has_src_data = (X["src_data"] > 0).fill_null(False).to_numpy()
+        has_dst_data = (X["dst_data"] > 0).fill_null(False).to_numpy()
+
+        protocol_code = (
+            X["protocol"]
+            .replace_strict(self.protocol_codes, default=0, return_dtype=pl.UInt64)
+            .fill_null(0)
+            .to_numpy()
+        )
+        no_port = np.zeros(len(X), dtype=np.uint64)
+
+        # -s <ip>: (src_ip in net & src_data > 0) | (dst_ip in net & dst_data > 0)
+        best = self._lookup("src", src_ip, src_ip_valid & has_src_data, protocol_code, no_port, best)
+        best = self._lookup("src", dst_ip, dst_ip_valid & has_dst_data, protocol_code, no_port, best)
+
+        # -d <ip>: (dst_ip in net & src_data > 0) | (src_ip in net & dst_data > 0)
+        best = self._lookup("dst", dst_ip, dst_ip_valid & has_src_data, protocol_code, no_port, best)
+        best = self._lookup("dst", src_ip, src_ip_valid & has_dst_data, protocol_code, no_port, best)
+
+        # -d <ip> --dport <port>: (src_ip in net & src_port == port & src_data > 0) | (dst_ip in net & dst_port == port & dst_data > 0)
+        if len(self.tables["dport"]) > 0:
+            src_port, src_port_valid = port_array("src_port")
+            dst_port, dst_port_valid = port_array("dst_port")
+            best = self._lookup("dport", src_ip, src_ip_valid & src_port_valid & has_src_data, protocol_code, src_port, best)
+            best = self._lookup("dport", dst_ip, dst_ip_valid & dst_port_valid & has_dst_data, protocol_code, dst_port, best)
+
+        if len(self.fallback_rules) > 0:
+            # with_columns (rather than select) broadcasts rules without conditions, e.g. `-A FORWARD -j DROP`
+            fallback = X.with_columns(
+                [rule_expr(rule).fill_null(False).alias(f"__rule_{i}") for i, rule in enumerate(self.fallback_rules)]
+            )
+            for i, position in enumerate(self.fallback_positions):
+                is_match = fallback[f"__rule_{i}"].to_numpy()
+                best = np.where(is_match, np.minimum(best, position), best)
+
+        mask = best != NO_MATCH
+        first_rule = np.where(mask, best, -1).astype(np.int32)
+
+        return mask, first_rule
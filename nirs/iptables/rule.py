@@ -9,11 +9,13 @@ You should have received a copy of the license along with this
 program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
 """
 
+from functools import cached_property
+
 import numpy as np
 import polars as pl
 
 from .parser import parse_iptables_rule
-from .match import match_rule_df
+from .match import rule_expr, with_ip_int_columns
 
 
 class IptablesRule:
@@ -29,8 +31,22 @@ class IptablesRule:
         self.rule["str"] = f"{rule_str}"
         self.rule["dict"] = parse_iptables_rule(rule_str)
 
+    @cached_property
+    def expr(self) -> pl.Expr:
+        """
+        Boolean expression matching the flows blocked by the rule, compiled once from the parsed rule.
+        It can be combined with other predicates in a LazyFrame query (see `filter`).
+        """
+        return rule_expr(self.rule["dict"])
+
+    def filter(self, X: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Keep only the flows matched by the rule. With a LazyFrame, the filter is added to the query plan.
+        """
+        return with_ip_int_columns(X).filter(self.expr)
+
     def match_df(self, X: pl.DataFrame) -> np.ndarray:
-        return match_rule_df(X, self.rule["dict"])
+        return self.filter(X)["idx"].to_numpy()
 
     def get_rule_dict(self):
         return self.rule["dict"]
@@ -0,0 +1,155 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import ipaddress
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
+from .rule import IptablesRule
+from .compiled import CompiledRuleset
+from .compact import compact_rules
+from .parser import format_iptables_rule
+
+
+def canonical_rule_key(rule_dict: dict) -> tuple:
+    """
+    Canonical (hashable) representation of a parsed rule, so that equivalent spellings
+    of the same rule (e.g. `-s 10.0.0.1/24` and `-s 10.0.0.0/24`) share the same key.
+    """
+
+    key = dict(rule_dict)
+
+    for field in ["src_ip", "dst_ip"]:
+        if key[field] != "any":
+            network = ipaddress.ip_network(key[field], strict=False)
+            if network.prefixlen == network.max_prefixlen:
+                key[field] = str(network.network_address)
+            else:
+                key[field] = str(network)
+
+    for field in ["src_port", "dst_port"]:
+        if key[field] != "any":
+            key[field] = str(int(key[field]))
+
+    return tuple(sorted(key.items()))
+
+
+class Ruleset:
+    """
+    Ordered container of iptables rules, indexed by their canonical key.
+
+    Membership tests and insertions are O(1), eviction drops the oldest rules first
+    (same as keeping `ruleset[-max_rules:]` of a list), and snapshots/compiled rulesets
+    are cached until the ruleset changes.
+    """
+
+    def __init__(self, rules: Iterable[IptablesRule] = ()):
+        self._rules: OrderedDict[tuple, IptablesRule] = OrderedDict()
+
+        # incremented at every change, used to invalidate the cached snapshot and compiled ruleset
+        self.version = 0
+        self._snapshot: tuple[IptablesRule, ...] = ()
+        self._snapshot_version = 0
+        self._compiled = CompiledRuleset([])
+        self._compiled_version = 0
+
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def __iter__(self) -> Iterator[IptablesRule]:
+        return iter(self.snapshot())
+
+    def __getitem__(self, i):
+        return self.snapshot()[i]
+
+    def __contains__(self, rule: IptablesRule) -> bool:
+        return canonical_rule_key(rule.get_rule_dict()) in self._rules
+
+    def __repr__(self) -> str:
+        return f"Ruleset({list(self.snapshot())})"
+
+    def add(self, rule: IptablesRule) -> bool:
+        """
+        Append a rule at the end of the ruleset.
+
+        Returns:
+            bool: False if an equivalent rule is already in the ruleset (the ruleset is unchanged), True otherwise.
+        """
+        key = canonical_rule_key(rule.get_rule_dict())
+        if key in self._rules:
+            return False
+
+        self._rules[key] = rule
+        self.version += 1
+        return True
+
+    def remove(self, rule: IptablesRule) -> None:
+        del self._rules[canonical_rule_key(rule.get_rule_dict())]
+        self.version += 1
+
+    def trim(self, max_rules: int) -> list[IptablesRule]:
+        """
+        Evict the oldest rules until at most `max_rules` are left.
+
+        Returns:
+            list[IptablesRule]: the evicted rules.
+        """
+        evicted = []
+        while len(self._rules) > max_rules:
+            _, rule = self._rules.popitem(last=False)
+            evicted.append(rule)
+
+        if len(evicted) > 0:
+            self.version += 1
+        return evicted
+
+    def compact(self) -> bool:
+        """
+        Drop shadowed rules and aggregate host rules into CIDR blocks, without changing
+        the set of blocked flows (see `compact_rules`).
+
+        Returns:
+            bool: True if the ruleset changed.
+        """
+        rules = self.snapshot()
+        compacted = compact_rules([rule.get_rule_dict() for rule in rules])
+
+        # rules that are not modified by the compaction keep their IptablesRule object
+        by_dict_id = {id(rule.get_rule_dict()): rule for rule in rules}
+        new_rules = [by_dict_id.get(id(rule_dict)) or IptablesRule(format_iptables_rule(rule_dict)) for rule_dict in compacted]
+
+        if len(new_rules) == len(rules) and all(a is b for a, b in zip(new_rules, rules)):
+            return False
+
+        self._rules = OrderedDict((canonical_rule_key(rule.get_rule_dict()), rule) for rule in new_rules)
+        self.version += 1
+        return True
+
+    def items(self) -> list[tuple[tuple, IptablesRule]]:
+        """(canonical key, rule) pairs, in chain order."""
+        return list(self._rules.items())
+
+    def snapshot(self) -> tuple[IptablesRule, ...]:
+        """Immutable view of the rules, in chain order (cached until the ruleset changes)."""
+        if self._snapshot_version != self.version:
+            self._snapshot = tuple(self._rules.values())
+            self._snapshot_version = self.version
+        return self._snapshot
+
+    def compile(self) -> CompiledRuleset:
+        """Rules compiled for single-pass matching (cached until the ruleset changes)."""
+        if self._compiled_version != self.version:
+            self._compiled = CompiledRuleset([rule.get_rule_dict() for rule in self.snapshot()])
+            self._compiled_version = self.version
+        return self._compiled
@@ -0,0 +1,106 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import json
+import resource
+import sys
+
+import polars as pl
+
+from nirs.iptables import Ruleset
+
+
+def peak_rss_bytes() -> int:
+    """
+    Returns:
+        int: peak resident set size of the current process, in bytes.
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        return peak_rss
+    return peak_rss * 1024
+
+
+def estimate_ruleset_size(ruleset: Ruleset) -> int:
+    """
+    Returns:
+        int: estimated size in bytes of the rules of a ruleset (rule strings and parsed fields).
+    """
+    size = 0
+    for rule in ruleset:
+        rule_dict = rule.get_rule_dict()
+        size += sys.getsizeof(str(rule)) + sys.getsizeof(rule_dict)
+        size += sum(sys.getsizeof(value) for value in rule_dict.values())
+    return size
+
+
+def keep_tail_bytes(df: pl.DataFrame, max_bytes: int) -> pl.DataFrame:
+    """
+    Drop the first rows of a DataFrame until its estimated size is at most `max_bytes`.
+
+    Args:
+        df (DataFrame): frame sorted from oldest to most recent rows.
+        max_bytes (int): byte budget of the frame.
+
+    Returns:
+        DataFrame: the most recent rows of `df` that fit in the budget.
+    """
+    n = len(df)
+    size = df.estimated_size()
+    if size <= max_bytes:
+        return df
+
+    while n > 0 and size > max_bytes:
+        # estimated_size is (almost) proportional to the number of rows
+        n = min(n - 1, int(n * max_bytes / size))
+        size = df.tail(n).estimated_size()
+    return df.tail(n)
+
+
+class MemoryTracker:
+    """
+    Estimated size of the frames of an evaluation (NIRS windows, ruleset, evaluation frame)
+    and peak RSS of the process, recorded at each update of the NIRS.
+    """
+
+    def __init__(self):
+        self._records: list[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, iteration: int | None, **sizes: int) -> None:
+        """
+        Args:
+            iteration (int | None): iteration of the evaluation loop.
+            **sizes: estimated sizes in bytes, e.g. alert_window_bytes=...
+        """
+        self._records.append({
+            "iteration": iteration,
+            **sizes,
+            "peak_rss_bytes": peak_rss_bytes(),
+        })
+
+    def to_polars(self) -> pl.DataFrame:
+        """
+        Returns:
+            DataFrame: one row per record, with columns: iteration, one column per recorded size, peak_rss_bytes.
+        """
+        if len(self._records) == 0:
+            return pl.DataFrame(schema={"iteration": pl.Int64, "peak_rss_bytes": pl.Int64})
+        return pl.from_dicts(self._records, infer_schema_length=None)
+
+    def write_jsonl(self, path: str) -> None:
+        """Write the records as JSON lines (one record per line)."""
+        with open(path, "w") as f:
+            for record in self._records:
+                f.write(json.dumps(record) + "\n")
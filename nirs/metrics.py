@@ -0,0 +1,169 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+from typing import Callable
+
+import numpy as np
+import polars as pl
+
+COUNTER_NAMES = [
+    "malicious_flows",
+    "benign_flows",
+    "malicious_blocked",
+    "benign_blocked",
+    "malicious_bytes",
+    "benign_bytes",
+    "malicious_blocked_bytes",
+    "benign_blocked_bytes",
+]
+
+
+def time_to_block(df: pl.DataFrame, res_df: pl.DataFrame, by: str = "type") -> pl.DataFrame:
+    """
+    Time between the first malicious flow of each attack and its first blocked flow.
+
+    Args:
+        df (DataFrame): evaluated flows, with columns: timestamp, label and `by`.
+        res_df (DataFrame): results of the evaluation (aligned with `df`), with column: is_blocked.
+        by (str): column identifying the attacks, e.g. "type" (attack category) or "src_ip" (attacker).
+
+    Returns:
+        DataFrame: one row per attack, with columns: `by`, n_flows, t_first (first malicious flow),
+            t_first_blocked (first blocked malicious flow, null if none), time_to_block_ms,
+            cbr (fraction of blocked malicious flows).
+    """
+
+    return (
+        df.select("timestamp", "label", by)
+        .with_columns(res_df["is_blocked"])
+        .filter(pl.col("label") == 1)
+        .group_by(by)
+        .agg(
+            pl.len().alias("n_flows"),
+            pl.col("timestamp").min().alias("t_first"),
+            pl.col("timestamp").filter(pl.col("is_blocked") > 0).min().alias("t_first_blocked"),
+            pl.col("is_blocked").mean().alias("cbr"),
+        )
+        .with_columns((pl.col("t_first_blocked") - pl.col("t_first")).alias("time_to_block_ms"))
+        .select(by, "n_flows", "t_first", "t_first_blocked", "time_to_block_ms", "cbr")
+        .sort(by)
+    )
+
+
+class OnlineMetrics:
+    """
+    Running counters of correctly and wrongly blocked flows and bytes, updated by the evaluation loop
+    as flows get past the evaluation windows (i.e. their blocked state is final), plus the first-block
+    latency of each attack (e.g. attack type).
+
+    The per-window counters are available at any time with `to_polars()`, and an evaluation stops early
+    when `stop_when(metrics)` returns True, e.g. `stop_when=lambda m: m.wbr > 0.05`.
+    """
+
+    def __init__(self, by: str = "type", stop_when: Callable[["OnlineMetrics"], bool] | None = None):
+        self.by = by
+        self.stop_when = stop_when
+
+        self._windows: list[dict] = []
+        # counters of all the flows seen so far
+        self.totals = dict.fromkeys(COUNTER_NAMES, 0)
+        # attack -> [t_first, t_first_blocked]
+        self._attacks: dict = {}
+
+    @property
+    def cbr(self) -> float:
+        """Fraction of the malicious flows seen so far that were blocked."""
+        return self.totals["malicious_blocked"] / max(1, self.totals["malicious_flows"])
+
+    @property
+    def wbr(self) -> float:
+        """Fraction of the benign flows seen so far that were blocked."""
+        return self.totals["benign_blocked"] / max(1, self.totals["benign_flows"])
+
+    def should_stop(self) -> bool:
+        return self.stop_when is not None and self.stop_when(self)
+
+    def update(self, iteration: int | None, t_end: float | None, df: pl.DataFrame, is_blocked: np.ndarray) -> None:
+        """
+        Args:
+            iteration (int | None): iteration of the evaluation loop.
+            t_end (float | None): end of the window (None for the flows after the last window).
+            df (DataFrame): flows whose blocked state is final, with columns: timestamp, label, src_data, dst_data,
+                and `by` if it exists.
+            is_blocked (np.ndarray): blocked state of the flows.
+        """
+
+        is_malicious = (df["label"] == 1).fill_null(False).to_numpy()
+        n_bytes = (df["src_data"].fill_null(0) + df["dst_data"].fill_null(0)).to_numpy()
+
+        counters = {
+            "malicious_flows": int(is_malicious.sum()),
+            "benign_flows": int((~is_malicious).sum()),
+            "malicious_blocked": int((is_malicious & is_blocked).sum()),
+            "benign_blocked": int((~is_malicious & is_blocked).sum()),
+            "malicious_bytes": int(n_bytes[is_malicious].sum()),
+            "benign_bytes": int(n_bytes[~is_malicious].sum()),
+            "malicious_blocked_bytes": int(n_bytes[is_malicious & is_blocked].sum()),
+            "benign_blocked_bytes": int(n_bytes[~is_malicious & is_blocked].sum()),
+        }
+        for name, value in counters.items():
+            self.totals[name] += value
+
+        self._windows.append({"iteration": iteration, "t_end": t_end, **counters, "cbr": self.cbr, "wbr": self.wbr})
+
+        if self.by in df.columns and is_malicious.any():
+            first = (
+                df.select(self.by, "timestamp")
+                .with_columns(is_blocked=pl.Series(is_blocked))
+                .filter(pl.Series(is_malicious))
+                .group_by(self.by)
+                .agg(
+                    pl.col("timestamp").min().alias("t_first"),
+                    pl.col("timestamp").filter(pl.col("is_blocked")).min().alias("t_first_blocked"),
+                )
+            )
+            for attack, t_first, t_first_blocked in first.iter_rows():
+                latencies = self._attacks.setdefault(attack, [t_first, None])
+                if latencies[1] is None:
+                    latencies[1] = t_first_blocked
+
+    def to_polars(self) -> pl.DataFrame:
+        """
+        Returns:
+            DataFrame: one row per window, with columns: iteration, t_end, the counters of the flows of the window
+                (malicious/benign flows, blocked flows, bytes and blocked bytes), and the running cbr and wbr.
+        """
+        return pl.DataFrame(
+            self._windows,
+            schema={
+                "iteration": pl.Int64,
+                "t_end": pl.Float64,
+                **{name: pl.Int64 for name in COUNTER_NAMES},
+                "cbr": pl.Float64,
+                "wbr": pl.Float64,
+            },
+        )
+
+    def time_to_block(self) -> pl.DataFrame:
+        """
+        Returns:
+            DataFrame: one row per attack, with columns: `by`, t_first, t_first_blocked (null if never blocked),
+                time_to_block_ms (same as `time_to_block`).
+        """
+        return (
+            pl.DataFrame({
+                self.by: list(self._attacks.keys()),
+                "t_first": pl.Series([t_first for t_first, _ in self._attacks.values()], dtype=pl.Float64),
+                "t_first_blocked": pl.Series([t for _, t in self._attacks.values()], dtype=pl.Float64),
+            })
+            .with_columns((pl.col("t_first_blocked") - pl.col("t_first")).alias("time_to_block_ms"))
+            .sort(self.by)
+        )
@@ -14,13 +14,20 @@ from typing import Callable
 import numpy as np
 import polars as pl
 
-from nirs.iptables import IptablesRule
+from nirs.iptables import IptablesRule, Ruleset, RuleCounters
+from nirs.iptables.match import with_ip_int_columns
+from nirs.memory import estimate_ruleset_size, keep_tail_bytes
+from nirs.profiling import StageTimer
+from nirs.window import ChunkedWindow
 
 class BaseNIRS:
 
     def __init__(self) -> None:
 
-        self.ruleset: list[IptablesRule] = []
+        self.ruleset = Ruleset()
+
+        # per-stage timings, enabled by passing a StageTimer to eval_nirs
+        self.timer = StageTimer(enabled=False)
         pass
 
     def apply_rules(self, X: pl.DataFrame) -> np.ndarray:
@@ -32,10 +39,28 @@ class BaseNIRS:
 
         return
 
+    def state_dict(self) -> dict:
+        """
+        State of the NIRS that changes during an evaluation (see `nirs.checkpoint`).
+
+        Returns:
+            dict: JSON-serializable values and DataFrames.
+        """
+        return {"rules": [str(rule) for rule in self.ruleset]}
+
+    def load_state_dict(self, state: dict) -> None:
+        self.ruleset = Ruleset(IptablesRule(rule_str) for rule_str in state["rules"])
 
-def update_ruleset_default(ruleset: list, alert_df: pl.DataFrame, benign_df: pl.DataFrame, max_rules: int):
-        if len(ruleset) > max_rules:
-            return ruleset[-max_rules:]
+    def memory_usage(self) -> dict:
+        """
+        Returns:
+            dict: estimated size in bytes of the state of the NIRS, e.g. {"ruleset_bytes": ...}.
+        """
+        return {"ruleset_bytes": estimate_ruleset_size(self.ruleset)}
+
+
+def update_ruleset_default(ruleset: Ruleset, alert_df: pl.DataFrame, benign_df: pl.DataFrame, max_rules: int):
+        ruleset.trim(max_rules)
         return ruleset
 
 
@@ -48,7 +73,9 @@ class WindowNIRS(BaseNIRS):
         max_alert_window_len_ms: int, 
         benign_traffic_window_len_ms: int, 
         max_rules: int,
-        update_ruleset_fn: Callable | None = None
+        update_ruleset_fn: Callable | None = None,
+        compact_ruleset: bool = False,
+        max_window_bytes: int | None = None,
         ):
 
         super().__init__()
@@ -57,9 +84,13 @@ class WindowNIRS(BaseNIRS):
         self.max_alert_window_len_ms = max_alert_window_len_ms
         self.benign_traffic_window_len_ms = benign_traffic_window_len_ms
         self.max_rules = max_rules
+        # drop shadowed rules and merge host rules into CIDR blocks after each update
+        self.compact_ruleset = compact_ruleset
+        # byte budget of benign_window + alert_window, the oldest flows are dropped when it is exceeded
+        self.max_window_bytes = max_window_bytes
+        self.n_trimmed_flows = 0
 
-
-        self.benign_window = pl.DataFrame(schema={
+        window_schema = {
             'timestamp': pl.Int64,
             'src_ip': pl.Utf8,
             'src_port': pl.Int64,
@@ -68,19 +99,17 @@ class WindowNIRS(BaseNIRS):
             'src_data': pl.Int64,
             'dst_data': pl.Int64,
             'protocol': pl.Utf8,
-        })
-        self.alert_window = pl.DataFrame(schema={
-            'timestamp': pl.Int64,
-            'src_ip': pl.Utf8,
-            'src_port': pl.Int64,
-            'dst_ip': pl.Utf8,
-            'dst_port': pl.Int64,
-            'src_data': pl.Int64,
-            'dst_data': pl.Int64,
-            'protocol': pl.Utf8,
-        })
+            'src_ip_int': pl.UInt32,
+            'dst_ip_int': pl.UInt32,
+        }
+        # windows are stored as chunks of flows, see `benign_window` and `alert_window` for the flows as a DataFrame
+        self.benign_chunks = ChunkedWindow(window_schema)
+        self.alert_chunks = ChunkedWindow(window_schema)
 
-        self.ruleset: list[IptablesRule] = []
+        self.ruleset = Ruleset()
+
+        # flows and bytes matched by each rule, at each call to apply_rules
+        self.rule_counters = RuleCounters()
 
         if update_ruleset_fn is None:
             self.update_ruleset = update_ruleset_default
@@ -88,54 +117,135 @@ class WindowNIRS(BaseNIRS):
             self.update_ruleset = update_ruleset_fn
 
 
+    @property
+    def benign_window(self) -> pl.DataFrame:
+        return self.benign_chunks.frame()
+
+    @benign_window.setter
+    def benign_window(self, df: pl.DataFrame) -> None:
+        self.benign_chunks.replace(df)
+
+    @property
+    def alert_window(self) -> pl.DataFrame:
+        return self.alert_chunks.frame()
+
+    @alert_window.setter
+    def alert_window(self, df: pl.DataFrame) -> None:
+        self.alert_chunks.replace(df)
+
+
+    def unblocked_windows(self, ruleset: Ruleset) -> tuple[pl.DataFrame, pl.DataFrame]:
+        """
+        alert_window and benign_window without the flows blocked by the ruleset. Which rules match each flow
+        is cached with the windows, so only the new flows and the new rules are matched (see `ChunkedWindow.not_blocked`).
+        """
+        return self.alert_chunks.not_blocked(ruleset), self.benign_chunks.not_blocked(ruleset)
+
+
     def apply_rules(self, X: pl.DataFrame):
-        
-        idx_blocked = np.asarray([])
-        for rule in self.ruleset:
-            idx_blocked = np.append(idx_blocked, rule.match_df(X))
+
+        mask, first_rule = self.ruleset.compile().evaluate(X)
+        self.rule_counters.record(self.ruleset.snapshot(), X, first_rule)
+        idx_blocked = X["idx"].to_numpy()[mask]
 
         return idx_blocked
 
 
+    def state_dict(self) -> dict:
+        # NOTE: rule_counters are not part of the state, they only cover the windows since the NIRS was created
+        state = super().state_dict()
+        state["alert_window"] = self.alert_window
+        state["benign_window"] = self.benign_window
+        state["n_trimmed_flows"] = self.n_trimmed_flows
+        return state
+
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.alert_window = state["alert_window"].cast(self.alert_window.schema)
+        self.benign_window = state["benign_window"].cast(self.benign_window.schema)
+        self.n_trimmed_flows = state.get("n_trimmed_flows", 0)
+
+
+    def memory_usage(self) -> dict:
+        usage = super().memory_usage()
+        usage["alert_window_bytes"] = self.alert_window.estimated_size()
+        usage["benign_window_bytes"] = self.benign_window.estimated_size()
+        return usage
+
+
+    def enforce_window_budget(self) -> None:
+        """
+        If benign_window and alert_window exceed `max_window_bytes`, drop their oldest flows:
+        first from benign_window, then from alert_window if benign_window alone does not free enough memory.
+        """
+        if self.max_window_bytes is None:
+            return
+
+        benign_bytes = self.benign_window.estimated_size()
+        alert_bytes = self.alert_window.estimated_size()
+        if benign_bytes + alert_bytes <= self.max_window_bytes:
+            return
+
+        n_flows = len(self.benign_window) + len(self.alert_window)
+
+        self.benign_window = keep_tail_bytes(self.benign_window, max(0, self.max_window_bytes - alert_bytes))
+        self.alert_window = keep_tail_bytes(self.alert_window, self.max_window_bytes - self.benign_window.estimated_size())
+
+        n_trimmed = n_flows - len(self.benign_window) - len(self.alert_window)
+        self.n_trimmed_flows += n_trimmed
+        print(f"Window budget of {self.max_window_bytes} bytes exceeded, dropped {n_trimmed} flows")
+
+
     def update(self, df: pl.DataFrame):
 
+        df = with_ip_int_columns(df)
         benign_df = df.filter(pl.col("is_alert") == 0)
         alert_df = df.filter(pl.col("is_alert") == 1)
 
-        self.ingest_benign_df(benign_df)
+        with self.timer.stage("ingest_benign_df", n_flows=len(benign_df)) as record:
+            self.ingest_benign_df(benign_df)
+            record["window_len"] = len(self.benign_window)
 
         if len(alert_df) > 0:
-            self.ingest_alert_df(alert_df)
-            self.ruleset = self.update_ruleset(self.ruleset, self.alert_window, self.benign_window, self.max_rules)
+            with self.timer.stage("ingest_alert_df", n_flows=len(alert_df)) as record:
+                self.ingest_alert_df(alert_df)
+                record["window_len"] = len(self.alert_window)
+
+            with self.timer.stage("update_ruleset") as record:
+                self.ruleset = self.update_ruleset(self.ruleset, self.alert_window, self.benign_window, self.max_rules)
+                if self.compact_ruleset:
+                    self.ruleset.compact()
+                record["n_rules"] = len(self.ruleset)
 
         return
 
 
     def ingest_benign_df(self, benign_df: pl.DataFrame):
-        self.benign_window  = pl.concat([self.benign_window, benign_df[self.benign_window.columns]], how="vertical")
+        self.benign_chunks.append(benign_df)
 
-        if self.benign_window.shape[0] > 0:
-            t_max = self.alert_window["timestamp"].max()
+        if len(self.benign_chunks) > 0:
+            t_max = self.alert_chunks.t_max()
 
             if not isinstance(t_max, (int, float)):
                 t_max = float("inf")
 
             self.max_timestamp = t_max
-            self.benign_window = self.benign_window.filter(
-                pl.col("timestamp") > self.max_timestamp - self.benign_traffic_window_len_ms
-            )
+            self.benign_chunks.evict(self.max_timestamp - self.benign_traffic_window_len_ms)
 
+        self.enforce_window_budget()
 
         return
 
     def ingest_alert_df(self, alert_df: pl.DataFrame):
         
-        if self.alert_window.shape[0] == 0:
-            self.alert_window = alert_df[self.alert_window.columns]
+        if len(self.alert_chunks) == 0:
+            self.alert_chunks.replace(alert_df)
+            self.enforce_window_budget()
             return
         
         t_min = alert_df["timestamp"].min()
-        t_max = self.alert_window["timestamp"].max()
+        t_max = self.alert_chunks.t_max()
 
         if not isinstance(t_min, (int, float)):
             t_min = 0
@@ -144,12 +254,13 @@ class WindowNIRS(BaseNIRS):
             t_max = float("inf")
 
         if t_max - t_min > self.max_alert_window_idle_ms:
-            self.alert_window = alert_df[self.alert_window.columns]
+            self.alert_chunks.replace(alert_df)
         else:
-            self.alert_window  = pl.concat([self.alert_window, alert_df[self.alert_window.columns]], how="vertical")
+            self.alert_chunks.append(alert_df)
 
         self.max_timestamp = t_max
-        self.alert_window = self.alert_window.filter(pl.col("timestamp") > self.max_timestamp - self.max_alert_window_len_ms)
+        self.alert_chunks.evict(self.max_timestamp - self.max_alert_window_len_ms)
 
-        return
+        self.enforce_window_budget()
 
+        return
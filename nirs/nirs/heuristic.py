@@ -9,65 +9,493 @@ You should have received a copy of the license along with this
 program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
 """
 
-import numpy as np
+import ipaddress
+from typing import Iterable
+
 import polars as pl
 
 from .base import WindowNIRS
 
-from nirs.iptables import IptablesRule
+from nirs.iptables import IptablesRule, Ruleset
+from nirs.iptables.match import uint32_to_ip, with_ip_int_columns
 
 
-def _update_ruleset(
-    ruleset: list,
-    alert_df: pl.DataFrame,
-    benign_df: pl.DataFrame,
-    max_rules: int,
-    frac_benign_tolerance: float = 1e-1,
-):
-    # apply current ruleset first (avoids repeating rules)
-    alert_df = alert_df.with_columns(
-        pl.Series(values=np.arange(len(alert_df)), name="idx")
+def _is_src_rule(rule_dict: dict) -> bool:
+    # rules of the form `-s <ip>[/<subnet>] -j DROP`, the only ones produced by HeuristicNIRS (and by compacting them)
+    return (
+        rule_dict["src_ip"] != "any"
+        and rule_dict["dst_ip"] == "any"
+        and rule_dict["src_port"] == "any"
+        and rule_dict["dst_port"] == "any"
+        and rule_dict["protocol"] == "any"
+    )
+
+
+def _netmask(prefix_len: int) -> int:
+    return ((1 << 32) - 1) ^ ((1 << (32 - prefix_len)) - 1)
+
+
+class IpFrequencies:
+    """
+    Number of flows of a window in which each IP appears (as source or destination), number of flows
+    between each pair of IPs, and number of flows in which each network of the given prefix lengths appears,
+    among the flows that are not blocked by a ruleset, i.e. the `_prefix_counts` of the windows in `_update_ruleset`.
+
+    The counts are maintained as flows enter and leave the window (see `ChunkedWindow.observers`), and as
+    rules are added to or removed from the ruleset (see `sync`), so that their cost is proportional to the
+    change since the last update instead of the size of the window. To do so, flows are aggregated by
+    (src_ip, dst_ip, src_data > 0, dst_data > 0), which is all that `-s <ip>[/<subnet>]` rules match on.
+    """
+
+    def __init__(self, prefix_lengths: tuple[int, ...] = (32,)):
+        self.prefix_lengths = tuple(prefix_lengths)
+
+        # IP -> number of flows not blocked by the ruleset (as src or dst, flows from an IP to itself count twice)
+        self.counts: dict[str, int] = {}
+        # (src_ip, dst_ip) -> number of flows not blocked by the ruleset
+        self.pair_counts: dict[tuple, int] = {}
+        # network (same format as the rules, e.g. "10.0.1.0/24" or "10.0.1.5") -> number of flows not blocked by
+        # the ruleset in which it appears (flows within the network count once, see `_prefix_counts`)
+        self.network_counts: dict[str, int] = {}
+        # number of flows not blocked by the ruleset
+        self.n_flows = 0
+
+        # (src_ip, dst_ip, src_has_data, dst_has_data) -> number of flows in the window
+        self._pairs: dict[tuple, int] = {}
+        # IP of the window -> pairs in which it appears, and its UInt32 representation (see `ip_to_uint32`)
+        self._pairs_by_ip: dict[str, set[tuple]] = {}
+        self._ip_ints: dict[str, int | None] = {}
+
+        # network of `network_counts` -> (prefix_len, UInt32 network address), and (prefix_len, network address) -> network
+        self._network_keys: dict[str, tuple[int, int | None]] = {}
+        self._network_names: dict[tuple[int, int], str] = {}
+
+        # source networks of the synced ruleset, and IPs of the window matched by one of them
+        self._networks: dict[str, ipaddress.IPv4Network | ipaddress.IPv6Network] = {}
+        self._blocked_ips: set[str] = set()
+        # prefix_len -> network address -> IPv4 addresses of the window in that network, for the prefix lengths
+        # of the rules synced so far (to find the IPs matched by a rule without scanning the window)
+        self._ips_by_network: dict[int, dict[int, set[str]]] = {}
+
+    def _is_blocked_ip(self, ip: str) -> bool:
+        # same matching as `match_ip`: IPv4 networks on the UInt32 representation, IPv6 hosts by string
+        ip_int = self._ip_ints[ip]
+        for src_ip, network in self._networks.items():
+            if network.version == 4:
+                if ip_int is not None and ip_int & int(network.netmask) == int(network.network_address):
+                    return True
+            elif network.prefixlen == network.max_prefixlen and ip == src_ip:
+                return True
+        return False
+
+    def _is_blocked_pair(self, pair: tuple) -> bool:
+        src_ip, dst_ip, src_has_data, dst_has_data = pair
+        return (src_has_data and src_ip in self._blocked_ips) or (dst_has_data and dst_ip in self._blocked_ips)
+
+    def _network(self, ip: str | None, prefix_len: int) -> str | None:
+        # network of an IP in `network_counts`, None if it has none (null IP, or not IPv4 for prefix_len < 32)
+        if ip is None:
+            return None
+        ip_int = self._ip_ints[ip]
+        if prefix_len == 32:
+            # hosts keep their string, which also covers the IPs that are not IPv4
+            if ip not in self._network_keys:
+                self._network_keys[ip] = (32, ip_int)
+            return ip
+        if ip_int is None:
+            return None
+
+        key = (prefix_len, ip_int & _netmask(prefix_len))
+        network = self._network_names.get(key)
+        if network is None:
+            network = f"{ipaddress.IPv4Address(key[1])}/{prefix_len}"
+            self._network_names[key] = network
+            self._network_keys[network] = key
+        return network
+
+    def _count_network(self, network: str, n: int) -> None:
+        count = self.network_counts.get(network, 0) + n
+        if count != 0:
+            self.network_counts[network] = count
+            return
+
+        self.network_counts.pop(network, None)
+        prefix_len, address = self._network_keys.pop(network)
+        if prefix_len < 32:
+            del self._network_names[(prefix_len, address)]
+
+    def _count(self, pair: tuple, n: int) -> None:
+        for ip in pair[:2]:
+            if ip is None:
+                continue
+            count = self.counts.get(ip, 0) + n
+            if count == 0:
+                del self.counts[ip]
+            else:
+                self.counts[ip] = count
+
+        key = pair[:2]
+        count = self.pair_counts.get(key, 0) + n
+        if count == 0:
+            del self.pair_counts[key]
+        else:
+            self.pair_counts[key] = count
+
+        for prefix_len in self.prefix_lengths:
+            src_network = self._network(pair[0], prefix_len)
+            dst_network = self._network(pair[1], prefix_len)
+            if src_network is not None:
+                self._count_network(src_network, n)
+            if dst_network is not None and dst_network != src_network:
+                self._count_network(dst_network, n)
+
+        self.n_flows += n
+
+    def _index_ip(self, ip: str, add: bool) -> None:
+        ip_int = self._ip_ints[ip]
+        if ip_int is None:
+            return
+        for prefix_len, ips_by_network in self._ips_by_network.items():
+            address = ip_int & _netmask(prefix_len)
+            if add:
+                ips_by_network.setdefault(address, set()).add(ip)
+            else:
+                ips_by_network[address].discard(ip)
+                if len(ips_by_network[address]) == 0:
+                    del ips_by_network[address]
+
+    def _ips_in(self, network: ipaddress.IPv4Network) -> set[str]:
+        # IPs of the window in an IPv4 network (the index of its prefix length is built on first use)
+        prefix_len = network.prefixlen
+        if prefix_len not in self._ips_by_network:
+            ips_by_network = {}
+            for ip, ip_int in self._ip_ints.items():
+                if ip_int is not None:
+                    ips_by_network.setdefault(ip_int & _netmask(prefix_len), set()).add(ip)
+            self._ips_by_network[prefix_len] = ips_by_network
+        return self._ips_by_network[prefix_len].get(int(network.network_address), set())
+
+    def _add_pair(self, pair: tuple, ip_ints: tuple, n: int) -> None:
+        for ip, ip_int in zip(pair[:2], ip_ints):
+            if ip is not None and ip not in self._pairs_by_ip:
+                self._pairs_by_ip[ip] = set()
+                self._ip_ints[ip] = ip_int
+                self._index_ip(ip, add=True)
+                if self._is_blocked_ip(ip):
+                    self._blocked_ips.add(ip)
+
+        if not self._is_blocked_pair(pair):
+            self._count(pair, n)
+
+        count = self._pairs.get(pair, 0) + n
+        if count > 0:
+            self._pairs[pair] = count
+            for ip in pair[:2]:
+                if ip is not None:
+                    self._pairs_by_ip[ip].add(pair)
+            return
+
+        del self._pairs[pair]
+        for ip in pair[:2]:
+            if ip is not None and ip in self._pairs_by_ip:
+                self._pairs_by_ip[ip].discard(pair)
+                if len(self._pairs_by_ip[ip]) == 0:
+                    self._index_ip(ip, add=False)
+                    del self._pairs_by_ip[ip]
+                    del self._ip_ints[ip]
+                    self._blocked_ips.discard(ip)
+
+    def _update(self, df: pl.DataFrame, sign: int) -> None:
+        if len(df) == 0:
+            return
+        pairs = with_ip_int_columns(df).group_by(
+            "src_ip",
+            "dst_ip",
+            (pl.col("src_data") > 0).fill_null(False).alias("src_has_data"),
+            (pl.col("dst_data") > 0).fill_null(False).alias("dst_has_data"),
+        ).agg(
+            pl.col("src_ip_int").first(),
+            pl.col("dst_ip_int").first(),
+            pl.len(),
+        )
+        for src_ip, dst_ip, src_has_data, dst_has_data, src_ip_int, dst_ip_int, n in pairs.iter_rows():
+            self._add_pair((src_ip, dst_ip, src_has_data, dst_has_data), (src_ip_int, dst_ip_int), sign * n)
+
+    def to_polars(self, networks: Iterable[str] | None = None) -> pl.DataFrame:
+        """
+        Args:
+            networks (Iterable[str] | None): networks to return (those without flows are left out), None for all
+                of them. Used to only look up the networks of the alerts in the counts of the benign window.
+
+        Returns:
+            DataFrame: counts of the networks, with columns: ip, prefix_len, network, count (same as `_prefix_counts`).
+        """
+        if networks is None:
+            networks = self.network_counts.keys()
+        else:
+            networks = [network for network in networks if network in self.network_counts]
+
+        names, prefix_lens, addresses, counts = [], [], [], []
+        for network in networks:
+            prefix_len, address = self._network_keys[network]
+            names.append(network)
+            prefix_lens.append(prefix_len)
+            addresses.append(address)
+            counts.append(self.network_counts[network])
+
+        return pl.DataFrame(
+            {"ip": names, "prefix_len": prefix_lens, "network": addresses, "count": counts},
+            schema={"ip": pl.Utf8, "prefix_len": pl.Int64, "network": pl.UInt32, "count": pl.Int64},
+        )
+
+    def on_append(self, df: pl.DataFrame) -> None:
+        self._update(df, 1)
+
+    def on_evict(self, df: pl.DataFrame) -> None:
+        self._update(df, -1)
+
+    def sync(self, ruleset: Ruleset) -> bool:
+        """
+        Update the counts after a change of the ruleset.
+
+        Returns:
+            bool: False if the ruleset has rules other than `-s <ip>[/<subnet>]`, in which case the counts
+                are not valid and the frequencies must be computed from the windows.
+        """
+        rule_dicts = [rule.get_rule_dict() for rule in ruleset]
+        if not all(_is_src_rule(rule_dict) for rule_dict in rule_dicts):
+            return False
+
+        src_ips = {rule_dict["src_ip"] for rule_dict in rule_dicts}
+        changed = src_ips.symmetric_difference(self._networks.keys())
+        if len(changed) == 0:
+            return True
+
+        networks = {src_ip: ipaddress.ip_network(src_ip, strict=False) for src_ip in changed}
+        changed_networks = networks.copy()
+        networks.update(self._networks)
+        self._networks = {src_ip: networks[src_ip] for src_ip in src_ips}
+
+        # IPs of the window matched by the added or removed rules
+        candidates = set()
+        for src_ip, network in changed_networks.items():
+            if network.prefixlen == network.max_prefixlen:
+                candidates.update({src_ip, str(network.network_address)} & self._pairs_by_ip.keys())
+            elif network.version == 4:
+                candidates.update(self._ips_in(network))
+
+        for ip in candidates:
+            is_blocked = self._is_blocked_ip(ip)
+            if is_blocked == (ip in self._blocked_ips):
+                continue
+
+            was_blocked = {pair: self._is_blocked_pair(pair) for pair in self._pairs_by_ip[ip]}
+            if is_blocked:
+                self._blocked_ips.add(ip)
+            else:
+                self._blocked_ips.discard(ip)
+
+            for pair, was_pair_blocked in was_blocked.items():
+                if self._is_blocked_pair(pair) != was_pair_blocked:
+                    self._count(pair, self._pairs[pair] if was_pair_blocked else -self._pairs[pair])
+
+        return True
+
+
+# a network is proposed instead of a more specific candidate only if it covers this fraction more alerts
+PREFIX_ALERT_MARGIN = 0.1
+
+
+def _pair_counts(df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+    # number of flows between each pair of IPs (columns: src_ip, src_ip_int, dst_ip, dst_ip_int, count)
+    return df.group_by("src_ip", "dst_ip").agg(
+        pl.col("src_ip_int").first(),
+        pl.col("dst_ip_int").first(),
+        pl.len().cast(pl.Int64).alias("count"),
     )
-    benign_df = benign_df.with_columns(
-        pl.Series(values=np.arange(len(benign_df)), name="idx")
+
+
+def _prefix_counts(pair_counts: pl.DataFrame | pl.LazyFrame, prefix_lengths: tuple[int, ...]) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Number of flows in which each IP or network appears, as source or destination. A flow whose source and
+    destination are in the same network counts once for that network.
+
+    Args:
+        pair_counts: counts of the pairs of IPs, with columns: src_ip, src_ip_int, dst_ip, dst_ip_int, count
+            (see `_pair_counts`).
+        prefix_lengths (tuple[int, ...]): lengths of the networks, 32 for the IPs themselves.
+
+    Returns:
+        DataFrame | LazyFrame: counts of the networks (with the same format as the rules, e.g. "10.0.1.0/24"
+            or "10.0.1.5" for hosts), with columns: ip, prefix_len, network (UInt32 network address, null for
+            hosts that are not IPv4), count.
+    """
+    lazy = isinstance(pair_counts, pl.LazyFrame)
+    frames = []
+
+    if 32 in prefix_lengths:
+        # hosts keep their string, which also covers the IPs that are not IPv4
+        sides = pl.concat([
+            pair_counts.select(pl.col("src_ip").alias("ip"), pl.col("src_ip_int").alias("network"), "count"),
+            pair_counts.filter(pl.col("src_ip").is_null() | (pl.col("dst_ip") != pl.col("src_ip"))).select(
+                pl.col("dst_ip").alias("ip"), pl.col("dst_ip_int").alias("network"), "count"
+            ),
+        ])
+        frames.append(
+            sides.drop_nulls("ip")
+            .group_by("ip")
+            .agg(pl.col("network").first(), pl.col("count").sum())
+            .select("ip", pl.lit(32, dtype=pl.Int64).alias("prefix_len"), "network", "count")
+        )
+
+    networks = [prefix_len for prefix_len in prefix_lengths if prefix_len < 32]
+    if len(networks) > 0:
+        netmasks = pl.DataFrame({
+            "prefix_len": networks,
+            "netmask": [((1 << 32) - 1) ^ ((1 << (32 - prefix_len)) - 1) for prefix_len in networks],
+        }, schema={"prefix_len": pl.Int64, "netmask": pl.UInt32})
+
+        # all the prefix lengths in a single group_by, on the masked IPv4 addresses
+        masked = pair_counts.join(netmasks.lazy() if lazy else netmasks, how="cross").select(
+            "prefix_len",
+            (pl.col("src_ip_int") & pl.col("netmask")).alias("src_network"),
+            (pl.col("dst_ip_int") & pl.col("netmask")).alias("dst_network"),
+            "count",
+        )
+        sides = pl.concat([
+            masked.select("prefix_len", pl.col("src_network").alias("network"), "count"),
+            masked.filter(pl.col("src_network").is_null() | (pl.col("dst_network") != pl.col("src_network"))).select(
+                "prefix_len", pl.col("dst_network").alias("network"), "count"
+            ),
+        ])
+        frames.append(
+            sides.drop_nulls("network")
+            .group_by("prefix_len", "network")
+            .agg(pl.col("count").sum())
+            .select(
+                (uint32_to_ip(pl.col("network")) + "/" + pl.col("prefix_len").cast(pl.Utf8)).alias("ip"),
+                "prefix_len",
+                "network",
+                "count",
+            )
+        )
+
+    return pl.concat(frames)
+
+
+def _score_candidates(
+    alert_ip_counts: pl.DataFrame | pl.LazyFrame,
+    benign_ip_counts: pl.DataFrame | pl.LazyFrame,
+    n_benign_flows: int,
+    frac_benign_tolerance: float,
+    top_k: int = 1,
+    prefix_alert_margin: float = PREFIX_ALERT_MARGIN,
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Score the IPs (or networks) of the alerts as sources to block: the alerts they cover against the benign
+    flows they would block.
+
+    Among the candidates within the tolerance, a network is dropped if a more specific candidate inside it
+    covers nearly as many alerts (the network does not cover more than `prefix_alert_margin` more alerts), so
+    that the most specific prefix is proposed unless a broader one covers materially more alerts.
+
+    Args:
+        alert_ip_counts, benign_ip_counts: number of flows in which each IP appears in the windows
+            (columns: ip, prefix_len, network, count, see `_prefix_counts`).
+        n_benign_flows (int): number of flows of the benign window.
+        frac_benign_tolerance (float): IPs appearing in more than this fraction of the benign flows are not candidates.
+        top_k (int): number of candidates.
+        prefix_alert_margin (float): fraction of alerts that a network must cover beyond its best sub-network.
+
+    Returns:
+        DataFrame | LazyFrame: the `top_k` candidates with the most alerts, then the most specific ones (then by IP),
+            with columns: ip, prefix_len, n_alerts, n_benign.
+    """
+    candidates = (
+        alert_ip_counts.rename({"count": "n_alerts"})
+        .join(benign_ip_counts.select("ip", pl.col("count").alias("n_benign")), on="ip", how="left")
+        .filter(pl.col("n_benign").is_null() | (pl.col("n_benign") <= frac_benign_tolerance * n_benign_flows))
+        .with_columns(pl.col("n_benign").fill_null(0))
     )
-    for rule in ruleset:
-        idx_blocked_alert = rule.match_df(alert_df)
-        alert_df = alert_df.filter(~pl.col("idx").is_in(idx_blocked_alert))
-        idx_blocked_benign = rule.match_df(benign_df)
-        benign_df = benign_df.filter(~pl.col("idx").is_in(idx_blocked_benign))
-
-    # Get list of all IPs sorted by counts for both benign_df and alert_df
-    alert_ip_counts = (
-        pl.concat([alert_df["src_ip"].alias("ip"), alert_df["dst_ip"].alias("ip")])
-        .to_pandas()
-        .value_counts()
-        .to_dict()
+
+    # most alerts covered by a candidate inside each network (of the prefix lengths of the candidates)
+    netmasks = pl.DataFrame({
+        "parent_prefix_len": range(1, 32),
+        "netmask": [((1 << 32) - 1) ^ ((1 << (32 - prefix_len)) - 1) for prefix_len in range(1, 32)],
+    }, schema={"parent_prefix_len": pl.Int64, "netmask": pl.UInt32})
+    parents = (
+        candidates.select(pl.col("prefix_len").unique().alias("parent_prefix_len"))
+        .join(netmasks.lazy() if isinstance(candidates, pl.LazyFrame) else netmasks, on="parent_prefix_len")
     )
-    benign_ip_counts = (
-        pl.concat([benign_df["src_ip"].alias("ip"), benign_df["dst_ip"].alias("ip")])
-        .to_pandas()
-        .value_counts()
-        .to_dict()
+    best_inside = (
+        candidates.drop_nulls("network")
+        .join(parents, how="cross")
+        .filter(pl.col("prefix_len") > pl.col("parent_prefix_len"))
+        .group_by(
+            pl.col("parent_prefix_len").alias("prefix_len"),
+            (pl.col("network") & pl.col("netmask")).alias("network"),
+        )
+        .agg(pl.col("n_alerts").max().alias("n_alerts_inside"))
+    )
+    candidates = (
+        candidates.join(best_inside, on=["prefix_len", "network"], how="left")
+        .filter(
+            pl.col("n_alerts_inside").is_null()
+            | (pl.col("n_alerts") > (1 + prefix_alert_margin) * pl.col("n_alerts_inside"))
+        )
+    )
+
+    order = ["n_alerts", "prefix_len", "ip"]
+    return (
+        candidates.select("ip", "prefix_len", "n_alerts", "n_benign")
+        .top_k(top_k, by=order, reverse=[False, False, True])
+        .sort(order, descending=[True, True, False])
     )
 
-    for ip in alert_ip_counts.keys():
-        if ip in benign_ip_counts.keys():
-            if benign_ip_counts[ip] > frac_benign_tolerance * len(benign_df):
-                continue
 
+def _add_rules(ruleset: Ruleset, candidates: pl.DataFrame, max_rules: int) -> Ruleset:
+    for ip in candidates["ip"]:
         rule_str = f"-A FORWARD -s {ip} -j DROP"
         rule = IptablesRule(rule_str)
-        if str(rule) in [str(r) for r in ruleset]:
-            return ruleset
-        ruleset.append(rule)
-        break
+        # stop at the first candidate that is already blocked
+        if not ruleset.add(rule):
+            break
 
-    if len(ruleset) > max_rules:
-        return ruleset[-max_rules:]
+    ruleset.trim(max_rules)
     return ruleset
 
 
+def _update_ruleset(
+    ruleset: Ruleset,
+    alert_df: pl.DataFrame,
+    benign_df: pl.DataFrame,
+    max_rules: int,
+    frac_benign_tolerance: float = 1e-1,
+    top_k: int = 1,
+    prefix_lengths: tuple[int, ...] = (32,),
+    filter_blocked: bool = True,
+):
+    if filter_blocked:
+        # apply current ruleset first (avoids repeating rules)
+        compiled = ruleset.compile()
+        alert_df = compiled.not_blocked(alert_df)
+        benign_df = compiled.not_blocked(benign_df)
+
+    alert_lf = with_ip_int_columns(alert_df.lazy())
+    benign_lf = with_ip_int_columns(benign_df.lazy())
+
+    n_benign_flows = benign_lf.select(pl.len()).collect().item()
+    candidates = _score_candidates(
+        _prefix_counts(_pair_counts(alert_lf), prefix_lengths),
+        _prefix_counts(_pair_counts(benign_lf), prefix_lengths),
+        n_benign_flows,
+        frac_benign_tolerance,
+        top_k,
+    ).collect()
+
+    return _add_rules(ruleset, candidates, max_rules)
+
+
 class HeuristicNIRS(WindowNIRS):
     def __init__(
         self,
@@ -76,17 +504,62 @@ class HeuristicNIRS(WindowNIRS):
         benign_traffic_window_len_ms: int,
         max_rules: int,
         frac_benign_tolerance: float = 1e-1,
+        compact_ruleset: bool = False,
+        max_window_bytes: int | None = None,
+        top_k: int = 1,
+        prefix_lengths: tuple[int, ...] = (32,),
     ):
+        if not all(1 <= prefix_len <= 32 for prefix_len in prefix_lengths):
+            raise ValueError(f"Prefix lengths must be between 1 and 32, got {prefix_lengths}")
+
         super().__init__(
             max_alert_window_idle_ms,
             max_alert_window_len_ms,
             benign_traffic_window_len_ms,
             max_rules,
-            update_ruleset_fn=lambda max_alert_window_idle_ms, max_alert_window_len_ms, benign_traffic_window_len_ms, max_rules: _update_ruleset(
-                max_alert_window_idle_ms,
-                max_alert_window_len_ms,
-                benign_traffic_window_len_ms,
-                max_rules,
-                frac_benign_tolerance=frac_benign_tolerance,
-            ),
+            update_ruleset_fn=self._update_ruleset,
+            compact_ruleset=compact_ruleset,
+            max_window_bytes=max_window_bytes,
+        )
+        self.frac_benign_tolerance = frac_benign_tolerance
+        # max number of rules added at each update
+        self.top_k = top_k
+        # lengths of the source networks that can be blocked, e.g. (32, 24, 16) for hosts, /24 and /16 networks
+        self.prefix_lengths = tuple(prefix_lengths)
+
+        # IP counts of the windows, updated as flows enter and leave them
+        self.alert_frequencies = IpFrequencies(self.prefix_lengths)
+        self.benign_frequencies = IpFrequencies(self.prefix_lengths)
+        self.alert_chunks.observers.append(self.alert_frequencies)
+        self.benign_chunks.observers.append(self.benign_frequencies)
+
+    def _update_ruleset(self, ruleset: Ruleset, alert_df: pl.DataFrame, benign_df: pl.DataFrame, max_rules: int) -> Ruleset:
+        if self.alert_frequencies.sync(ruleset) and self.benign_frequencies.sync(ruleset):
+            # the benign counts are only needed for the networks of the alerts
+            candidates = _score_candidates(
+                self.alert_frequencies.to_polars(),
+                self.benign_frequencies.to_polars(self.alert_frequencies.network_counts),
+                self.benign_frequencies.n_flows,
+                self.frac_benign_tolerance,
+                self.top_k,
+            )
+            return _add_rules(ruleset, candidates, max_rules)
+
+        # rules that are not `-s <ip>[/<subnet>]` (e.g. loaded from a checkpoint of another NIRS)
+        filter_blocked = True
+        if alert_df is self.alert_window and benign_df is self.benign_window:
+            # (the windows of the NIRS, as passed by `update`) the flows blocked by the ruleset are filtered out
+            # with the masks cached with the windows
+            alert_df, benign_df = self.unblocked_windows(ruleset)
+            filter_blocked = False
+
+        return _update_ruleset(
+            ruleset,
+            alert_df,
+            benign_df,
+            max_rules,
+            frac_benign_tolerance=self.frac_benign_tolerance,
+            top_k=self.top_k,
+            prefix_lengths=self.prefix_lengths,
+            filter_blocked=filter_blocked,
         )
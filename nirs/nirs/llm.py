@@ -9,20 +9,21 @@ You should have received a copy of the license along with this
 program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
 """
 
-import numpy as np
 import polars as pl
 
 from .base import WindowNIRS
 
-from nirs.iptables import IptablesRule, InvalidIptablesRule
+from nirs.iptables import IptablesRule, InvalidIptablesRule, Ruleset
+from nirs.iptables.match import with_ip_int_columns
+from nirs.profiling import StageTimer
 
-from nirs.ollama.query import run_query_ollama, extract_rule_from_answer
+from nirs.ollama.query import OllamaClient, extract_rule_from_answer
 from nirs.ollama.prompt import make_system_prompt, make_user_prompt
 
 
 
 def _update_ruleset(
-    ruleset: list,
+    ruleset: Ruleset,
     alert_df: pl.DataFrame,
     benign_df: pl.DataFrame,
     max_rules: int,
@@ -31,21 +32,23 @@ def _update_ruleset(
     system_prompt: str | None = None,
     ollama_address: str = "http://localhost:11434",
     iptables_status: str | None = None,
+    timer: StageTimer | None = None,
+    filter_blocked: bool = True,
+    client: OllamaClient | None = None,
 ):
     assert system_prompt is not None
 
-    # apply current ruleset first (avoids repeating rules)
-    alert_df = alert_df.with_columns(
-        pl.Series(values=np.arange(len(alert_df)), name="idx")
-    )
-    benign_df = benign_df.with_columns(
-        pl.Series(values=np.arange(len(benign_df)), name="idx")
-    )
-    for rule in ruleset:
-        idx_blocked_alert = rule.match_df(alert_df)
-        alert_df = alert_df.filter(~pl.col("idx").is_in(idx_blocked_alert))
-        idx_blocked_benign = rule.match_df(benign_df)
-        benign_df = benign_df.filter(~pl.col("idx").is_in(idx_blocked_benign))
+    if client is None:
+        client = OllamaClient(ollama_address)
+
+    if timer is None:
+        timer = StageTimer(enabled=False)
+
+    if filter_blocked:
+        # apply current ruleset first (avoids repeating rules)
+        compiled = ruleset.compile()
+        alert_df = compiled.not_blocked(alert_df)
+        benign_df = compiled.not_blocked(benign_df)
 
     alert_df = (
         alert_df[["src_ip", "dst_ip", "protocol", "src_port", "dst_port", "src_data", "dst_data"]]
@@ -60,12 +63,12 @@ def _update_ruleset(
 
     user_prompt = make_user_prompt(alert_df, benign_df, iptables_status)  # type: ignore
 
-    answer = run_query_ollama(
-        model=model,
-        system_prompt=system_prompt,
-        user_prompt=user_prompt,
-        ollama_address=ollama_address,
-    )
+    with timer.stage("llm_query", prompt_len=len(user_prompt)):
+        answer = client.chat(
+            model=model,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+        )
 
     try:
         rule_str = extract_rule_from_answer(answer)
@@ -78,16 +81,14 @@ def _update_ruleset(
         print(rule)
 
         # Do not add rule if it exists already
-        if str(rule) in [str(r) for r in ruleset]:
+        if not ruleset.add(rule):
             return ruleset
-        ruleset.append(rule)
     except InvalidIptablesRule as e:
         print(f"Failed to add rule to ruleset: {e}")
         pass
 
 
-    if len(ruleset) > max_rules:
-        return ruleset[-max_rules:]
+    ruleset.trim(max_rules)
     return ruleset
 
 
@@ -101,6 +102,11 @@ class OllamaNIRS(WindowNIRS):
         model: str = "llama3:8b",
         num_examples_prompt: int = 10,
         ollama_address: str = "http://localhost:11434",
+        compact_ruleset: bool = False,
+        max_window_bytes: int | None = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 300.0,
+        max_retries: int = 3,
     ):
         super().__init__(
             max_alert_window_idle_ms,
@@ -108,6 +114,8 @@ class OllamaNIRS(WindowNIRS):
             benign_traffic_window_len_ms,
             max_rules,
             update_ruleset_fn=_update_ruleset,
+            compact_ruleset=compact_ruleset,
+            max_window_bytes=max_window_bytes,
         )
 
         self.iptables_status = None
@@ -116,27 +124,56 @@ class OllamaNIRS(WindowNIRS):
 
         self.model = model
         self.ollama_address = ollama_address
+        # keeps the connection to the Ollama server alive between updates
+        self.client = OllamaClient(
+            ollama_address,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_retries=max_retries,
+        )
         self.num_examples_prompt = num_examples_prompt
 
+    def state_dict(self) -> dict:
+        state = super().state_dict()
+        state["iptables_status"] = self.iptables_status
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.iptables_status = state["iptables_status"]
+
     def update(self, df: pl.DataFrame):
+        df = with_ip_int_columns(df)
         benign_df = df.filter(pl.col("is_alert") == 0)
         alert_df = df.filter(pl.col("is_alert") == 1)
 
-        self.ingest_benign_df(benign_df)
+        with self.timer.stage("ingest_benign_df", n_flows=len(benign_df)) as record:
+            self.ingest_benign_df(benign_df)
+            record["window_len"] = len(self.benign_window)
 
         if len(alert_df) > 0:
-            self.ingest_alert_df(alert_df)
-            self.ruleset = _update_ruleset(
-                self.ruleset,
-                self.alert_window,
-                self.benign_window,
-                self.max_rules,
-                model=self.model,
-                ollama_address=self.ollama_address,
-                num_examples=self.num_examples_prompt,
-                system_prompt=self.system_prompt,
-                iptables_status=self.iptables_status,
-            )
+            with self.timer.stage("ingest_alert_df", n_flows=len(alert_df)) as record:
+                self.ingest_alert_df(alert_df)
+                record["window_len"] = len(self.alert_window)
+
+            with self.timer.stage("update_ruleset") as record:
+                self.ruleset = _update_ruleset(
+                    self.ruleset,
+                    # windows without the flows blocked by the ruleset, only the new flows and rules are matched
+                    *self.unblocked_windows(self.ruleset),
+                    self.max_rules,
+                    model=self.model,
+                    ollama_address=self.ollama_address,
+                    num_examples=self.num_examples_prompt,
+                    system_prompt=self.system_prompt,
+                    iptables_status=self.iptables_status,
+                    timer=self.timer,
+                    filter_blocked=False,
+                    client=self.client,
+                )
+                if self.compact_ruleset:
+                    self.ruleset.compact()
+                record["n_rules"] = len(self.ruleset)
 
             # update iptables status
             if len(self.ruleset) > 0:
@@ -0,0 +1,297 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import heapq
+
+import numpy as np
+import polars as pl
+
+from .base import WindowNIRS
+
+from nirs.iptables import IptablesRule, Ruleset
+from nirs.iptables.match import uint32_to_ip, with_ip_int_columns
+from nirs.iptables.parser import VALID_PROTOCOLS, VALID_PROTOCOLS_WITH_PORTS
+
+
+# fields identifying a candidate rule (see `_matching_rules`)
+RULE_KEY = ["option", "prefix_len", "network", "protocol", "port"]
+
+
+def _matching_rules(df: pl.DataFrame | pl.LazyFrame, prefix_lengths: tuple[int, ...]) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Candidate rules matching each flow, with the same matching as `rule_expr`. A flow has two sides,
+    (src_ip, src_port, src_data) and (dst_ip, dst_port, dst_data), and a side sending data matches:
+    - `-s <ip>[/<subnet>]` on its own IP;
+    - `-d <ip>[/<subnet>]` and `-d <ip> -p <protocol>` on the IP of the other side;
+    - `-d <ip> -p <protocol> --dport <port>` on its own IP and port.
+
+    Only IPv4 addresses are considered.
+
+    Args:
+        df (DataFrame | LazyFrame): flows, with columns: src_ip, dst_ip, protocol, src_port, dst_port, src_data, dst_data.
+        prefix_lengths (tuple[int, ...]): lengths of the networks of `-s` and `-d` rules (32 for hosts).
+
+    Returns:
+        DataFrame | LazyFrame: (row, rule) pairs, with columns: row (position of the flow in `df`) and the fields of the rule:
+            option ("-s" or "-d"), prefix_len, network (UInt32), protocol and port (null if the rule has none),
+            see `_format_rule`.
+    """
+    df = with_ip_int_columns(df).with_row_index("row")
+
+    sides = pl.concat([
+        df.filter((pl.col("src_data") > 0).fill_null(False)).select(
+            "row",
+            "protocol",
+            pl.col("src_ip_int").alias("ip_int"),
+            pl.col("src_port").alias("port"),
+            pl.col("dst_ip_int").alias("other_ip_int"),
+        ),
+        df.filter((pl.col("dst_data") > 0).fill_null(False)).select(
+            "row",
+            "protocol",
+            pl.col("dst_ip_int").alias("ip_int"),
+            pl.col("dst_port").alias("port"),
+            pl.col("src_ip_int").alias("other_ip_int"),
+        ),
+    ])
+
+    def rules(option: str, ip_col: str, prefix_len: int, protocol: pl.Expr | None = None, port: pl.Expr | None = None):
+        netmask = ((1 << 32) - 1) ^ ((1 << (32 - prefix_len)) - 1)
+        return sides.select(
+            "row",
+            pl.lit(option).alias("option"),
+            pl.lit(prefix_len, dtype=pl.Int64).alias("prefix_len"),
+            (pl.col(ip_col) & pl.lit(netmask, dtype=pl.UInt32)).alias("network"),
+            (protocol if protocol is not None else pl.lit(None, dtype=pl.Utf8)).alias("protocol"),
+            (port if port is not None else pl.lit(None, dtype=pl.Int64)).alias("port"),
+        )
+
+    frames = []
+    for prefix_len in prefix_lengths:
+        frames.append(rules("-s", "ip_int", prefix_len))
+        frames.append(rules("-d", "other_ip_int", prefix_len))
+
+    frames.append(rules(
+        "-d", "other_ip_int", 32,
+        protocol=pl.when(pl.col("protocol").is_in(VALID_PROTOCOLS)).then(pl.col("protocol")),
+    ).drop_nulls("protocol"))
+    frames.append(rules(
+        "-d", "ip_int", 32,
+        protocol=pl.when(pl.col("protocol").is_in(VALID_PROTOCOLS_WITH_PORTS)).then(pl.col("protocol")),
+        port=pl.col("port").cast(pl.Int64),
+    ).drop_nulls(["protocol", "port"]))
+
+    # (IPv6 addresses have no UInt32 representation)
+    return pl.concat(frames).drop_nulls("network").unique(maintain_order=True)
+
+
+def _format_rule() -> pl.Expr:
+    # rule string of the fields of `_matching_rules`, e.g. `-A FORWARD -d 10.0.1.0/24 -j DROP`
+    network = uint32_to_ip(pl.col("network")) + pl.when(pl.col("prefix_len") < 32).then(
+        pl.lit("/") + pl.col("prefix_len").cast(pl.Utf8)
+    ).otherwise(pl.lit(""))
+    protocol = pl.when(pl.col("protocol").is_not_null()).then(pl.lit(" -p ") + pl.col("protocol")).otherwise(pl.lit(""))
+    port = pl.when(pl.col("port").is_not_null()).then(pl.lit(" --dport ") + pl.col("port").cast(pl.Utf8)).otherwise(pl.lit(""))
+    return pl.concat_str(pl.lit("-A FORWARD "), pl.col("option"), pl.lit(" "), network, protocol, port, pl.lit(" -j DROP")).alias("rule")
+
+
+def _bitmaps(rows_list: list[np.ndarray], n: int) -> list[int]:
+    """
+    Packed bitmaps of sets of rows (among `n`), as integers (bitwise operations and bit_count on the whole bitmap).
+
+    The bits of each set are written in a buffer shared by all the sets and reset after use, and only the bytes
+    between its first and last rows are converted, so the cost is proportional to the rows of the sets rather
+    than to `n` for each set.
+    """
+    buffer = np.zeros((n + 7) // 8, dtype=np.uint8)
+    bitmaps = []
+    for rows in rows_list:
+        if len(rows) == 0:
+            bitmaps.append(0)
+            continue
+
+        rows = np.asarray(rows, dtype=np.int64)
+        byte_idx = rows >> 3
+        np.bitwise_or.at(buffer, byte_idx, (1 << (rows & 7)).astype(np.uint8))
+
+        lo, hi = byte_idx.min(), byte_idx.max()
+        bitmaps.append(int.from_bytes(buffer[lo:hi + 1].tobytes(), "little") << (8 * int(lo)))
+        buffer[byte_idx] = 0
+
+    return bitmaps
+
+
+def _greedy_cover(
+    alert_bitmaps: list[int],
+    benign_bitmaps: list[int],
+    n_benign: list[int],
+    rules: list[str],
+    max_benign_flows: float,
+    budget: int,
+) -> list[str]:
+    """
+    Greedy max-coverage: pick up to `budget` rules, each time the rule blocking the most alerts not blocked
+    by the previous picks (then the one blocking the fewest benign flows), as long as the picks block at most
+    `max_benign_flows` benign flows.
+
+    The gains are updated lazily: coverage gains only decrease as rules are picked, so a rule whose gain is still
+    up to date when it is popped from the priority queue is the best one.
+    """
+    heap = [(-bitmap.bit_count(), n_benign[i], rules[i], i) for i, bitmap in enumerate(alert_bitmaps)]
+    heapq.heapify(heap)
+
+    covered_alerts = 0
+    covered_benign = 0
+    selected = []
+
+    while len(heap) > 0 and len(selected) < budget:
+        neg_gain, n, rule, i = heapq.heappop(heap)
+
+        gain = (alert_bitmaps[i] & ~covered_alerts).bit_count()
+        if gain == 0:
+            continue
+        if gain < -neg_gain:
+            heapq.heappush(heap, (-gain, n, rule, i))
+            continue
+
+        # the blocked benign flows only grow, so a rule above the tolerance stays above it
+        if (covered_benign | benign_bitmaps[i]).bit_count() > max_benign_flows:
+            continue
+
+        selected.append(rule)
+        covered_alerts |= alert_bitmaps[i]
+        covered_benign |= benign_bitmaps[i]
+
+    return selected
+
+
+def _update_ruleset(
+    ruleset: Ruleset,
+    alert_df: pl.DataFrame,
+    benign_df: pl.DataFrame,
+    max_rules: int,
+    frac_benign_tolerance: float = 1e-1,
+    prefix_lengths: tuple[int, ...] = (32, 24, 16),
+    max_rules_per_update: int | None = None,
+    max_candidates: int = 4096,
+    filter_blocked: bool = True,
+):
+    if filter_blocked:
+        # apply current ruleset first (the new rules cover the flows that go through it)
+        compiled = ruleset.compile()
+        alert_df = compiled.not_blocked(alert_df)
+        benign_df = compiled.not_blocked(benign_df)
+
+    # without benign traffic to estimate the collateral of networks (e.g. at the first update), only hosts are candidates
+    if len(benign_df) == 0:
+        prefix_lengths = tuple(prefix_len for prefix_len in prefix_lengths if prefix_len == 32)
+
+    # candidates: the rules matching the most alerts
+    alert_rules = (
+        _matching_rules(alert_df.lazy(), prefix_lengths)
+        .group_by(RULE_KEY)
+        .agg(pl.col("row"), pl.len().alias("n_alerts"))
+        .with_columns(_format_rule())
+        .top_k(max_candidates, by=["n_alerts", "rule"], reverse=[False, True])
+    )
+    benign_rules = (
+        _matching_rules(benign_df.lazy(), prefix_lengths)
+        .join(alert_rules.select(RULE_KEY), on=RULE_KEY, how="semi", nulls_equal=True)
+        .group_by(RULE_KEY)
+        .agg(pl.col("row").alias("benign_row"))
+    )
+    candidates = (
+        alert_rules.join(benign_rules, on=RULE_KEY, how="left", nulls_equal=True)
+        .with_columns(pl.col("benign_row").fill_null(pl.lit([], dtype=pl.List(pl.UInt32))))
+        .sort("rule")
+        .collect()
+    )
+
+    budget = max_rules_per_update
+    if budget is None:
+        # fill the free slots of the ruleset (at least one rule, replacing the oldest one)
+        budget = max(1, max_rules - len(ruleset))
+
+    rules = _greedy_cover(
+        _bitmaps([rows.to_numpy() for rows in candidates["row"]], len(alert_df)),
+        _bitmaps([rows.to_numpy() for rows in candidates["benign_row"]], len(benign_df)),
+        candidates["benign_row"].list.len().to_list(),
+        candidates["rule"].to_list(),
+        frac_benign_tolerance * len(benign_df),
+        budget,
+    )
+
+    for rule_str in rules:
+        ruleset.add(IptablesRule(rule_str))
+
+    ruleset.trim(max_rules)
+    return ruleset
+
+
+class SetCoverNIRS(WindowNIRS):
+    """
+    Synthesizes rules as a budgeted max-coverage problem over the flows of the windows that go through the
+    current ruleset: at each update, a greedy selection picks the rules (src/dst hosts and networks, dst and
+    protocol, dst, protocol and port) covering the most alerts, while blocking at most `frac_benign_tolerance`
+    of the benign flows.
+    """
+
+    def __init__(
+        self,
+        max_alert_window_idle_ms: int,
+        max_alert_window_len_ms: int,
+        benign_traffic_window_len_ms: int,
+        max_rules: int,
+        frac_benign_tolerance: float = 1e-1,
+        prefix_lengths: tuple[int, ...] = (32, 24, 16),
+        max_rules_per_update: int | None = None,
+        max_candidates: int = 4096,
+        compact_ruleset: bool = False,
+        max_window_bytes: int | None = None,
+    ):
+        if not all(1 <= prefix_len <= 32 for prefix_len in prefix_lengths):
+            raise ValueError(f"Prefix lengths must be between 1 and 32, got {prefix_lengths}")
+
+        super().__init__(
+            max_alert_window_idle_ms,
+            max_alert_window_len_ms,
+            benign_traffic_window_len_ms,
+            max_rules,
+            update_ruleset_fn=self._update_ruleset,
+            compact_ruleset=compact_ruleset,
+            max_window_bytes=max_window_bytes,
+        )
+        self.frac_benign_tolerance = frac_benign_tolerance
+        self.prefix_lengths = tuple(prefix_lengths)
+        # max number of rules added at each update, None to fill the free slots of the ruleset
+        self.max_rules_per_update = max_rules_per_update
+        # max number of candidate rules of the greedy selection (the ones matching the most alerts)
+        self.max_candidates = max_candidates
+
+    def _update_ruleset(self, ruleset: Ruleset, alert_df: pl.DataFrame, benign_df: pl.DataFrame, max_rules: int) -> Ruleset:
+        filter_blocked = True
+        if alert_df is self.alert_window and benign_df is self.benign_window:
+            # (the windows of the NIRS, as passed by `update`) the flows blocked by the ruleset are filtered out
+            # with the masks cached with the windows
+            alert_df, benign_df = self.unblocked_windows(ruleset)
+            filter_blocked = False
+
+        return _update_ruleset(
+            ruleset,
+            alert_df,
+            benign_df,
+            max_rules,
+            frac_benign_tolerance=self.frac_benign_tolerance,
+            prefix_lengths=self.prefix_lengths,
+            max_rules_per_update=self.max_rules_per_update,
+            max_candidates=self.max_candidates,
+            filter_blocked=filter_blocked,
+        )
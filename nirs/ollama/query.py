@@ -15,10 +15,126 @@ import re
 import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .prompt import decode_response
 
 
+class OllamaClient:
+    """
+    Client of the chat API of an Ollama server, with a persistent HTTP session: the connection is kept alive
+    between queries instead of being opened for each one.
+
+    Queries that fail to connect, time out, or get a 502/503/504 response are retried with exponential backoff
+    (`backoff_factor` * 2^(retry - 1) seconds between attempts). The exception of the last attempt is raised.
+
+    Args:
+        ollama_address: The address of the Ollama server, defaults to http://localhost:11434.
+        connect_timeout: Timeout in seconds to connect to the server, defaults to 5.
+        read_timeout: Timeout in seconds between two bytes of the answer (i.e., the generation time, as answers
+            are not streamed), defaults to 300.
+        max_retries: Max number of retries of a query, defaults to 3.
+        backoff_factor: Backoff factor in seconds between retries, defaults to 1.
+    """
+
+    def __init__(
+        self,
+        ollama_address: str = "http://localhost:11434",
+        connect_timeout: float = 5.0,
+        read_timeout: float = 300.0,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+    ):
+        self.ollama_address = ollama_address
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            # queries are deterministic (fixed seed, temperature 0), so they can be sent again
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.session.mount("http://", HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=1))
+
+    def __enter__(self) -> "OllamaClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connections of the session."""
+        self.session.close()
+
+    def chat(
+        self,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        num_ctx: int = 1024,
+        temperature: float = 0,
+        seed: int = 42,
+    ) -> str:
+        """
+        Send a query to the Ollama AI chatbot.
+
+        Args:
+            model: The model name to use for the query.
+            system_prompt: The system prompt to pass to Ollama.
+            user_prompt: The user prompt to pass to Ollama.
+            num_ctx: The number of context tokens to use for the query, defaults to 1024.
+            temperature: The temperature to use for the query, defaults to 0.
+            seed: The random seed to use for the query, defaults to 42.
+
+        Returns:
+            The answer from Ollama.
+
+        Raises:
+            requests.exceptions.RequestException if the query still fails after the retries, e.g. if Ollama is not
+            running (ConnectionError) or does not answer within the read timeout.
+        """
+
+        tic = time.perf_counter()
+        try:
+            response = self.session.post(
+                f"{self.ollama_address}/api/chat",
+                data=json.dumps({
+                    "model": model,
+                    "stream": False,
+                    "options": {
+                        "temperature": temperature,
+                        "seed": seed,
+                        "num_ctx": num_ctx
+                    },
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ]
+                }),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Query to Ollama failed. Verify that Ollama is running with the specified model. Error: {e}")
+            raise
+
+        toc = time.perf_counter()
+        logging.info(f"Query to Ollama took {toc - tic:0.4f} seconds")
+
+        answer = decode_response(response)
+
+        logging.debug(user_prompt)
+        logging.debug(answer)
+
+        return answer
+
+
 def run_query_ollama(
     model: str,
     system_prompt: str,
@@ -30,13 +146,13 @@ def run_query_ollama(
     ):
 
     """
-    Send a query to the Ollama AI chatbot.
+    Send a single query to the Ollama AI chatbot (see `OllamaClient` to send several queries over the same connection).
 
     Args:
         model: The model name to use for the query.
         system_prompt: The system prompt to pass to Ollama.
         user_prompt: The user prompt to pass to Ollama.
-        ollama_address: The address of the Ollama server, defaults to http://localhost:11434/api/chat.
+        ollama_address: The address of the Ollama server, defaults to http://localhost:11434.
         num_ctx: The number of context tokens to use for the query, defaults to 1024.
         temperature: The temperature to use for the query, defaults to 0.
         seed: The random seed to use for the query, defaults to 42.
@@ -45,46 +161,11 @@ def run_query_ollama(
         The answer from Ollama.
 
     Raises:
-        requests.exceptions.ConnectionError if the query cannot be sent to Ollama, e.g. if Ollama is not running.
+        requests.exceptions.RequestException if the query cannot be sent to Ollama, e.g. if Ollama is not running.
     """
 
-    chat_api_address = f"{ollama_address}/api/chat"
-
-    try:
-        tic = time.perf_counter()
-        response = requests.post(
-            chat_api_address,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps({
-                "model": model,
-                "stream": False,
-                "options": {
-                    "temperature": 0,
-                    "seed": seed,
-                    "num_ctx": num_ctx
-                },
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-            })
-        )
-
-        toc = time.perf_counter()
-        logging.info(f"Query to Ollama took {toc - tic:0.4f} seconds")
-
-        # print(response.text)
-        answer = decode_response(response) 
-
-        logging.debug(user_prompt)
-        logging.debug(answer)
-
-    except requests.exceptions.ConnectionError as e:
-        logging.error("Cannot connect to Ollama. Verify that Ollama is running with the specified model. Connection error:", e)
-        answer = ""
-        exit()
-
-    return answer
+    with OllamaClient(ollama_address) as client:
+        return client.chat(model, system_prompt, user_prompt, num_ctx=num_ctx, temperature=temperature, seed=seed)
 
 
 def extract_rule_from_answer(answer: str):
@@ -11,6 +11,9 @@ program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
 
 import argparse
 
+# eps of the command line, left out of the names of the result files (see `get_resfile_name`)
+DEFAULT_EPS = 0.01
+
 
 def get_args():
 
@@ -35,15 +38,30 @@ def get_args():
         "--nirs",
         type=str,
         default="heuristic",
-        help="NIRS to be used for the experiment. Options: base, heuristic, ollama.",
+        help="NIRS to be used for the experiment. Options: base, heuristic, setcover, ollama.",
     )
     parser.add_argument("--fpr", type=float, default=0.1, help="False positive rate.")
 
     parser.add_argument(
         "--eps",
         type=float,
-        default=0.01,
-        help="Max fraction of blocked flows in benign_window. Used only for HeuristicNIRS. Default: 0.1.",
+        default=DEFAULT_EPS,
+        help=f"Max fraction of blocked flows in benign_window. Used only for HeuristicNIRS and SetCoverNIRS. Default: {DEFAULT_EPS}.",
+    )
+
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        default=1,
+        help="Max number of rules added at each update. Used only for HeuristicNIRS. Default: 1.",
+    )
+
+    parser.add_argument(
+        "--prefix_lengths",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Lengths of the networks that can be blocked, e.g. 32 24 16 for hosts, /24 and /16 networks. Used only for HeuristicNIRS and SetCoverNIRS. Default: None (32 for HeuristicNIRS, 32 24 16 for SetCoverNIRS).",
     )
 
     parser.add_argument(
@@ -52,6 +70,24 @@ def get_args():
         default=10,
         help="Max number of examples from alert and benign window (2*k_prompt examples in total). Used only for OllamaNIRS. Default: 10.",
     )
+    parser.add_argument(
+        "--connect_timeout",
+        type=float,
+        default=5.0,
+        help="Timeout in seconds to connect to the Ollama server. Used only for OllamaNIRS. Default: 5.",
+    )
+    parser.add_argument(
+        "--read_timeout",
+        type=float,
+        default=300.0,
+        help="Timeout in seconds to wait for the answer of the Ollama server. Used only for OllamaNIRS. Default: 300.",
+    )
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=3,
+        help="Max number of retries of a request to the Ollama server (connection errors and 502/503/504 answers). Used only for OllamaNIRS. Default: 3.",
+    )
     parser.add_argument(
         "--update_time_ms",
         type=int,
@@ -63,8 +99,81 @@ def get_args():
         "--seed", type=int, default=42, help="Seed used for PRNG. Default: 42."
     )
 
+    parser.add_argument(
+        "--max_window_bytes",
+        type=int,
+        default=None,
+        help="Byte budget of the NIRS windows, the oldest flows are dropped when it is exceeded. Default: None (no budget).",
+    )
+
+    parser.add_argument(
+        "--compact_ruleset",
+        action="store_true",
+        help="If set, the ruleset is compacted after each update (shadowed rules dropped, host rules aggregated into CIDR blocks).",
+    )
+
+    parser.add_argument(
+        "--memory_file",
+        type=str,
+        default=None,
+        help="If set, the estimated size of the NIRS windows, ruleset and evaluation frame at each update are written to this JSON-lines file. Default: None.",
+    )
+
+    parser.add_argument(
+        "--schedule",
+        type=str,
+        default="grid",
+        help="When the NIRS is updated. Options: grid (every update_time_ms), events (on alert arrival, see --min_interval_ms, --debounce_ms and --max_delay_ms). Default: grid.",
+    )
+    parser.add_argument(
+        "--min_interval_ms", type=int, default=0, help="Min time between two updates (events schedule only). Default: 0."
+    )
+    parser.add_argument(
+        "--debounce_ms", type=int, default=0, help="Quiet time after an alert before an update (events schedule only). Default: 0."
+    )
+    parser.add_argument(
+        "--max_delay_ms",
+        type=float,
+        default=float("inf"),
+        help="Max time between an alert and the update it triggers, despite the debounce (events schedule only). Default: inf.",
+    )
+
+    parser.add_argument(
+        "--replay_speed",
+        type=float,
+        default=None,
+        help="If set, rules are only active once the update that produced them is done, with update times scaled by this factor (trace time per wall time). Default: None (updates take no time).",
+    )
+
+    parser.add_argument(
+        "--metrics_file",
+        type=str,
+        default=None,
+        help="If set, running CBR/WBR and blocked flows and bytes per window are written to this CSV file. Default: None.",
+    )
+
+    parser.add_argument(
+        "--trace_file",
+        type=str,
+        default=None,
+        help="If set, per-stage timings of the evaluation are written to this JSON-lines file. Default: None.",
+    )
+
+    parser.add_argument(
+        "--streaming_file",
+        type=str,
+        default=None,
+        help="If set, the flows (with the alerts of the NIDS) are written to this CSV or Parquet file, and evaluated out-of-core from it (grid schedule only, without replay). Default: None.",
+    )
+
     args = parser.parse_args()
 
+    # the events schedule does not delay the rules by the update times
+    if args.schedule == "events" and args.replay_speed is not None:
+        parser.error("--replay_speed is not supported with --schedule events")
+    if args.streaming_file is not None and (args.schedule != "grid" or args.replay_speed is not None):
+        parser.error("--streaming_file is only supported with --schedule grid and without --replay_speed")
+
     return args
 
 
@@ -81,15 +190,51 @@ def get_resfile_name(
     k_prompt: int = 10,
     seed: int = 42,
     update_time_ms: int = 1_800_000,
+    top_k: int = 1,
+    prefix_lengths: tuple[int, ...] | None = None,
+    replay_speed: float | None = None,
+    schedule: str = "grid",
+    min_interval_ms: int = 0,
+    debounce_ms: int = 0,
+    max_delay_ms: float = float("inf"),
+    max_window_bytes: int | None = None,
+    compact_ruleset: bool = False,
 ):
 
     fpr_pretty = str(fpr).replace(".", "_")
 
     resfile = f"{nids_name}_nids_{dataset_name}_{nirs_name}nirs_fpr{fpr_pretty}_update_{update_time_ms}_seed{seed}.csv"
-    if nirs_name == "rule":
+    if nirs_name in ["rule", "heuristic", "setcover"]:
         eps_pretty = str(eps).replace(".", "_")
-        resfile = f"{nids_name}_nids_{dataset_name}_{nirs_name}nirs_fpr{fpr_pretty}_eps{eps_pretty}_update_{update_time_ms}_seed{seed}.csv"
+        options = []
+        # (results of the default eps keep the name they had before eps could be set)
+        if nirs_name == "rule" or eps != DEFAULT_EPS:
+            options.append(f"eps{eps_pretty}")
+        if top_k != 1:
+            options.append(f"top{top_k}")
+        if prefix_lengths is not None:
+            options.append("prefix" + "_".join(str(prefix_len) for prefix_len in prefix_lengths))
+        options = "".join(f"_{option}" for option in options)
+        resfile = f"{nids_name}_nids_{dataset_name}_{nirs_name}nirs_fpr{fpr_pretty}{options}_update_{update_time_ms}_seed{seed}.csv"
     elif nirs_name == "ollama":
         resfile = f"{nids_name}_nids_{dataset_name}_{nirs_name}nirs_fpr{fpr_pretty}_k{k_prompt}_update_{update_time_ms}_seed{seed}.csv"
 
+    if max_window_bytes is not None:
+        resfile = resfile.removesuffix(".csv") + f"_budget{max_window_bytes}.csv"
+
+    if compact_ruleset:
+        resfile = resfile.removesuffix(".csv") + "_compact.csv"
+
+    # updates on alert arrival instead of every update_time_ms
+    if schedule == "events":
+        options = f"events_min{min_interval_ms}_debounce{debounce_ms}"
+        if max_delay_ms != float("inf"):
+            options += f"_maxdelay{str(max_delay_ms).replace('.', '_')}"
+        resfile = resfile.removesuffix(".csv") + f"_{options}.csv"
+
+    # results of a replay (rules delayed by the update times) differ from those of the same configuration without it
+    if replay_speed is not None:
+        speed_pretty = str(replay_speed).replace(".", "_")
+        resfile = resfile.removesuffix(".csv") + f"_replay{speed_pretty}.csv"
+
     return resfile
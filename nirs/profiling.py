@@ -0,0 +1,109 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import polars as pl
+
+
+class StageTimer:
+    """
+    Wall time of the stages of an evaluation (window slicing, apply_rules, window ingestion, rule synthesis,
+    LLM round-trips, ...), recorded with:
+
+    ```python
+    with timer.stage("apply_rules", n_flows=len(X)) as record:
+        ...
+        record["n_rules"] = len(ruleset)
+    ```
+
+    Each record holds the iteration of the evaluation loop, the stage name, its start time (relative to the
+    creation of the timer) and duration in seconds, plus the extra values (window sizes, rule counts, ...).
+
+    Stages can be nested: e.g. the "update" stage of eval_nirs contains the "ingest_benign_df", "ingest_alert_df"
+    and "update_ruleset" stages of WindowNIRS, and "update_ruleset" contains the "llm_query" of OllamaNIRS.
+
+    A disabled timer records nothing, so the hooks can stay in the code at (almost) no cost.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # set by the evaluation loop, stored in each record
+        self.iteration: int | None = None
+        self._records: list[dict] = []
+        self._t0 = time.perf_counter()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @contextmanager
+    def stage(self, name: str, **info) -> Iterator[dict]:
+        """
+        Time the body of the `with` block.
+
+        Args:
+            name (str): name of the stage.
+            **info: extra values stored in the record.
+
+        Yields:
+            dict: the extra values of the record, which can be completed in the block.
+        """
+        if not self.enabled:
+            yield info
+            return
+
+        tic = time.perf_counter()
+        try:
+            yield info
+        finally:
+            toc = time.perf_counter()
+            self._records.append({
+                "iteration": self.iteration,
+                "stage": name,
+                "t_start": tic - self._t0,
+                "seconds": toc - tic,
+                **info,
+            })
+
+    def to_polars(self) -> pl.DataFrame:
+        """
+        Returns:
+            DataFrame: one row per record, with columns: iteration, stage, t_start, seconds, and one column
+                per extra value (null for the stages that do not record it).
+        """
+        if len(self._records) == 0:
+            return pl.DataFrame(schema={"iteration": pl.Int64, "stage": pl.Utf8, "t_start": pl.Float64, "seconds": pl.Float64})
+        return pl.from_dicts(self._records, infer_schema_length=None)
+
+    def summary(self) -> pl.DataFrame:
+        """
+        Returns:
+            DataFrame: number of records, total and mean time of each stage, by decreasing total time.
+        """
+        return (
+            self.to_polars()
+            .group_by("stage", maintain_order=True)
+            .agg(
+                pl.len().alias("count"),
+                pl.col("seconds").sum().alias("total_seconds"),
+                pl.col("seconds").mean().alias("mean_seconds"),
+            )
+            .sort("total_seconds", descending=True, maintain_order=True)
+        )
+
+    def write_jsonl(self, path: str) -> None:
+        """Write the records as a JSON-lines trace (one record per line)."""
+        with open(path, "w") as f:
+            for record in self._records:
+                f.write(json.dumps(record) + "\n")
@@ -0,0 +1,249 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import time
+
+import numpy as np
+import polars as pl
+
+from nirs import BaseNIRS
+from nirs.eval import apply_window_rules, n_idle_windows, seed_all, window_bounds, window_update_flows
+from nirs.iptables import Ruleset
+from nirs.iptables.match import with_ip_int_columns
+from nirs.memory import MemoryTracker
+from nirs.metrics import OnlineMetrics
+
+
+def _apply_frozen_rules(nirs: BaseNIRS, ruleset: Ruleset, df_window: pl.DataFrame, inter_subnet: np.ndarray) -> np.ndarray:
+    # apply a snapshot of the rules instead of the latest ones of the NIRS
+    latest = nirs.ruleset
+    nirs.ruleset = ruleset
+    try:
+        return apply_window_rules(nirs, df_window, inter_subnet)
+    finally:
+        nirs.ruleset = latest
+
+
+def eval_nirs_replay(
+    df: pl.DataFrame,
+    nirs: BaseNIRS,
+    update_time_ms: float = 30_000,
+    seed: int | None = None,
+    speed: float = 1.0,
+    realtime: bool = False,
+    memory_tracker: MemoryTracker | None = None,
+    metrics: OnlineMetrics | None = None,
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Same as `eval_nirs`, except that the rules produced by `nirs.update` are only active once the update
+    is done: the wall time of each update, scaled by `speed`, is added to the time of the trace at which the
+    rules were requested. Until then, the previous rules keep being applied, and a window is split at the
+    activation time of the new rules. While an update is running, the flows that would have been sent to
+    the NIRS are kept, and sent with the next update.
+
+    With `realtime=True`, flows are also fed at `speed` times the speed of the trace (e.g. a window of 30s is
+    processed after 3s of wall time with `speed=10`), and the rules are active from the time of the trace
+    at which the update returned.
+
+    Args:
+        df (DataFrame): DataFrame with columns: timestamp, src_ip, dst_ip, protocol, src_port, dst_port, is_alert.
+        nirs (BaseNIRS): An extension of BaseNIRS to be evaluated.
+        update_time_ms (float): Time interval in milliseconds between NIRS updates.
+        seed (int | None): Seed for random number generator
+        speed (float): milliseconds of the trace per millisecond of wall time (0 ignores the update times,
+            which gives the same results as `eval_nirs`).
+        realtime (bool): pace the evaluation with the wall clock (requires `speed` > 0).
+        memory_tracker (MemoryTracker | None): if set, records the memory usage after each update (same as `eval_nirs`).
+        metrics (OnlineMetrics | None): if set, updated after each window with the flows whose blocked state is
+            final, and stops the evaluation early when `metrics.should_stop()` (same as `eval_nirs`).
+
+    Returns:
+        tuple[DataFrame, DataFrame]:
+            - results with columns: timestamp, is_blocked (same as `eval_nirs`);
+            - one row per update with columns: iteration, t_update (time of the trace at which the update was
+              requested), update_seconds (wall time), t_active (time of the trace from which its rules apply),
+              n_flows, n_rules.
+    """
+
+    if realtime and speed <= 0:
+        raise ValueError(f"Real-time replay requires a positive speed, got {speed}")
+
+    if seed is not None:
+        seed_all(seed)
+
+    order = None
+    if not df["timestamp"].is_sorted():
+        order = np.argsort(df["timestamp"].to_numpy(), kind="stable")
+        df = df[order]
+
+    # initialize columns
+    df = with_ip_int_columns(df)
+    df = df.with_columns(pl.Series(values=np.arange(len(df)), name="idx"))
+
+    timestamps = df["timestamp"].to_numpy()
+    is_alert = (df["is_alert"] == 1).fill_null(False).to_numpy()
+    inter_subnet = df["inter_subnet"].fill_null(False).to_numpy()
+    has_data = ((df["src_data"] > 0) | (df["dst_data"] > 0)).fill_null(False).to_numpy()
+
+    is_blocked = np.zeros(len(df), dtype=bool)
+
+    # alert_suffix[i] is True if there is at least one alert among flows i, i+1, ...
+    alert_suffix = np.zeros(len(df) + 1, dtype=bool)
+    alert_suffix[:-1] = np.flip(np.logical_or.accumulate(np.flip(is_alert)))
+
+    # rules currently applied, and rules of the last update with the time from which they apply
+    active_rules = Ruleset(nirs.ruleset.snapshot())
+    pending_rules: Ruleset | None = None
+    t_active = None
+
+    # flows to send to the NIRS once the running update is done
+    backlog: list[pl.DataFrame] = []
+
+    updates = []
+
+    # iteration counter
+    it = 0
+
+    # flows before i_final are past the evaluation windows (for the online metrics)
+    i_final = 0
+
+    t_current = df["timestamp"].min()
+    t_min = t_current
+
+    wall_t0 = time.perf_counter()
+
+    def trace_time() -> float:
+        return t_min + (time.perf_counter() - wall_t0) * 1000 * speed
+
+    while alert_suffix[np.searchsorted(timestamps, t_current, side="right")]:
+
+        print("Current time:", (t_current - t_min) / 1000, "seconds")
+
+        t_next = t_current + update_time_ms
+
+        i_start, i_end = window_bounds(timestamps, t_current, update_time_ms)
+
+        # if no connections in current window, jump to the window of the next flow
+        if i_end == i_start:
+            n_skipped = n_idle_windows(timestamps, i_start, t_current, update_time_ms)
+            t_current += n_skipped * update_time_ms
+            it += n_skipped
+            continue
+
+        # the window is over at t_next
+        if realtime and t_next > trace_time():
+            time.sleep((t_next - trace_time()) / (1000 * speed))
+
+        # flows before the activation of the pending rules are filtered by the previous rules
+        i_split = i_end
+        if pending_rules is not None and t_active <= t_next:
+            i_split = max(i_start, np.searchsorted(timestamps, t_active, side="left"))
+
+        window = slice(i_start, i_end)
+        df_window = df.slice(i_start, i_end - i_start)
+
+        # flows of the window blocked by the rules active at their timestamp
+        blocked_by_current_rules = np.zeros(i_end - i_start, dtype=bool)
+        for ruleset, segment in [(active_rules, slice(i_start, i_split)), (pending_rules, slice(i_split, i_end))]:
+            if segment.start == segment.stop:
+                continue
+            blocked_by_current_rules[segment.start - i_start:segment.stop - i_start] = _apply_frozen_rules(
+                nirs,
+                ruleset,
+                df.slice(segment.start, segment.stop - segment.start),
+                inter_subnet[segment],
+            )
+
+        if pending_rules is not None and t_active <= t_next:
+            active_rules, pending_rules, t_active = pending_rules, None, None
+
+        is_blocked[window] |= blocked_by_current_rules
+
+        df_update = window_update_flows(
+            df_window,
+            is_blocked[window],
+            blocked_by_current_rules,
+            is_alert[window],
+            inter_subnet[window],
+            has_data[window],
+        )
+
+        if df_update is not None:
+            backlog.append(df_update)
+
+            # the NIRS is busy until the rules of its last update are active
+            if pending_rules is None:
+                df_update = pl.concat(backlog)
+                backlog = []
+
+                tic = time.perf_counter()
+                nirs.update(df_update)
+                update_seconds = time.perf_counter() - tic
+
+                if memory_tracker is not None:
+                    memory_tracker.record(it, **nirs.memory_usage(), eval_frame_bytes=df.estimated_size())
+
+                if realtime:
+                    t_active = max(t_next, trace_time())
+                else:
+                    t_active = t_next + update_seconds * 1000 * speed
+                pending_rules = Ruleset(nirs.ruleset.snapshot())
+
+                updates.append({
+                    "iteration": it,
+                    "t_update": t_next,
+                    "update_seconds": update_seconds,
+                    "t_active": t_active,
+                    "n_flows": len(df_update),
+                    "n_rules": len(pending_rules),
+                })
+
+        t_current = t_next
+
+        it += 1
+
+        if metrics is not None:
+            # flows before t_current are not part of any later window
+            i_new = np.searchsorted(timestamps, t_current, side="left")
+            metrics.update(it, t_current, df.slice(i_final, i_new - i_final), is_blocked[i_final:i_new])
+            i_final = i_new
+
+            if metrics.should_stop():
+                print("Stopping early at", (t_current - t_min) / 1000, "seconds")
+                break
+
+    if metrics is not None and i_final < len(df):
+        metrics.update(it, None, df.slice(i_final), is_blocked[i_final:])
+
+    res_df = pl.DataFrame({
+        "timestamp": df["timestamp"],
+        "is_blocked": is_blocked.astype(np.float64),
+    })
+
+    if order is not None:
+        res_df = res_df[np.argsort(order)]
+
+    updates_df = pl.DataFrame(
+        updates,
+        schema={
+            "iteration": pl.Int64,
+            "t_update": pl.Float64,
+            "update_seconds": pl.Float64,
+            "t_active": pl.Float64,
+            "n_flows": pl.Int64,
+            "n_rules": pl.Int64,
+        },
+    )
+
+    for rule in nirs.ruleset:
+        print(str(rule))
+
+    return res_df, updates_df
@@ -0,0 +1,233 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import heapq
+
+import numpy as np
+import polars as pl
+
+from nirs import BaseNIRS
+from nirs.eval import eval_window, seed_all
+from nirs.iptables.match import with_ip_int_columns
+from nirs.memory import MemoryTracker
+from nirs.metrics import OnlineMetrics
+
+# events at the same time are processed in this order
+ALERT = 0
+DEBOUNCE = 1
+MAX_DELAY = 2
+MIN_INTERVAL = 3
+
+
+class EventScheduler:
+    """
+    Alert-triggered NIRS updates, as an alternative to the fixed `update_time_ms` grid of `eval_nirs`.
+
+    After an update at time t, the next update fires after the first alert following t, once:
+    - no other alert arrived for `debounce_ms` (a burst of alerts triggers a single update),
+      or `max_delay_ms` passed since the first alert (a continuous stream of alerts still triggers updates);
+    - and at least `min_interval_ms` passed since t.
+
+    The timers are kept in a priority queue, together with the arrivals of the alerts.
+    """
+
+    def __init__(self, min_interval_ms: float = 0, debounce_ms: float = 0, max_delay_ms: float = float("inf")):
+        self.min_interval_ms = min_interval_ms
+        self.debounce_ms = debounce_ms
+        self.max_delay_ms = max_delay_ms
+
+        # times at which updates fired
+        self.update_times: list[float] = []
+
+    def next_update(self, t_last: float, alert_timestamps: np.ndarray) -> float | None:
+        """
+        Args:
+            t_last (float): time of the last update (or start of the evaluation).
+            alert_timestamps (np.ndarray): sorted timestamps of the alerts.
+
+        Returns:
+            float | None: time of the next update, None if there is no alert after `t_last`.
+        """
+
+        i = np.searchsorted(alert_timestamps, t_last, side="right")
+        if i == len(alert_timestamps):
+            return None
+
+        # (time, kind, payload): payload is the index of the alert for ALERT events,
+        # and the number of alerts seen when the timer was armed for DEBOUNCE events
+        events = [(alert_timestamps[i], ALERT, i)]
+        if self.min_interval_ms > 0:
+            heapq.heappush(events, (t_last + self.min_interval_ms, MIN_INTERVAL, 0))
+
+        n_alerts = 0
+        is_ready = False
+        is_min_interval_over = self.min_interval_ms <= 0
+
+        while True:
+            t, kind, payload = heapq.heappop(events)
+
+            if kind == ALERT:
+                n_alerts += 1
+                if n_alerts == 1 and self.max_delay_ms < float("inf"):
+                    heapq.heappush(events, (t + self.max_delay_ms, MAX_DELAY, 0))
+                if not is_ready:
+                    # only the timer armed by the last alert fires
+                    heapq.heappush(events, (t + self.debounce_ms, DEBOUNCE, n_alerts))
+                    if payload + 1 < len(alert_timestamps):
+                        heapq.heappush(events, (alert_timestamps[payload + 1], ALERT, payload + 1))
+            elif kind == DEBOUNCE:
+                is_ready = is_ready or payload == n_alerts
+            elif kind == MAX_DELAY:
+                is_ready = True
+            elif kind == MIN_INTERVAL:
+                is_min_interval_over = True
+
+            if is_ready and is_min_interval_over:
+                self.update_times.append(float(t))
+                return float(t)
+
+
+def eval_nirs_events(
+    df: pl.DataFrame,
+    nirs: BaseNIRS,
+    scheduler: EventScheduler,
+    seed: int | None = None,
+    memory_tracker: MemoryTracker | None = None,
+    metrics: OnlineMetrics | None = None,
+) -> pl.DataFrame:
+    """
+    Same as `eval_nirs`, with update times given by `scheduler` instead of a fixed grid: the flows between
+    two updates (both included) are filtered by the current rules, and the NIRS is updated at the end of the
+    window if some alerts went through.
+
+    Only the alerts that the current rules do not block trigger updates: once an attacker is blocked, its
+    traffic does not keep firing updates.
+
+    Args:
+        df (DataFrame): DataFrame with columns: timestamp, src_ip, dst_ip, protocol, src_port, dst_port, is_alert.
+        nirs (BaseNIRS): An extension of BaseNIRS to be evaluated.
+        scheduler (EventScheduler): decides when the NIRS is updated (see `scheduler.update_times` after the evaluation).
+        seed (int | None): Seed for random number generator
+        memory_tracker (MemoryTracker | None): if set, records the memory usage after each update (same as `eval_nirs`).
+        metrics (OnlineMetrics | None): if set, updated after each window with the flows whose blocked state is
+            final, and stops the evaluation early when `metrics.should_stop()` (same as `eval_nirs`).
+
+    Returns:
+        DataFrame: results with columns: timestamp, is_blocked (same as `eval_nirs`).
+    """
+
+    if seed is not None:
+        seed_all(seed)
+
+    order = None
+    if not df["timestamp"].is_sorted():
+        order = np.argsort(df["timestamp"].to_numpy(), kind="stable")
+        df = df[order]
+
+    # initialize columns
+    df = with_ip_int_columns(df)
+    df = df.with_columns(pl.Series(values=np.arange(len(df)), name="idx"))
+
+    timestamps = df["timestamp"].to_numpy()
+    is_alert = (df["is_alert"] == 1).fill_null(False).to_numpy()
+    inter_subnet = df["inter_subnet"].fill_null(False).to_numpy()
+    has_data = ((df["src_data"] > 0) | (df["dst_data"] > 0)).fill_null(False).to_numpy()
+
+    is_blocked = np.zeros(len(df), dtype=bool)
+
+    # only the alerts that can go through the firewall trigger updates
+    alert_rows = np.flatnonzero(is_alert & inter_subnet & has_data)
+    alert_timestamps = timestamps[alert_rows]
+    # (ruleset, version) with which the alerts of `trigger_timestamps` were filtered
+    trigger_rules = None
+    trigger_timestamps = alert_timestamps
+
+    # iteration counter
+    it = 0
+
+    # flows before i_final are past the evaluation windows (for the online metrics)
+    i_final = 0
+
+    t_current = df["timestamp"].min()
+    t_min = t_current
+
+    while True:
+
+        # alerts after t_current that are not blocked by the current rules (filtered again when the rules change)
+        if trigger_rules != (id(nirs.ruleset), nirs.ruleset.version):
+            rows = alert_rows[np.searchsorted(alert_timestamps, t_current, side="right"):]
+            is_blocked_alert, _ = nirs.ruleset.compile().evaluate(df[rows])
+            trigger_timestamps = timestamps[rows[~is_blocked_alert]]
+            trigger_rules = (id(nirs.ruleset), nirs.ruleset.version)
+
+        t_next = scheduler.next_update(t_current, trigger_timestamps)
+        is_last = t_next is None
+        if is_last:
+            # the remaining alerts are blocked by the current rules, which are still applied until the last one
+            if len(alert_timestamps) == 0 or alert_timestamps[-1] <= t_current:
+                break
+            t_next = alert_timestamps[-1]
+
+        print("Current time:", (t_current - t_min) / 1000, "seconds")
+
+        nirs.timer.iteration = it
+
+        # flows between t_current and t_next (both included)
+        with nirs.timer.stage("window") as record:
+            i_start = np.searchsorted(timestamps, t_current, side="left")
+            i_end = np.searchsorted(timestamps, t_next, side="right")
+            record["n_flows"] = int(i_end - i_start)
+
+        window = slice(i_start, i_end)
+        is_updated = eval_window(
+            nirs,
+            df.slice(i_start, i_end - i_start),
+            is_blocked[window],
+            is_alert[window],
+            inter_subnet[window],
+            has_data[window],
+        )
+
+        if is_updated and memory_tracker is not None:
+            memory_tracker.record(it, **nirs.memory_usage(), eval_frame_bytes=df.estimated_size())
+
+        t_current = t_next
+
+        it += 1
+
+        if metrics is not None:
+            # flows before t_current are not part of any later window
+            i_new = np.searchsorted(timestamps, t_current, side="left")
+            metrics.update(it, t_current, df.slice(i_final, i_new - i_final), is_blocked[i_final:i_new])
+            i_final = i_new
+
+            if metrics.should_stop():
+                print("Stopping early at", (t_current - t_min) / 1000, "seconds")
+                break
+
+        if is_last:
+            break
+
+    if metrics is not None and i_final < len(df):
+        metrics.update(it, None, df.slice(i_final), is_blocked[i_final:])
+
+    res_df = pl.DataFrame({
+        "timestamp": df["timestamp"],
+        "is_blocked": is_blocked.astype(np.float64),
+    })
+
+    if order is not None:
+        res_df = res_df[np.argsort(order)]
+
+    for rule in nirs.ruleset:
+        print(str(rule))
+
+    return res_df
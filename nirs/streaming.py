@@ -0,0 +1,334 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import os
+from typing import Iterator
+
+import numpy as np
+import polars as pl
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from nirs import BaseNIRS
+from nirs.eval import eval_window, n_idle_windows, seed_all, window_bounds
+from nirs.iptables.match import with_ip_int_columns
+from nirs.memory import MemoryTracker
+from nirs.metrics import OnlineMetrics
+from nirs.network import is_inter_subnet
+from nirs.profiling import StageTimer
+
+PARQUET_EXTENSIONS = [".parquet", ".pq"]
+
+# columns read by `eval_nirs_streaming`, and columns kept for the online metrics if present (see `write_flows`)
+FLOW_COLUMNS = ["timestamp", "src_ip", "dst_ip", "protocol", "src_port", "dst_port", "src_data", "dst_data", "inter_subnet", "is_alert"]
+METRICS_COLUMNS = ["label", "type"]
+
+# size of the blocks read from CSV files (the number of flows per block depends on the row length)
+CSV_BLOCK_SIZE = 1 << 24
+
+
+def is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS
+
+
+def scan_flows(source: str) -> pl.LazyFrame:
+    """
+    Args:
+        source (str): path to a CSV or Parquet file of flows.
+
+    Returns:
+        LazyFrame: lazy scan of the file.
+    """
+    if is_parquet(source):
+        return pl.scan_parquet(source)
+    return pl.scan_csv(source)
+
+
+def iter_flow_batches(source: str, batch_size: int = 1_000_000) -> Iterator[pl.DataFrame]:
+    """
+    Read a CSV or Parquet file of flows in order, one batch at a time.
+
+    Args:
+        source (str): path to a CSV or Parquet file of flows.
+        batch_size (int): max number of flows per batch.
+
+    Yields:
+        DataFrame: consecutive batches of flows, with the dtypes inferred by `scan_flows`.
+    """
+
+    schema = scan_flows(source).collect_schema()
+
+    if is_parquet(source):
+        batches = pq.ParquetFile(source).iter_batches(batch_size=batch_size)
+    else:
+        # force the dtypes of the whole file, otherwise pyarrow infers them from the first block only
+        arrow_schema = pl.DataFrame(schema=schema).to_arrow().schema
+        batches = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(column_types={field.name: field.type for field in arrow_schema}),
+        )
+
+    for batch in batches:
+        df = pl.from_arrow(batch).cast(schema)
+        for offset in range(0, len(df), batch_size):
+            yield df.slice(offset, batch_size)
+
+
+def write_flows(df: pl.DataFrame, path: str, is_alert: pl.Series | np.ndarray | None = None) -> None:
+    """
+    Write flows to a CSV or Parquet file (by extension) in the format read by `eval_nirs_streaming`:
+    sorted by timestamp, with the inter_subnet and is_alert columns.
+
+    Args:
+        df (DataFrame): flows with columns: timestamp, src_ip, dst_ip, protocol, src_port, dst_port, src_data, dst_data,
+            and optionally inter_subnet (computed with `is_inter_subnet` if missing), is_alert, label and type.
+        path (str): output file.
+        is_alert (Series | ndarray | None): alerts of the NIDS for the flows of `df` (in the order of `df`),
+            None to use the is_alert column of `df`.
+    """
+    if is_alert is not None:
+        df = df.with_columns(pl.Series("is_alert", is_alert))
+    elif "is_alert" not in df.columns:
+        raise ValueError("The flows have no is_alert column and no alerts were given")
+
+    if "inter_subnet" not in df.columns:
+        df = df.with_columns(
+            pl.struct("src_ip", "dst_ip")
+            .map_elements(lambda x: is_inter_subnet(x["src_ip"], x["dst_ip"]), return_dtype=pl.Boolean)
+            .alias("inter_subnet")
+        )
+
+    df = df.select(FLOW_COLUMNS + [column for column in METRICS_COLUMNS if column in df.columns])
+    if not df["timestamp"].is_sorted():
+        df = df.sort("timestamp", maintain_order=True)
+
+    if is_parquet(path):
+        df.write_parquet(path)
+    else:
+        df.write_csv(path)
+
+
+class _ResultWriter:
+    """Append `timestamp, is_blocked` results to a CSV or Parquet file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._parquet = is_parquet(path)
+        self._file = None
+        self._writer = None
+
+    def write(self, timestamps: pl.Series, is_blocked: np.ndarray) -> None:
+        res_df = pl.DataFrame({
+            "timestamp": timestamps,
+            "is_blocked": is_blocked.astype(np.float64),
+        })
+
+        if self._parquet:
+            table = res_df.to_arrow()
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            is_first = self._file is None
+            if is_first:
+                self._file = open(self.path, "w")
+            res_df.write_csv(self._file, include_header=is_first)
+
+    def close(self) -> None:
+        if self._parquet:
+            if self._writer is None:
+                self.write(pl.Series("timestamp", [], dtype=pl.Int64), np.zeros(0, dtype=bool))
+            self._writer.close()
+        else:
+            if self._file is None:
+                self._file = open(self.path, "w")
+                self._file.write("timestamp,is_blocked\n")
+            self._file.close()
+
+
+def eval_nirs_streaming(
+    source: str,
+    nirs: BaseNIRS,
+    output: str,
+    update_time_ms: float = 30_000,
+    seed: int | None = None,
+    batch_size: int = 1_000_000,
+    timer: StageTimer | None = None,
+    memory_tracker: MemoryTracker | None = None,
+    metrics: OnlineMetrics | None = None,
+) -> int:
+    """
+    Out-of-core version of `eval_nirs`: the flows are read from disk in time-ordered batches,
+    and the `timestamp, is_blocked` results are appended to `output` as soon as the evaluation
+    windows are past them. Only the flows of the current window (plus one batch of read-ahead)
+    are kept in memory, besides the windows of the NIRS itself.
+
+    The results are the same as `eval_nirs` on the whole file.
+
+    Args:
+        source (str): CSV or Parquet file with columns: timestamp, src_ip, dst_ip, protocol, src_port, dst_port,
+            src_data, dst_data, inter_subnet, is_alert. The flows must be sorted by timestamp (see `write_flows`).
+        nirs (BaseNIRS): An extension of BaseNIRS to be evaluated.
+        output (str): CSV or Parquet file (by extension) where the results are written, in the order of `source`.
+        update_time_ms (float): Time interval in milliseconds between NIRS updates.
+        seed (int | None): Seed for random number generator
+        batch_size (int): max number of flows read from `source` at once.
+        timer (StageTimer | None): if set, records the wall time of each stage of each iteration, see `nirs.profiling`.
+        memory_tracker (MemoryTracker | None): if set, records the estimated size of the NIRS windows, the ruleset
+            and the buffer of flows, and the peak RSS of the process, after each update (see `nirs.memory`).
+        metrics (OnlineMetrics | None): if set, updated with the flows as their results are written (requires
+            a label column), and stops the evaluation early when `metrics.should_stop()`.
+
+    Returns:
+        int: number of flows evaluated.
+    """
+
+    if timer is not None:
+        nirs.timer = timer
+
+    if seed is not None:
+        seed_all(seed)
+
+    # the loop stops after the last alert, which is found with a first (streaming) pass over the file
+    time_range = (
+        scan_flows(source)
+        .select(
+            pl.col("timestamp").min().alias("t_min"),
+            pl.col("timestamp").filter(pl.col("is_alert") == 1).max().alias("t_last_alert"),
+        )
+        .collect(engine="streaming")
+    )
+    t_min = time_range["t_min"][0]
+    t_last_alert = time_range["t_last_alert"][0]
+
+    batches = iter_flow_batches(source, batch_size)
+    writer = _ResultWriter(output)
+
+    # flows that are not written yet, i.e. with timestamp >= t_current, and their blocked state
+    buffer = pl.DataFrame()
+    buffer_timestamps = np.zeros(0)
+    buffer_blocked = np.zeros(0, dtype=bool)
+    n_read = 0
+    is_exhausted = False
+
+    def read_until(t: float) -> None:
+        # read batches until the buffer contains all the flows with timestamp <= t
+        nonlocal buffer, buffer_timestamps, buffer_blocked, n_read, is_exhausted
+
+        while not is_exhausted and (len(buffer) == 0 or buffer_timestamps[-1] <= t):
+            batch = next(batches, None)
+            if batch is None:
+                is_exhausted = True
+                break
+
+            timestamps = batch["timestamp"].to_numpy()
+            if (np.diff(timestamps) < 0).any() or (len(buffer) > 0 and timestamps[0] < buffer_timestamps[-1]):
+                raise ValueError(f"{source} is not sorted by timestamp")
+
+            batch = with_ip_int_columns(batch)
+            batch = batch.with_columns(pl.Series(values=np.arange(n_read, n_read + len(batch)), name="idx"))
+            n_read += len(batch)
+
+            buffer = pl.concat([buffer, batch]) if len(buffer) > 0 else batch
+            buffer_timestamps = np.concatenate([buffer_timestamps, timestamps])
+            buffer_blocked = np.concatenate([buffer_blocked, np.zeros(len(batch), dtype=bool)])
+
+    def write_until(t: float) -> None:
+        # write the results of the flows with timestamp < t, which no later window contains
+        nonlocal buffer, buffer_timestamps, buffer_blocked
+
+        n = np.searchsorted(buffer_timestamps, t, side="left")
+        if n == 0:
+            return
+
+        writer.write(buffer["timestamp"].slice(0, n), buffer_blocked[:n])
+        if metrics is not None:
+            metrics.update(it, t, buffer.slice(0, n), buffer_blocked[:n])
+
+        buffer = buffer.slice(n)
+        buffer_timestamps = buffer_timestamps[n:]
+        buffer_blocked = buffer_blocked[n:]
+
+    # iteration counter
+    it = 0
+
+    t_current = t_min
+
+    try:
+        while t_last_alert is not None and t_last_alert > t_current:
+
+            print("Current time:", (t_current - t_min) / 1000, "seconds")
+
+            # ensure minimum update time
+            t_next = t_current + update_time_ms
+
+            nirs.timer.iteration = it
+
+            with nirs.timer.stage("read") as record:
+                read_until(t_next)
+                record["buffer_len"] = len(buffer)
+
+            # flows between t_current and t_next (both included)
+            with nirs.timer.stage("window") as record:
+                i_start, i_end = window_bounds(buffer_timestamps, t_current, update_time_ms)
+                record["n_flows"] = i_end - i_start
+
+            # if no connections in current window, jump to the window of the next flow
+            # (staying on the grid t_min + k * update_time_ms, the buffer contains the next flow after t_next)
+            if i_end == i_start:
+                n_skipped = n_idle_windows(buffer_timestamps, i_start, t_current, update_time_ms)
+                t_current += n_skipped * update_time_ms
+                it += n_skipped
+                write_until(t_current)
+                continue
+
+            df_window = buffer.slice(i_start, i_end - i_start)
+            is_updated = eval_window(
+                nirs,
+                df_window,
+                buffer_blocked[i_start:i_end],
+                (df_window["is_alert"] == 1).fill_null(False).to_numpy(),
+                df_window["inter_subnet"].fill_null(False).to_numpy(),
+                ((df_window["src_data"] > 0) | (df_window["dst_data"] > 0)).fill_null(False).to_numpy(),
+            )
+
+            if is_updated and memory_tracker is not None:
+                memory_tracker.record(it, **nirs.memory_usage(), eval_frame_bytes=buffer.estimated_size())
+
+            t_current = t_next
+            with nirs.timer.stage("write"):
+                write_until(t_current)
+
+            it += 1
+
+            if metrics is not None and metrics.should_stop():
+                print("Stopping early at", (t_current - t_min) / 1000, "seconds")
+                break
+
+        # flows after the last window are never blocked
+        if len(buffer) > 0:
+            writer.write(buffer["timestamp"], buffer_blocked)
+            if metrics is not None:
+                metrics.update(it, None, buffer, buffer_blocked)
+        for batch in batches:
+            n_read += len(batch)
+            writer.write(batch["timestamp"], np.zeros(len(batch), dtype=bool))
+            if metrics is not None:
+                metrics.update(it, None, batch, np.zeros(len(batch), dtype=bool))
+
+    finally:
+        writer.close()
+
+    for rule in nirs.ruleset:
+        print(str(rule))
+
+    return n_read
@@ -0,0 +1,228 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+from collections import deque
+
+import numpy as np
+import polars as pl
+
+from nirs.iptables import Ruleset
+
+# beyond this number of chunks, chunks are merged (polars is slower on frames with many chunks)
+MAX_CHUNKS = 64
+
+
+class _Chunk:
+
+    def __init__(self, df: pl.DataFrame, masks: dict[tuple, np.ndarray] | None = None):
+        self.df = df
+        timestamps = df["timestamp"]
+        self.t_min = timestamps.min()
+        self.t_max = timestamps.max()
+        self.is_sorted = timestamps.is_sorted()
+
+        # flows of the chunk matched by each rule (by canonical key) and number of rules matching each flow,
+        # see `ChunkedWindow.not_blocked`
+        self.masks = {} if masks is None else masks
+        self.n_blocking = np.zeros(df.height, dtype=np.uint32)
+        for mask in self.masks.values():
+            self.n_blocking += mask
+
+    def select(self, rows: slice | np.ndarray) -> "_Chunk":
+        """Chunk of a subset of the flows (a slice or a boolean mask), keeping their cached masks."""
+        if isinstance(rows, slice):
+            df = self.df.slice(rows.start, rows.stop - rows.start)
+        else:
+            df = self.df.filter(pl.Series(rows))
+        chunk = _Chunk(df)
+        chunk.masks = {key: mask[rows] for key, mask in self.masks.items()}
+        chunk.n_blocking = self.n_blocking[rows]
+        return chunk
+
+
+class ChunkedWindow:
+    """
+    Window of flows stored as a ring of immutable chunks, in arrival order.
+
+    Appending a chunk does not copy the window, and evicting old flows drops whole chunks,
+    only slicing (or filtering, if it is not sorted by timestamp) the chunks that are partially evicted.
+    `frame()` returns the concatenation of the chunks without copying them (cached until the window changes).
+
+    `not_blocked(ruleset)` returns the flows that are not matched by a ruleset. Which rules match each flow is
+    cached with the chunks, so that only the new chunks and the new rules are matched when the window and the
+    ruleset change.
+
+    Observers (objects with `on_append(df)` and `on_evict(df)` methods, see `observers`) are notified
+    of the flows entering and leaving the window, e.g. to maintain aggregates incrementally.
+    """
+
+    def __init__(self, schema: dict, max_chunks: int = MAX_CHUNKS):
+        if max_chunks < 2:
+            raise ValueError(f"max_chunks must be at least 2, got {max_chunks}")
+
+        self.schema = pl.Schema(schema)
+        self.columns = list(self.schema.names())
+        self.max_chunks = max_chunks
+
+        self._chunks: deque[_Chunk] = deque()
+        self._len = 0
+        self._frame: pl.DataFrame | None = None
+        # (ruleset, version, flows) of the last call to `not_blocked`
+        self._not_blocked: tuple | None = None
+
+        self.observers = []
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _changed(self) -> None:
+        self._len = sum(chunk.df.height for chunk in self._chunks)
+        self._frame = None
+        self._not_blocked = None
+
+    def _merge(self) -> None:
+        """
+        Merge two adjacent chunks, of the same size tier (number of bits of their number of flows) if possible.
+
+        Two chunks of the same tier make a chunk of a higher tier, so that a flow is copied at most once per tier,
+        i.e. O(log(window size)) times, instead of each merge copying the chunks merged before. The lowest tier
+        is merged first (then the most recent chunks, the oldest ones are the next to be evicted), and the new
+        chunk is never merged: its masks are not computed yet, and they would be missing from the merged chunk.
+        """
+        chunks = list(self._chunks)
+        sizes = [chunk.df.height for chunk in chunks[:-1]]
+        pairs = range(len(sizes) - 2, -1, -1)
+
+        same_tier = [i for i in pairs if sizes[i].bit_length() == sizes[i + 1].bit_length()]
+        if len(same_tier) > 0:
+            i = min(same_tier, key=lambda i: sizes[i])
+        else:
+            i = min(pairs, key=lambda i: sizes[i] + sizes[i + 1])
+
+        merged = chunks[i:i + 2]
+        keys = set(merged[0].masks) & set(merged[1].masks)
+        masks = {key: np.concatenate([chunk.masks[key] for chunk in merged]) for key in keys}
+        chunks[i:i + 2] = [_Chunk(pl.concat([chunk.df for chunk in merged], rechunk=True), masks)]
+        self._chunks = deque(chunks)
+
+    def append(self, df: pl.DataFrame) -> None:
+        """Add flows at the end of the window (only the columns of the window are kept)."""
+        if len(df) == 0:
+            return
+
+        df = df.select(self.columns)
+        self._chunks.append(_Chunk(df))
+        for observer in self.observers:
+            observer.on_append(df)
+
+        if len(self._chunks) > self.max_chunks:
+            self._merge()
+
+        self._changed()
+
+    def replace(self, df: pl.DataFrame) -> None:
+        """Replace the flows of the window."""
+        for observer in self.observers:
+            for chunk in self._chunks:
+                observer.on_evict(chunk.df)
+        self._chunks.clear()
+        self._changed()
+        self.append(df)
+
+    def evict(self, t_threshold: float) -> None:
+        """Drop the flows with timestamp <= t_threshold (same as `frame().filter(pl.col("timestamp") > t_threshold)`)."""
+        chunks = deque()
+        evicted = []
+        for chunk in self._chunks:
+            if chunk.t_max <= t_threshold:
+                evicted.append(chunk.df)
+            elif chunk.t_min > t_threshold:
+                chunks.append(chunk)
+            elif chunk.is_sorted:
+                i = np.searchsorted(chunk.df["timestamp"].to_numpy(), t_threshold, side="right")
+                evicted.append(chunk.df.slice(0, i))
+                chunks.append(chunk.select(slice(i, chunk.df.height)))
+            else:
+                is_evicted = (chunk.df["timestamp"] <= t_threshold).to_numpy()
+                evicted.append(chunk.df.filter(pl.Series(is_evicted)))
+                chunks.append(chunk.select(~is_evicted))
+
+        for observer in self.observers:
+            for df in evicted:
+                observer.on_evict(df)
+
+        if len(chunks) != len(self._chunks) or any(a is not b for a, b in zip(chunks, self._chunks)):
+            self._chunks = chunks
+            self._changed()
+
+    def t_max(self):
+        """Latest timestamp of the window, None if the window is empty."""
+        if len(self._chunks) == 0:
+            return None
+        return max(chunk.t_max for chunk in self._chunks)
+
+    def frame(self) -> pl.DataFrame:
+        """Flows of the window, as a (multi-chunk) DataFrame."""
+        if self._frame is None:
+            if len(self._chunks) == 0:
+                self._frame = pl.DataFrame(schema=self.schema)
+            else:
+                self._frame = pl.concat([chunk.df for chunk in self._chunks], rechunk=False)
+        return self._frame
+
+    def not_blocked(self, ruleset: Ruleset) -> pl.DataFrame:
+        """
+        Flows of the window that are not matched by any rule of the ruleset (same as
+        `frame().filter(~ruleset.compile().expr)`), cached until the window or the ruleset changes.
+        """
+        if self._not_blocked is not None:
+            cached_ruleset, version, df = self._not_blocked
+            if cached_ruleset is ruleset and version == ruleset.version:
+                return df
+
+        rules = dict(ruleset.items())
+
+        # forget the rules that left the ruleset, and group the chunks by the rules they have not been matched with
+        missing = {}
+        for chunk in self._chunks:
+            for key in [key for key in chunk.masks if key not in rules]:
+                chunk.n_blocking -= chunk.masks.pop(key)
+            new_keys = tuple(key for key in rules if key not in chunk.masks)
+            if len(new_keys) > 0:
+                missing.setdefault(new_keys, []).append(chunk)
+
+        # match each group of chunks in a single pass (usually: all the chunks with the new rules, and the new chunks)
+        for new_keys, chunks in missing.items():
+            names = [f"rule_{i}" for i in range(len(new_keys))]
+            # with_columns (rather than select) broadcasts rules without conditions, e.g. `-A FORWARD -j DROP`
+            matches = (
+                pl.concat([chunk.df for chunk in chunks], rechunk=False)
+                .with_columns([rules[key].expr.fill_null(False).alias(name) for name, key in zip(names, new_keys)])
+                .select(names)
+            )
+            masks = [match.to_numpy() for match in matches.iter_columns()]
+
+            start = 0
+            for chunk in chunks:
+                end = start + chunk.df.height
+                for key, mask in zip(new_keys, masks):
+                    chunk.masks[key] = mask[start:end]
+                    chunk.n_blocking += mask[start:end]
+                start = end
+
+        df = self.frame()
+        if len(self._chunks) > 0:
+            is_blocked = np.concatenate([chunk.n_blocking for chunk in self._chunks]) > 0
+            if is_blocked.any():
+                df = df.filter(pl.Series(~is_blocked))
+
+        self._not_blocked = (ruleset, ruleset.version, df)
+        return df
@@ -0,0 +1,108 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import unittest
+
+import numpy as np
+import polars as pl
+
+from nirs.iptables.compact import compact_rules
+from nirs.iptables.compiled import CompiledRuleset
+from nirs.iptables.parser import parse_iptables_rule, format_iptables_rule
+from nirs.iptables.rule import IptablesRule
+from nirs.iptables.ruleset import Ruleset
+
+
+class TestCompactRules(unittest.TestCase):
+
+    def test_aggregation(self):
+
+        rules = [parse_iptables_rule(f"-A FORWARD -s 10.0.0.{i} -j DROP") for i in range(4)]
+        rules.append(parse_iptables_rule("-A FORWARD -s 10.0.0.9 -j DROP"))
+
+        compacted = [format_iptables_rule(rule) for rule in compact_rules(rules)]
+        self.assertEqual(compacted, ["-A FORWARD -s 10.0.0.0/30 -j DROP", "-A FORWARD -s 10.0.0.9 -j DROP"])
+
+    def test_shadowing(self):
+
+        rules_str = [
+            "-A FORWARD -s 10.0.0.1 -p tcp -j DROP",  # shadowed by the /24 below
+            "-A FORWARD -d 10.1.0.1 -p tcp --dport 22 -j DROP",  # not shadowed, --dport rules match differently
+            "-A FORWARD -s 10.0.0.0/24 -j DROP",
+            "-A FORWARD -d 10.1.0.0/16 -j DROP",
+            "-A FORWARD -s 10.0.0.7 -d 10.9.0.1 -j DROP",  # shadowed by the /24
+            "-A FORWARD -s 10.8.0.7 -d 10.9.0.1 -p udp -j DROP",  # shadowed by the rule below
+            "-A FORWARD -s 10.8.0.0/16 -d 10.9.0.0/24 -j DROP",
+        ]
+        rules = [parse_iptables_rule(rule_str) for rule_str in rules_str]
+
+        compacted = compact_rules(rules)
+        self.assertEqual(compacted, [rules[1], rules[2], rules[3], rules[6]])
+
+        rules.append(parse_iptables_rule("-A FORWARD -j DROP"))
+        self.assertEqual(compact_rules(rules), [rules[-1]])
+
+    def test_same_blocked_flows(self):
+
+        rng = np.random.default_rng(0)
+        n = 5000
+
+        def ips():
+            return [f"10.0.{a}.{b}" for a, b in rng.integers(0, [2, 16], size=(n, 2))]
+
+        X = pl.DataFrame({
+            "idx": np.arange(n),
+            "src_ip": ips(),
+            "dst_ip": ips(),
+            "src_port": rng.choice([22, 80], n),
+            "dst_port": rng.choice([22, 80], n),
+            "protocol": rng.choice(["tcp", "udp"], n),
+            "src_data": rng.integers(0, 2, n),
+            "dst_data": rng.integers(0, 2, n),
+        })
+
+        for _ in range(20):
+            rules = []
+            for _ in range(30):
+                ip = f"10.0.{rng.integers(0, 2)}.{rng.integers(0, 16)}"
+                prefix = rng.choice([32, 32, 31, 30, 28])
+                rule_str = [
+                    f"-A FORWARD -s {ip}/{prefix} -j DROP",
+                    f"-A FORWARD -s {ip}/{prefix} -p tcp -j DROP",
+                    f"-A FORWARD -d {ip}/{prefix} -p udp -j DROP",
+                    f"-A FORWARD -d {ip}/{prefix} -p tcp --dport 22 -j DROP",
+                    f"-A FORWARD -s {ip}/{prefix} -d 10.0.1.0/28 -p tcp -j DROP",
+                ][rng.integers(0, 5)]
+                rules.append(parse_iptables_rule(rule_str))
+
+            compacted = compact_rules(rules)
+            self.assertLessEqual(len(compacted), len(rules))
+
+            expected, _ = CompiledRuleset(rules).evaluate(X)
+            result, _ = CompiledRuleset(compacted).evaluate(X)
+            np.testing.assert_array_equal(result, expected)
+
+    def test_ruleset_compact(self):
+
+        ruleset = Ruleset(IptablesRule(f"-A FORWARD -s 10.0.0.{i} -j DROP") for i in range(2))
+        kept = IptablesRule("-A FORWARD -d 10.1.0.1 -j DROP")
+        ruleset.add(kept)
+
+        self.assertTrue(ruleset.compact())
+        self.assertEqual([str(rule) for rule in ruleset], ["-A FORWARD -s 10.0.0.0/31 -j DROP", str(kept)])
+        self.assertIs(ruleset[-1], kept)
+
+        self.assertFalse(ruleset.compact())
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,366 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import polars as pl
+
+from nirs import HeuristicNIRS
+from nirs.eval import eval_nirs, eval_window
+from nirs.iptables.match import with_ip_int_columns
+from nirs.memory import MemoryTracker
+from nirs.metrics import OnlineMetrics, time_to_block
+from nirs.replay import eval_nirs_replay
+from nirs.streaming import eval_nirs_streaming, write_flows
+
+
+def make_flows() -> pl.DataFrame:
+    """
+    Attacker 10.0.0.66 scans a server every second, while a benign client 10.0.1.5 talks to it
+    every 3 seconds. A quiet hour separates two bursts of traffic.
+    """
+    rows = []
+    for burst_start in [0, 3_600_000]:
+        for t in range(0, 60_000, 1_000):
+            rows.append(("10.0.0.66", "10.0.2.1", burst_start + t, 1))
+            if t % 3_000 == 0:
+                rows.append(("10.0.1.5", "10.0.2.1", burst_start + t, 0))
+
+    src_ip, dst_ip, timestamp, label = zip(*rows)
+    n = len(rows)
+    return pl.DataFrame({
+        "src_ip": src_ip,
+        "dst_ip": dst_ip,
+        "src_port": np.full(n, 1234),
+        "dst_port": np.full(n, 80),
+        "protocol": ["tcp"] * n,
+        "timestamp": timestamp,
+        "src_data": np.full(n, 100),
+        "dst_data": np.full(n, 100),
+        "inter_subnet": [True] * n,
+        "label": label,
+        "is_alert": label,
+    })
+
+
+def make_on_tick_flows() -> pl.DataFrame:
+    """
+    Flows on the grid of 1s windows (as with NB15 timestamps and update times in seconds): a benign flow at 0,
+    then the attacker 10.0.0.66 after two idle windows.
+    """
+    timestamps = [0, 3_000, 3_500, 4_000, 4_500, 5_000, 5_500]
+    n = len(timestamps)
+    return pl.DataFrame({
+        "src_ip": ["10.0.1.5"] + ["10.0.0.66"] * (n - 1),
+        "dst_ip": ["10.0.2.1"] * n,
+        "src_port": np.full(n, 1234),
+        "dst_port": np.full(n, 80),
+        "protocol": ["tcp"] * n,
+        "timestamp": timestamps,
+        "src_data": np.full(n, 100),
+        "dst_data": np.full(n, 100),
+        "inter_subnet": [True] * n,
+        "label": [0] + [1] * (n - 1),
+        "is_alert": [0] + [1] * (n - 1),
+    })
+
+
+def eval_per_tick(df: pl.DataFrame, nirs: HeuristicNIRS, update_time_ms: float) -> np.ndarray:
+    # reference evaluation loop, moving the clock one window at a time (flows sorted by timestamp)
+    df = with_ip_int_columns(df).with_columns(pl.Series(values=np.arange(len(df)), name="idx"))
+    timestamps = df["timestamp"].to_numpy()
+    is_alert = (df["is_alert"] == 1).to_numpy()
+    inter_subnet = df["inter_subnet"].to_numpy()
+    has_data = ((df["src_data"] > 0) | (df["dst_data"] > 0)).to_numpy()
+    is_blocked = np.zeros(len(df), dtype=bool)
+
+    t_current = timestamps[0]
+    while (is_alert & (timestamps > t_current)).any():
+        window = (timestamps >= t_current) & (timestamps <= t_current + update_time_ms)
+        if window.any():
+            i_start, i_end = np.flatnonzero(window)[[0, -1]]
+            eval_window(
+                nirs,
+                df.slice(i_start, i_end + 1 - i_start),
+                is_blocked[i_start:i_end + 1],
+                is_alert[i_start:i_end + 1],
+                inter_subnet[i_start:i_end + 1],
+                has_data[i_start:i_end + 1],
+            )
+        t_current += update_time_ms
+
+    return is_blocked.astype(np.float64)
+
+
+def make_nirs() -> HeuristicNIRS:
+    return HeuristicNIRS(
+        max_alert_window_idle_ms=60_000,
+        max_alert_window_len_ms=600_000,
+        benign_traffic_window_len_ms=600_000,
+        max_rules=10,
+        frac_benign_tolerance=0.1,
+    )
+
+
+def run_eval(df: pl.DataFrame) -> pl.DataFrame:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return eval_nirs(df, make_nirs(), update_time_ms=10_000, seed=42)
+
+
+class TestEvalNIRS(unittest.TestCase):
+
+    def setUp(self):
+        self.df = make_flows()
+
+    def test_blocks_attacker(self):
+
+        res_df = run_eval(self.df)
+        blocked = res_df.with_columns(self.df["label"], self.df["timestamp"].alias("t"))
+
+        # the attacker is blocked from the first update on, the benign client never
+        attacker = blocked.filter(pl.col("label") == 1)
+        self.assertEqual(attacker.filter(pl.col("t") < 10_000)["is_blocked"].sum(), 0)
+        self.assertTrue((attacker.filter(pl.col("t") >= 10_000)["is_blocked"] == 1).all())
+        self.assertEqual(blocked.filter(pl.col("label") == 0)["is_blocked"].sum(), 0)
+
+    def test_idle_windows_on_tick(self):
+
+        # flows on the grid of the windows: skipping idle windows gives the same results as moving one window at a time
+        df = make_on_tick_flows()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = eval_per_tick(df, make_nirs(), 1_000)
+            res_df = eval_nirs(df, make_nirs(), update_time_ms=1_000, seed=42)
+
+        # the first attack flow (at 3s) is evaluated in the window [2s, 3s], and blocked by the update of this window
+        self.assertEqual(expected.tolist(), [0, 1, 1, 1, 1, 1, 1])
+        self.assertEqual(res_df["is_blocked"].to_list(), expected.tolist())
+
+    def test_unsorted_input(self):
+
+        expected = run_eval(self.df)
+
+        order = np.random.default_rng(0).permutation(len(self.df))
+        res_df = run_eval(self.df[order])
+
+        self.assertTrue(res_df.equals(expected[order]))
+
+    def test_online_metrics(self):
+
+        metrics = OnlineMetrics(by="src_ip")
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df = eval_nirs(self.df, make_nirs(), update_time_ms=10_000, seed=42, metrics=metrics)
+
+        windows = metrics.to_polars()
+        self.assertEqual(windows["malicious_flows"].sum() + windows["benign_flows"].sum(), len(self.df))
+        self.assertEqual(windows["malicious_blocked"].sum(), res_df.filter(self.df["label"] == 1)["is_blocked"].sum())
+        self.assertEqual(windows["benign_blocked_bytes"].sum(), 0)
+        self.assertEqual(metrics.wbr, 0)
+        self.assertAlmostEqual(metrics.cbr, res_df.filter(self.df["label"] == 1)["is_blocked"].mean())
+
+        expected = time_to_block(self.df, res_df, by="src_ip")
+        self.assertEqual(metrics.time_to_block()["time_to_block_ms"].to_list(), expected["time_to_block_ms"].to_list())
+
+    def test_online_metrics_stop_early(self):
+
+        metrics = OnlineMetrics(stop_when=lambda m: m.totals["malicious_flows"] >= 30)
+        with contextlib.redirect_stdout(io.StringIO()):
+            eval_nirs(self.df, make_nirs(), update_time_ms=10_000, seed=42, metrics=metrics)
+
+        windows = metrics.to_polars()
+        # the last row holds the flows after the last window, none of them blocked
+        self.assertEqual(windows["t_end"].null_count(), 1)
+        self.assertEqual(windows["t_end"].drop_nulls().max(), 30_000)
+
+    def test_resume_from_checkpoint(self):
+
+        expected = run_eval(self.df)
+
+        class Interrupted(Exception):
+            pass
+
+        class InterruptedNIRS(HeuristicNIRS):
+            n_windows = 0
+
+            def apply_rules(self, X):
+                # interrupted in the second burst of traffic
+                self.n_windows += 1
+                if self.n_windows == 10:
+                    raise Interrupted
+                return super().apply_rules(X)
+
+        interrupted_nirs = InterruptedNIRS(
+            max_alert_window_idle_ms=60_000,
+            max_alert_window_len_ms=600_000,
+            benign_traffic_window_len_ms=600_000,
+            max_rules=10,
+            frac_benign_tolerance=0.1,
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir, contextlib.redirect_stdout(io.StringIO()) as stdout:
+            with self.assertRaises(Interrupted):
+                eval_nirs(self.df, interrupted_nirs, update_time_ms=10_000, seed=42, checkpoint_dir=tmpdir, checkpoint_every=2)
+
+            res_df = eval_nirs(self.df, make_nirs(), update_time_ms=10_000, seed=42, checkpoint_dir=tmpdir, checkpoint_every=2)
+
+        self.assertIn("Resuming from checkpoint", stdout.getvalue())
+        self.assertTrue(res_df.equals(expected))
+
+    def test_replay_without_latency(self):
+
+        expected = run_eval(self.df)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df, updates_df = eval_nirs_replay(self.df, make_nirs(), update_time_ms=10_000, seed=42, speed=0)
+
+        self.assertTrue(res_df.equals(expected))
+        self.assertTrue((updates_df["t_active"] == updates_df["t_update"]).all())
+
+    def test_replay_idle_windows_on_tick(self):
+
+        df = make_on_tick_flows()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = eval_per_tick(df, make_nirs(), 1_000)
+            res_df, _ = eval_nirs_replay(df, make_nirs(), update_time_ms=1_000, seed=42, speed=0)
+
+        self.assertEqual(res_df["is_blocked"].to_list(), expected.tolist())
+
+    def test_replay_memory_tracker(self):
+
+        tracker = MemoryTracker()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, updates_df = eval_nirs_replay(self.df, make_nirs(), update_time_ms=10_000, seed=42, speed=0, memory_tracker=tracker)
+
+        # one record per update
+        self.assertEqual(tracker.to_polars()["iteration"].to_list(), updates_df["iteration"].to_list())
+
+    def test_replay_online_metrics(self):
+
+        metrics = OnlineMetrics(by="src_ip")
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df, _ = eval_nirs_replay(self.df, make_nirs(), update_time_ms=10_000, seed=42, speed=0, metrics=metrics)
+
+        windows = metrics.to_polars()
+        self.assertEqual(windows["malicious_flows"].sum() + windows["benign_flows"].sum(), len(self.df))
+        self.assertAlmostEqual(metrics.cbr, res_df.filter(self.df["label"] == 1)["is_blocked"].mean())
+
+        expected = time_to_block(self.df, res_df, by="src_ip")
+        self.assertEqual(metrics.time_to_block()["time_to_block_ms"].to_list(), expected["time_to_block_ms"].to_list())
+
+    def test_replay_realtime_requires_speed(self):
+
+        with self.assertRaises(ValueError):
+            eval_nirs_replay(self.df, make_nirs(), update_time_ms=10_000, speed=0, realtime=True)
+
+    def test_replay_with_latency(self):
+
+        class SlowNIRS(HeuristicNIRS):
+            def update(self, df):
+                time.sleep(0.05)
+                super().update(df)
+
+        nirs = SlowNIRS(
+            max_alert_window_idle_ms=60_000,
+            max_alert_window_len_ms=600_000,
+            benign_traffic_window_len_ms=600_000,
+            max_rules=10,
+            frac_benign_tolerance=0.1,
+        )
+
+        # 50ms of wall time are 25s of trace time
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df, updates_df = eval_nirs_replay(self.df, nirs, update_time_ms=10_000, seed=42, speed=500)
+
+        t_active = updates_df["t_active"][0]
+        self.assertGreaterEqual(t_active - updates_df["t_update"][0], 25_000)
+
+        ttb = time_to_block(self.df.with_columns(type=pl.lit("Scan")), res_df)
+        self.assertEqual(ttb["n_flows"].to_list(), [120])
+        # the attacker is blocked from the first flow after the activation of the rule
+        self.assertEqual(ttb["t_first_blocked"][0], -(-t_active // 1_000) * 1_000)
+        self.assertGreater(ttb["time_to_block_ms"][0], 10_000 + 25_000)
+
+    def test_streaming(self):
+
+        expected = run_eval(self.df)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for source, output in [("flows.csv", "res.csv"), ("flows.parquet", "res.parquet")]:
+                source, output = os.path.join(tmpdir, source), os.path.join(tmpdir, output)
+                if source.endswith(".csv"):
+                    self.df.write_csv(source)
+                else:
+                    self.df.write_parquet(source)
+
+                # small batches, so that windows span several batches
+                with contextlib.redirect_stdout(io.StringIO()):
+                    n = eval_nirs_streaming(source, make_nirs(), output, update_time_ms=10_000, seed=42, batch_size=7)
+
+                res_df = pl.read_csv(output) if output.endswith(".csv") else pl.read_parquet(output)
+                self.assertEqual(n, len(self.df))
+                self.assertTrue(res_df.equals(expected))
+
+    def test_streaming_idle_windows_on_tick(self):
+
+        df = make_on_tick_flows()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = eval_per_tick(df, make_nirs(), 1_000)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source, output = os.path.join(tmpdir, "flows.csv"), os.path.join(tmpdir, "res.csv")
+            df.write_csv(source)
+            with contextlib.redirect_stdout(io.StringIO()):
+                eval_nirs_streaming(source, make_nirs(), output, update_time_ms=1_000, seed=42, batch_size=2)
+
+            self.assertEqual(pl.read_csv(output)["is_blocked"].to_list(), expected.tolist())
+
+    def test_streaming_write_flows(self):
+
+        expected = run_eval(self.df)
+
+        # flows without the alerts of the NIDS and the inter_subnet column
+        flows = self.df.drop("inter_subnet", "is_alert")
+        metrics = OnlineMetrics(by="src_ip")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source, output = os.path.join(tmpdir, "flows.parquet"), os.path.join(tmpdir, "res.csv")
+            write_flows(flows, source, is_alert=self.df["is_alert"])
+            self.assertEqual(pl.read_parquet(source)["inter_subnet"].to_list(), self.df["inter_subnet"].to_list())
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                eval_nirs_streaming(source, make_nirs(), output, update_time_ms=10_000, seed=42, batch_size=7, metrics=metrics)
+
+            self.assertTrue(pl.read_csv(output).equals(expected))
+
+        # the labels are kept for the online metrics
+        self.assertAlmostEqual(metrics.cbr, expected.filter(self.df["label"] == 1)["is_blocked"].mean())
+
+        with self.assertRaises(ValueError):
+            write_flows(flows, os.path.join(tmpdir, "flows.csv"))
+
+    def test_streaming_unsorted_input(self):
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source = os.path.join(tmpdir, "flows.csv")
+            self.df.reverse().write_csv(source)
+
+            with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(ValueError):
+                eval_nirs_streaming(source, make_nirs(), os.path.join(tmpdir, "res.csv"), update_time_ms=10_000)
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,215 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import unittest
+
+import numpy as np
+import polars as pl
+
+from nirs import HeuristicNIRS
+from nirs.iptables import IptablesRule, Ruleset
+from nirs.iptables.match import with_ip_int_columns
+from nirs.nirs.heuristic import _pair_counts, _prefix_counts, _score_candidates, _update_ruleset
+
+
+def make_flows(rng: np.random.Generator, n: int, t0: int) -> pl.DataFrame:
+    return pl.DataFrame({
+        "timestamp": t0 + np.sort(rng.integers(0, 10_000, size=n)),
+        "src_ip": [f"10.0.{i // 8}.{i % 8}" for i in rng.integers(0, 32, size=n)],
+        "src_port": np.full(n, 1234),
+        "dst_ip": [f"10.0.{i // 8}.{i % 8}" for i in rng.integers(0, 32, size=n)],
+        "dst_port": np.full(n, 80),
+        "src_data": rng.integers(0, 2, size=n) * 100,
+        "dst_data": rng.integers(0, 2, size=n) * 100,
+        "protocol": ["tcp"] * n,
+        "is_alert": rng.integers(0, 2, size=n),
+    })
+
+
+def value_counts(df: pl.DataFrame, nirs: HeuristicNIRS) -> tuple[dict, dict, dict, int]:
+    df = with_ip_int_columns(df).filter(~nirs.ruleset.compile().expr)
+    counts = pl.concat([df["src_ip"], df["dst_ip"]]).value_counts()
+    pair_counts = _pair_counts(df)
+    network_counts = _prefix_counts(pair_counts, nirs.prefix_lengths)
+    return (
+        dict(zip(counts["src_ip"].to_list(), counts["count"].to_list())),
+        {(src_ip, dst_ip): n for src_ip, dst_ip, _, _, n in pair_counts.iter_rows()},
+        dict(zip(network_counts["ip"].to_list(), network_counts["count"].to_list())),
+        len(df),
+    )
+
+
+class TestIpFrequencies(unittest.TestCase):
+
+    def test_same_as_value_counts(self):
+
+        rng = np.random.default_rng(0)
+        nirs = HeuristicNIRS(20_000, 30_000, 30_000, max_rules=3, compact_ruleset=True, prefix_lengths=(32, 30, 24))
+
+        for i in range(30):
+            nirs.update(make_flows(rng, 50, i * 10_000))
+            if i == 20:
+                # rules that are not produced by the heuristic are also taken into account
+                nirs.ruleset.add(IptablesRule("-A FORWARD -s 10.0.1.0/24 -j DROP"))
+
+            for frequencies, window in [
+                (nirs.alert_frequencies, nirs.alert_window),
+                (nirs.benign_frequencies, nirs.benign_window),
+            ]:
+                self.assertTrue(frequencies.sync(nirs.ruleset))
+                counts, pair_counts, network_counts, n_flows = value_counts(window, nirs)
+                self.assertEqual(frequencies.counts, counts)
+                self.assertEqual(frequencies.pair_counts, pair_counts)
+                self.assertEqual(frequencies.network_counts, network_counts)
+                self.assertEqual(frequencies.n_flows, n_flows)
+
+        self.assertGreater(len(nirs.ruleset), 0)
+
+    def test_other_rules(self):
+
+        nirs = HeuristicNIRS(20_000, 30_000, 30_000, max_rules=3)
+        nirs.ruleset.add(IptablesRule("-A FORWARD -d 10.0.3.0/24 -j DROP"))
+        self.assertFalse(nirs.alert_frequencies.sync(nirs.ruleset))
+
+        # the rules are then selected from the windows
+        nirs.update(make_flows(np.random.default_rng(0), 50, 0))
+        self.assertEqual(len(nirs.ruleset), 2)
+
+
+class TestScoreCandidates(unittest.TestCase):
+
+    def test_top_k(self):
+
+        alert_ip_counts = pl.DataFrame({
+            "ip": ["10.0.0.3", "10.0.0.1", "10.0.0.2", "10.0.0.4"],
+            "prefix_len": 32,
+            "network": pl.Series([0x0A000003, 0x0A000001, 0x0A000002, 0x0A000004], dtype=pl.UInt32),
+            "count": [5, 5, 9, 1],
+        })
+        benign_ip_counts = pl.DataFrame({
+            "ip": ["10.0.0.2", "10.0.0.3"],
+            "prefix_len": 32,
+            "network": pl.Series([0x0A000002, 0x0A000003], dtype=pl.UInt32),
+            "count": [20, 10],
+        })
+
+        # 10.0.0.2 is in more than 10% of the 100 benign flows
+        candidates = _score_candidates(alert_ip_counts, benign_ip_counts, 100, 0.1, top_k=3)
+        self.assertEqual(candidates["ip"].to_list(), ["10.0.0.1", "10.0.0.3", "10.0.0.4"])
+        self.assertEqual(candidates["n_benign"].to_list(), [0, 10, 0])
+
+        candidates = _score_candidates(alert_ip_counts, benign_ip_counts, 1000, 0.1, top_k=1)
+        self.assertEqual(candidates["ip"].to_list(), ["10.0.0.2"])
+
+    def test_rules_per_update(self):
+
+        df = make_flows(np.random.default_rng(0), 50, 0).with_columns(is_alert=pl.lit(1))
+
+        nirs = HeuristicNIRS(20_000, 30_000, 30_000, max_rules=10, top_k=3)
+        nirs.update(df)
+        self.assertEqual(len(nirs.ruleset), 3)
+
+        # same rules as with the counts of the windows
+        ruleset = _update_ruleset(Ruleset(), nirs.alert_window, nirs.benign_window, 10, top_k=3)
+        self.assertEqual([str(rule) for rule in ruleset], [str(rule) for rule in nirs.ruleset])
+
+    def test_prefix_counts(self):
+
+        pair_counts = _pair_counts(with_ip_int_columns(pl.DataFrame({
+            "src_ip": ["10.0.1.5", "10.0.1.7", "10.0.2.1", "::1"],
+            "dst_ip": ["10.1.0.1"] * 4,
+        })))
+        counts = _prefix_counts(pair_counts, (32, 24, 16)).sort("prefix_len", "ip")
+        self.assertEqual(
+            counts.drop("network").rows(),
+            [
+                ("10.0.0.0/16", 16, 3), ("10.1.0.0/16", 16, 4),
+                ("10.0.1.0/24", 24, 2), ("10.0.2.0/24", 24, 1), ("10.1.0.0/24", 24, 4),
+                ("10.0.1.5", 32, 1), ("10.0.1.7", 32, 1), ("10.0.2.1", 32, 1), ("10.1.0.1", 32, 4), ("::1", 32, 1),
+            ],
+        )
+
+    def test_intra_prefix_flows(self):
+
+        # flows inside 10.0.1.0/24 count once for the network (and for 10.0.0.0/16), not once per IP
+        pair_counts = _pair_counts(with_ip_int_columns(pl.DataFrame({
+            "src_ip": ["10.0.1.5", "10.0.1.5", "10.0.1.7", "10.0.1.9"],
+            "dst_ip": ["10.0.1.7", "10.0.1.5", "10.0.2.1", "10.1.0.1"],
+        })))
+        counts = _prefix_counts(pair_counts, (32, 24, 16))
+        counts = dict(zip(counts["ip"].to_list(), counts["count"].to_list()))
+        self.assertEqual(counts["10.0.1.0/24"], 4)
+        self.assertEqual(counts["10.0.0.0/16"], 4)
+        self.assertEqual(counts["10.0.2.0/24"], 1)
+        self.assertEqual(counts["10.0.1.5"], 2)
+        self.assertEqual(counts["10.0.1.7"], 2)
+
+    def test_most_specific_prefix(self):
+
+        # 10.0.1.0/24 covers a single alert more than 10.0.1.5: the host is proposed
+        alerts = with_ip_int_columns(pl.DataFrame({
+            "src_ip": ["10.0.1.5"] * 20 + ["10.0.1.6"],
+            "dst_ip": ["10.1.0.1"] * 21,
+        }))
+        # (the server also receives benign traffic)
+        benign = with_ip_int_columns(pl.DataFrame({"src_ip": ["10.2.0.1"] * 10, "dst_ip": ["10.1.0.1"] * 10}))
+        candidates = _score_candidates(
+            _prefix_counts(_pair_counts(alerts), (32, 24, 16)),
+            _prefix_counts(_pair_counts(benign), (32, 24, 16)),
+            len(benign),
+            0.1,
+        )
+        self.assertEqual(candidates["ip"].to_list(), ["10.0.1.5"])
+
+        # a distributed scan from 10.0.1.0/24 covers materially more alerts than any of its hosts
+        alerts = with_ip_int_columns(pl.DataFrame({
+            "src_ip": [f"10.0.1.{i}" for i in range(20)],
+            "dst_ip": ["10.1.0.1"] * 20,
+        }))
+        candidates = _score_candidates(
+            _prefix_counts(_pair_counts(alerts), (32, 24, 16)),
+            _prefix_counts(_pair_counts(benign), (32, 24, 16)),
+            len(benign),
+            0.1,
+        )
+        self.assertEqual(candidates["ip"].to_list(), ["10.0.1.0/24"])
+
+    def test_subnet_rules(self):
+
+        # distributed scan from 10.0.1.0/24, while 10.0.2.0/24 also sends benign traffic
+        n = 40
+        df = pl.DataFrame({
+            "timestamp": np.arange(2 * n),
+            "src_ip": [f"10.0.1.{i}" for i in range(n)] + [f"10.0.2.{i % 2}" for i in range(n)],
+            "src_port": np.full(2 * n, 1234),
+            "dst_ip": ["10.1.0.1"] * (2 * n),
+            "dst_port": np.full(2 * n, 80),
+            "src_data": np.full(2 * n, 100),
+            "dst_data": np.full(2 * n, 100),
+            "protocol": ["tcp"] * (2 * n),
+            "is_alert": [1] * (n + 2) + [0] * (n - 2),
+        })
+
+        nirs = HeuristicNIRS(20_000, 30_000, 30_000, max_rules=10, frac_benign_tolerance=0.5, prefix_lengths=(32, 24, 16))
+        # (the benign window only keeps flows once an alert has been seen)
+        df = with_ip_int_columns(df)
+        nirs.ingest_alert_df(df.filter(pl.col("is_alert") == 1))
+        nirs.ingest_benign_df(df.filter(pl.col("is_alert") == 0))
+        nirs.ruleset = nirs.update_ruleset(nirs.ruleset, nirs.alert_window, nirs.benign_window, nirs.max_rules)
+        # 10.1.0.1 and 10.0.0.0/16 cover more alerts, but too many benign flows
+        self.assertEqual([str(rule) for rule in nirs.ruleset], ["-A FORWARD -s 10.0.1.0/24 -j DROP"])
+
+        with self.assertRaises(ValueError):
+            HeuristicNIRS(20_000, 30_000, 30_000, max_rules=10, prefix_lengths=(33,))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,9 +15,11 @@ import unittest
 import polars as pl
 
 from nirs.iptables.parser import parse_iptables_rule
-from nirs.iptables.match import match_rule_df
+from nirs.iptables.match import match_rule_df, ip_to_uint32
 
 from nirs.iptables.rule import IptablesRule
+from nirs.iptables.compiled import CompiledRuleset
+from nirs.iptables.counters import RuleCounters
 
 
 class TestMatchRule(unittest.TestCase):
@@ -109,6 +111,67 @@ class TestMatchRule(unittest.TestCase):
             result = rule.match_df(self.X).tolist()
             self.assertEqual(result, expected)
 
+    def test_match_any_netmask(self):
+
+        test_cases = [
+            ("-A FORWARD -s 0.0.0.0/0 -j DROP", [0, 1, 2, 3]),
+            ("-A FORWARD -s 0.0.0.0/5 -j DROP", [0, 1]),
+            ("-A FORWARD -s 172.16.0.0/12 -j DROP", [2, 3]),
+            ("-A FORWARD -s 172.16.0.2/31 -j DROP", [2, 3]),
+            ("-A FORWARD -s 172.16.0.3 -j DROP", [3]),
+            ("-A FORWARD -d 172.16.0.0/30 -p tcp --dport 22 -j DROP", [2, 3]),
+            ("-A FORWARD -s 172.17.0.0/16 -j DROP", []),
+        ]
+
+        for rule_str, expected in test_cases:
+            result = match_rule_df(self.X, parse_iptables_rule(rule_str)).tolist()
+            self.assertEqual(result, expected, rule_str)
+
+    def test_lazy_filter(self):
+
+        rule = IptablesRule(self.rules_str[1])
+        self.assertIs(rule.expr, rule.expr)
+
+        query = rule.filter(self.X.lazy()).filter(pl.col("timestamp") > 3)
+        self.assertIsInstance(query, pl.LazyFrame)
+        self.assertEqual(query.collect()["idx"].to_list(), [3])
+
+    def test_compiled_ruleset(self):
+
+        rules = [parse_iptables_rule(rule_str) for rule_str in self.rules_str]
+        mask, first_rule = CompiledRuleset(rules).evaluate(self.X)
+        self.assertEqual(mask.tolist(), [False, False, True, True])
+        self.assertEqual(first_rule.tolist(), [-1, -1, 0, 1])
+
+        mask, first_rule = CompiledRuleset([]).evaluate(self.X)
+        self.assertEqual(mask.tolist(), [False] * 4)
+        self.assertEqual(first_rule.tolist(), [-1] * 4)
+
+    def test_rule_counters(self):
+
+        rules = tuple(IptablesRule(rule_str) for rule_str in self.rules_str + ["-A FORWARD -s 8.8.8.8 -j DROP"])
+        _, first_rule = CompiledRuleset([rule.get_rule_dict() for rule in rules]).evaluate(self.X)
+
+        counters = RuleCounters()
+        counters.record(rules, self.X, first_rule)
+        counters.record(rules, self.X.head(3), first_rule[:3])
+
+        totals = counters.totals()
+        self.assertEqual(totals["flows"].to_list(), [2, 1, 0])
+        self.assertEqual(totals["src_data"].to_list(), [10, 7, 0])
+        self.assertEqual(totals["dst_data"].to_list(), [12, 8, 0])
+        self.assertEqual(counters.to_polars()["window"].unique().to_list(), [0, 1])
+
+    def test_ip_to_uint32(self):
+
+        X = pl.DataFrame({"ip": ["0.0.0.0", "10.2.0.4", "255.255.255.255", "1.2.3.256", "ff00::1", "1.2.3.4.5", "1.2.3", None]})
+        result = X.select(ip_to_uint32("ip"))["ip"].to_list()
+        self.assertEqual(result, [0, 167903236, 4294967295, None, None, None, None, None])
+
+        # an address with extra fields does not match the network of its first four fields
+        X = pl.DataFrame({"src_ip": ["1.2.3.4.5", "1.2.3.4"], "dst_ip": ["10.0.0.1"] * 2, "src_data": [100] * 2, "dst_data": [0] * 2, "idx": [0, 1]})
+        self.assertEqual(match_rule_df(X, parse_iptables_rule("-A FORWARD -s 1.2.3.0/24 -j DROP")).tolist(), [1])
+
 
 
 if __name__ == "__main__":
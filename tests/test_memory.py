@@ -0,0 +1,94 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import contextlib
+import io
+import unittest
+
+import numpy as np
+import polars as pl
+
+from nirs import WindowNIRS
+from nirs.eval import eval_nirs
+from nirs.memory import MemoryTracker, keep_tail_bytes, peak_rss_bytes
+
+
+def make_flows(n: int, t0: int, is_alert: int) -> pl.DataFrame:
+    return pl.DataFrame({
+        "timestamp": np.arange(t0, t0 + n),
+        "src_ip": [f"10.0.{i % 256}.{i % 200}" for i in range(n)],
+        "src_port": np.full(n, 1234),
+        "dst_ip": ["10.0.2.1"] * n,
+        "dst_port": np.full(n, 80),
+        "src_data": np.full(n, 100),
+        "dst_data": np.full(n, 100),
+        "protocol": ["tcp"] * n,
+        "inter_subnet": [True] * n,
+        "is_alert": np.full(n, is_alert),
+    })
+
+
+class TestMemory(unittest.TestCase):
+
+    def test_keep_tail_bytes(self):
+
+        df = make_flows(1000, 0, 0)
+        budget = df.estimated_size() // 3
+
+        trimmed = keep_tail_bytes(df, budget)
+        self.assertLessEqual(trimmed.estimated_size(), budget)
+        self.assertGreater(len(trimmed), 250)
+        self.assertTrue(trimmed.equals(df.tail(len(trimmed))))
+
+        self.assertEqual(len(keep_tail_bytes(df, 0)), 0)
+        self.assertIs(keep_tail_bytes(df, df.estimated_size()), df)
+
+    def test_window_budget(self):
+
+        # (the benign window only keeps flows once an alert has been seen)
+        nirs = WindowNIRS(10**9, 10**9, 10**9, max_rules=10)
+        nirs.update(make_flows(1000, 0, 1))
+        alert_bytes = nirs.alert_window.estimated_size()
+        nirs.update(make_flows(1000, 1000, 0))
+        benign_bytes = nirs.benign_window.estimated_size()
+
+        nirs = WindowNIRS(10**9, 10**9, 10**9, max_rules=10, max_window_bytes=benign_bytes // 2 + alert_bytes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            nirs.update(make_flows(1000, 0, 1))
+            nirs.update(make_flows(1000, 1000, 0))
+
+        usage = nirs.memory_usage()
+        self.assertLessEqual(usage["alert_window_bytes"] + usage["benign_window_bytes"], nirs.max_window_bytes)
+        # the benign window is trimmed first, keeping its most recent flows
+        self.assertEqual(len(nirs.alert_window), 1000)
+        self.assertEqual(nirs.benign_window["timestamp"].max(), 1999)
+        self.assertGreater(len(nirs.benign_window), 400)
+        self.assertEqual(nirs.n_trimmed_flows, 1000 - len(nirs.benign_window))
+
+    def test_memory_tracker(self):
+
+        df = pl.concat([make_flows(100, 0, 0), make_flows(100, 100, 1)])
+        tracker = MemoryTracker()
+        with contextlib.redirect_stdout(io.StringIO()):
+            eval_nirs(df, WindowNIRS(10**9, 10**9, 10**9, max_rules=10), update_time_ms=50, memory_tracker=tracker)
+
+        records = tracker.to_polars()
+        self.assertGreater(len(records), 0)
+        self.assertEqual(
+            set(records.columns),
+            {"iteration", "ruleset_bytes", "alert_window_bytes", "benign_window_bytes", "eval_frame_bytes", "peak_rss_bytes"},
+        )
+        self.assertTrue((records["peak_rss_bytes"] <= peak_rss_bytes()).all())
+
+
+if __name__ == "__main__":
+
+    unittest.main()
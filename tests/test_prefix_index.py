@@ -0,0 +1,107 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import unittest
+
+import numpy as np
+import polars as pl
+
+from nirs.iptables.parser import parse_iptables_rule
+from nirs.iptables.compiled import CompiledRuleset
+from nirs.iptables.match import with_ip_int_columns
+from nirs.iptables.prefix_index import PrefixIndex
+
+
+def random_rules(rng: np.random.Generator, n: int) -> list[dict]:
+    rules = []
+    for _ in range(n):
+        ip = f"10.{rng.integers(0, 4)}.{rng.integers(0, 4)}.{rng.integers(0, 8)}"
+        prefix = rng.choice([32, 31, 30, 29, 24, 20, 16])
+        protocol = rng.choice(["tcp", "udp", "icmp"])
+        match rng.integers(0, 6):
+            case 0:
+                rule_str = f"-A FORWARD -s {ip}/{prefix} -j DROP"
+            case 1:
+                rule_str = f"-A FORWARD -s {ip}/{prefix} -p {protocol} -j DROP"
+            case 2:
+                rule_str = f"-A FORWARD -d {ip}/{prefix} -j DROP"
+            case 3:
+                rule_str = f"-A FORWARD -d {ip}/{prefix} -p {protocol} -j DROP"
+            case 4:
+                rule_str = f"-A FORWARD -d {ip}/{prefix} -p tcp --dport {rng.choice([22, 80])} -j DROP"
+            case _:
+                rule_str = f"-A FORWARD -s {ip} -d 10.0.0.0/{prefix} -p {protocol} -j DROP"
+        rules.append(parse_iptables_rule(rule_str))
+    return rules
+
+
+def random_flows(rng: np.random.Generator, n: int) -> pl.DataFrame:
+    def ip():
+        return [f"10.{a}.{b}.{c}" for a, b, c in rng.integers(0, [4, 4, 8], size=(n, 3))]
+
+    src_ip = ip()
+    src_ip[0] = "ff00::1"  # IPv6 flows never match IPv4 networks
+    return pl.DataFrame({
+        "idx": np.arange(n),
+        "src_ip": src_ip,
+        "dst_ip": ip(),
+        "src_port": rng.choice([22, 80, 1000], n),
+        "dst_port": pl.Series(rng.choice([22, 80, 1000], n)).set(pl.Series(rng.random(n) < 0.05), None),
+        "protocol": rng.choice(["tcp", "udp", "icmp", "hopopt"], n),
+        "src_data": rng.integers(0, 2, n),
+        "dst_data": rng.integers(0, 2, n),
+    })
+
+
+class TestPrefixIndex(unittest.TestCase):
+
+    def test_same_as_expression(self):
+
+        rng = np.random.default_rng(0)
+        X = random_flows(rng, 2000)
+
+        for n_rules in [1, 10, 200]:
+            rules = random_rules(rng, n_rules)
+            expected_mask, expected_first = CompiledRuleset(rules, index_min_rules=n_rules + 1).evaluate(X)
+            mask, first_rule = PrefixIndex(rules).evaluate(X)
+
+            np.testing.assert_array_equal(mask, expected_mask)
+            np.testing.assert_array_equal(first_rule, expected_first)
+
+    def test_not_blocked(self):
+
+        rng = np.random.default_rng(2)
+        X = random_flows(rng, 2000)
+
+        for n_rules in [0, 10, 200]:
+            compiled = CompiledRuleset(random_rules(rng, n_rules))
+            self.assertEqual(compiled.index is not None, n_rules >= 64)
+            expected = X.filter(~with_ip_int_columns(X).with_columns(compiled.expr)["is_blocked"])
+            self.assertTrue(compiled.not_blocked(X).equals(expected))
+
+    def test_fallback_rules(self):
+
+        X = random_flows(np.random.default_rng(1), 100)
+        rules = [
+            parse_iptables_rule("-A FORWARD -s 10.1.0.0/16 -d 10.2.0.0/16 -j DROP"),
+            parse_iptables_rule("-A FORWARD -j DROP"),
+        ]
+        index = PrefixIndex(rules)
+        self.assertEqual(index.fallback_positions, [0, 1])
+
+        mask, first_rule = index.evaluate(X)
+        self.assertTrue(mask.all())
+        self.assertTrue(set(first_rule.tolist()) <= {0, 1})
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from nirs.profiling import StageTimer
+
+
+class TestStageTimer(unittest.TestCase):
+
+    def test_records(self):
+
+        timer = StageTimer()
+        for it in range(3):
+            timer.iteration = it
+            with timer.stage("update", n_flows=10 * it) as record:
+                with timer.stage("update_ruleset"):
+                    pass
+                record["n_rules"] = it
+
+        df = timer.to_polars()
+        self.assertEqual(len(df), 6)
+        # nested stages are recorded first, since they end first
+        self.assertEqual(df["stage"].to_list()[:2], ["update_ruleset", "update"])
+        self.assertEqual(df.filter(stage="update")["n_rules"].to_list(), [0, 1, 2])
+        self.assertEqual(df["iteration"].to_list(), [0, 0, 1, 1, 2, 2])
+        self.assertTrue((df["seconds"] >= 0).all())
+
+        summary = timer.summary()
+        self.assertEqual(summary["count"].to_list(), [3, 3])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace.jsonl")
+            timer.write_jsonl(path)
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual(records[1]["n_flows"], 0)
+
+    def test_disabled(self):
+
+        timer = StageTimer(enabled=False)
+        with timer.stage("apply_rules") as record:
+            record["n_rules"] = 1
+
+        self.assertEqual(len(timer), 0)
+        self.assertEqual(timer.to_polars().columns, ["iteration", "stage", "t_start", "seconds"])
+
+
+if __name__ == "__main__":
+
+    unittest.main()
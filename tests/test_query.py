@@ -9,10 +9,94 @@ You should have received a copy of the license along with this
 program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
 """
 
+import json
 import logging
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from nirs.ollama.query import extract_rule_from_answer
+import requests
+
+from nirs.ollama.query import OllamaClient, extract_rule_from_answer
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # keep-alive connections
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.client_ports.append(self.client_address[1])
+
+        if len(server.statuses) > 0:
+            status = server.statuses.pop(0)
+        else:
+            status = 200
+        time.sleep(server.delay_s)
+
+        content = json.dumps({"message": {"role": "assistant", "content": body["messages"][1]["content"]}}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client timed out
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOllamaClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+        self.server.client_ports = []
+        self.server.statuses = []
+        self.server.delay_s = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.address = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+
+        with OllamaClient(self.address) as client:
+            for i in range(3):
+                self.assertEqual(client.chat("model", "system", f"query {i}"), f"query {i}")
+
+        # all the queries are sent over the same connection
+        self.assertEqual(len(self.server.client_ports), 3)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+
+    def test_retries(self):
+
+        self.server.statuses = [503, 503]
+        with OllamaClient(self.address, max_retries=2, backoff_factor=0) as client:
+            self.assertEqual(client.chat("model", "system", "query"), "query")
+        self.assertEqual(len(self.server.client_ports), 3)
+
+        self.server.statuses = [503, 503]
+        with OllamaClient(self.address, max_retries=1, backoff_factor=0) as client:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                client.chat("model", "system", "query")
+
+    def test_timeout(self):
+
+        self.server.delay_s = 0.5
+        with OllamaClient(self.address, read_timeout=0.1, max_retries=0) as client:
+            with self.assertRaises(requests.exceptions.RequestException):
+                client.chat("model", "system", "query")
+
+        with OllamaClient("http://127.0.0.1:1", max_retries=1, backoff_factor=0) as client:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                client.chat("model", "system", "query")
 
 
 class TestParseRule(unittest.TestCase):
@@ -0,0 +1,63 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import unittest
+
+from nirs.iptables.rule import IptablesRule
+from nirs.iptables.ruleset import Ruleset
+
+
+class TestRuleset(unittest.TestCase):
+
+    def test_duplicates(self):
+
+        ruleset = Ruleset()
+        self.assertTrue(ruleset.add(IptablesRule("-A FORWARD -s 10.0.0.1 -j DROP")))
+        self.assertTrue(ruleset.add(IptablesRule("-A FORWARD -d 10.0.0.0/24 -j DROP")))
+
+        # equivalent spellings of rules already in the ruleset
+        self.assertFalse(ruleset.add(IptablesRule("-A FORWARD -s 10.0.0.1/32 -j DROP")))
+        self.assertFalse(ruleset.add(IptablesRule("-A FORWARD -d 10.0.0.7/24 -j DROP")))
+
+        self.assertIn(IptablesRule("-A FORWARD -s 10.0.0.1 -j DROP"), ruleset)
+        self.assertNotIn(IptablesRule("-A FORWARD -s 10.0.0.2 -j DROP"), ruleset)
+        self.assertEqual(len(ruleset), 2)
+
+    def test_trim(self):
+
+        ruleset = Ruleset(IptablesRule(f"-A FORWARD -s 10.0.0.{i} -j DROP") for i in range(5))
+        snapshot = ruleset.snapshot()
+
+        evicted = ruleset.trim(3)
+        self.assertEqual([str(rule) for rule in evicted], [str(rule) for rule in snapshot[:2]])
+        self.assertEqual([str(rule) for rule in ruleset], [str(rule) for rule in snapshot[2:]])
+
+        # snapshots are not affected by later changes
+        self.assertEqual(len(snapshot), 5)
+
+        # evicted rules can be added again
+        self.assertTrue(ruleset.add(evicted[0]))
+        self.assertEqual(str(ruleset[-1]), str(evicted[0]))
+
+    def test_compile_cache(self):
+
+        ruleset = Ruleset([IptablesRule("-A FORWARD -s 10.0.0.1 -j DROP")])
+        compiled = ruleset.compile()
+        self.assertIs(ruleset.compile(), compiled)
+
+        ruleset.add(IptablesRule("-A FORWARD -s 10.0.0.2 -j DROP"))
+        self.assertIsNot(ruleset.compile(), compiled)
+        self.assertEqual(len(ruleset.compile()), 2)
+
+
+if __name__ == "__main__":
+
+    unittest.main()
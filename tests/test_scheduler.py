@@ -0,0 +1,116 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import contextlib
+import io
+import unittest
+
+import numpy as np
+import polars as pl
+
+from nirs.memory import MemoryTracker
+from nirs.metrics import OnlineMetrics, time_to_block
+from nirs.scheduler import EventScheduler, eval_nirs_events
+
+from tests.test_eval import make_flows, make_nirs
+
+
+class TestEventScheduler(unittest.TestCase):
+
+    def setUp(self):
+        # three bursts of alerts
+        self.alerts = np.array([10, 11, 12, 30, 31, 100] + list(range(200, 211)), dtype=np.float64)
+
+    def test_alert_triggered(self):
+
+        scheduler = EventScheduler()
+        self.assertEqual(scheduler.next_update(0, self.alerts), 10)
+        self.assertEqual(scheduler.next_update(10, self.alerts), 11)
+        self.assertIsNone(scheduler.next_update(210, self.alerts))
+        self.assertEqual(scheduler.update_times, [10, 11])
+
+    def test_debounce(self):
+
+        scheduler = EventScheduler(debounce_ms=5)
+        self.assertEqual(scheduler.next_update(0, self.alerts), 17)
+        self.assertEqual(scheduler.next_update(17, self.alerts), 36)
+        self.assertEqual(scheduler.next_update(105, self.alerts), 215)
+
+        # a continuous stream of alerts is cut by max_delay_ms
+        scheduler = EventScheduler(debounce_ms=5, max_delay_ms=4)
+        self.assertEqual(scheduler.next_update(105, self.alerts), 204)
+
+    def test_min_interval(self):
+
+        scheduler = EventScheduler(min_interval_ms=50)
+        self.assertEqual(scheduler.next_update(0, self.alerts), 50)
+        self.assertEqual(scheduler.next_update(50, self.alerts), 100)
+        self.assertEqual(scheduler.next_update(100, self.alerts), 200)
+
+    def test_eval_nirs_events(self):
+
+        df = make_flows()
+        scheduler = EventScheduler(debounce_ms=500, min_interval_ms=5_000)
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df = eval_nirs_events(df, make_nirs(), scheduler, seed=42)
+
+        blocked = res_df.with_columns(df["label"])
+
+        # the attacker is blocked from the first update on (the first alert at t = 1s, plus the minimum interval)
+        self.assertEqual(scheduler.update_times[0], 5_000)
+        attacker = blocked.filter(pl.col("label") == 1)
+        self.assertEqual(attacker.filter(pl.col("timestamp") < 5_000)["is_blocked"].sum(), 0)
+        self.assertTrue((attacker.filter(pl.col("timestamp") >= 5_000)["is_blocked"] == 1).all())
+        self.assertEqual(blocked.filter(pl.col("label") == 0)["is_blocked"].sum(), 0)
+
+    def test_blocked_alerts_do_not_trigger_updates(self):
+
+        # without debounce, every alert that goes through triggers an update, but the attacker is blocked
+        # from the first update on, and its next alerts (including the second burst) do not
+        df = make_flows()
+        scheduler = EventScheduler()
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df = eval_nirs_events(df, make_nirs(), scheduler, seed=42)
+
+        self.assertEqual(scheduler.update_times, [1_000])
+        attacker = res_df.with_columns(df["label"]).filter(pl.col("label") == 1)
+        self.assertEqual(attacker["is_blocked"].sum(), len(attacker) - 1)
+
+    def test_memory_tracker(self):
+
+        df = make_flows()
+        scheduler = EventScheduler(debounce_ms=500, min_interval_ms=5_000)
+        tracker = MemoryTracker()
+        with contextlib.redirect_stdout(io.StringIO()):
+            eval_nirs_events(df, make_nirs(), scheduler, seed=42, memory_tracker=tracker)
+
+        # one record per update
+        self.assertEqual(len(tracker), len(scheduler.update_times))
+
+    def test_online_metrics(self):
+
+        df = make_flows()
+        metrics = OnlineMetrics(by="src_ip")
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df = eval_nirs_events(df, make_nirs(), EventScheduler(debounce_ms=500), seed=42, metrics=metrics)
+
+        windows = metrics.to_polars()
+        self.assertEqual(windows["malicious_flows"].sum() + windows["benign_flows"].sum(), len(df))
+        self.assertEqual(windows["malicious_blocked"].sum(), res_df.filter(df["label"] == 1)["is_blocked"].sum())
+        self.assertAlmostEqual(metrics.cbr, res_df.filter(df["label"] == 1)["is_blocked"].mean())
+
+        expected = time_to_block(df, res_df, by="src_ip")
+        self.assertEqual(metrics.time_to_block()["time_to_block_ms"].to_list(), expected["time_to_block_ms"].to_list())
+
+
+if __name__ == "__main__":
+
+    unittest.main()
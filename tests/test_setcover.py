@@ -0,0 +1,91 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import contextlib
+import io
+import unittest
+
+import numpy as np
+import polars as pl
+
+from nirs import SetCoverNIRS
+from nirs.eval import eval_nirs
+from nirs.iptables import IptablesRule
+from nirs.nirs.setcover import _bitmaps, _format_rule, _greedy_cover, _matching_rules
+from tests.test_eval import make_flows
+
+
+def make_random_flows(rng: np.random.Generator, n: int) -> pl.DataFrame:
+    ips = [f"10.0.{i // 4}.{i % 4}" for i in range(8)] + ["fe80::1"]
+    return pl.DataFrame({
+        "src_ip": rng.choice(ips, size=n),
+        "dst_ip": rng.choice(ips, size=n),
+        "src_port": rng.choice([22, 80, 1234], size=n),
+        "dst_port": rng.choice([22, 80, 1234], size=n),
+        "protocol": rng.choice(["tcp", "udp", "icmp", "unas"], size=n),
+        "src_data": rng.integers(0, 2, size=n) * 100,
+        "dst_data": rng.integers(0, 2, size=n) * 100,
+        "idx": np.arange(n),
+    })
+
+
+class TestSetCover(unittest.TestCase):
+
+    def test_matching_rules(self):
+
+        df = make_random_flows(np.random.default_rng(0), 200)
+        matches = (
+            _matching_rules(df, (32, 24, 16))
+            .with_columns(_format_rule())
+            .group_by("rule")
+            .agg(pl.col("row").sort())
+        )
+        self.assertGreater(len(matches), 50)
+
+        # same flows as the matching of the rules themselves
+        for rule_str, rows in matches.iter_rows():
+            self.assertEqual(IptablesRule(rule_str).match_df(df).tolist(), rows, rule_str)
+
+    def test_bitmaps(self):
+
+        rng = np.random.default_rng(0)
+        rows_list = [np.sort(rng.choice(100, size=k, replace=False)) for k in [0, 1, 5, 40, 100]] + [np.array([99])]
+        self.assertEqual(_bitmaps(rows_list, 100), [sum(1 << int(row) for row in rows) for rows in rows_list])
+
+    def test_greedy_cover(self):
+
+        # alerts 0-5, rule "a" covers 0-3, "b" 3-5, "c" 4-5 (with a benign flow), "d" 0-5 (with 3 benign flows)
+        alert_bitmaps = [0b001111, 0b111000, 0b110000, 0b111111]
+        benign_bitmaps = [0b000, 0b000, 0b001, 0b111]
+        rules = ["a", "b", "c", "d"]
+
+        self.assertEqual(_greedy_cover(alert_bitmaps, benign_bitmaps, [0, 0, 1, 3], rules, 1, budget=3), ["a", "b"])
+        self.assertEqual(_greedy_cover(alert_bitmaps, benign_bitmaps, [0, 0, 1, 3], rules, 3, budget=3), ["d"])
+        self.assertEqual(_greedy_cover(alert_bitmaps, benign_bitmaps, [0, 0, 1, 3], rules, 1, budget=1), ["a"])
+
+    def test_blocks_attacker(self):
+
+        nirs = SetCoverNIRS(60_000, 600_000, 600_000, max_rules=10)
+        with contextlib.redirect_stdout(io.StringIO()):
+            res_df = eval_nirs(make_flows(), nirs, update_time_ms=10_000, seed=42)
+
+        df = make_flows()
+        is_blocked = res_df["is_blocked"].to_numpy() > 0
+        is_malicious = df["label"].to_numpy() == 1
+        self.assertGreater(is_blocked[is_malicious].mean(), 0.8)
+        self.assertEqual(is_blocked[~is_malicious].mean(), 0)
+
+        for rule in nirs.ruleset:
+            self.assertIn("10.0.0.66", str(rule))
+
+
+if __name__ == "__main__":
+    unittest.main()
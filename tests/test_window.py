@@ -0,0 +1,169 @@
+"""
+Copyright (C) 2025, CEA
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the Creative Commons Attribution-NonCommercial-ShareAlike 4.0
+International License.
+
+You should have received a copy of the license along with this
+program. If not, see <https://creativecommons.org/licenses/by-nc-sa/4.0/>.
+"""
+
+import contextlib
+import io
+import math
+import unittest
+from unittest import mock
+
+import numpy as np
+import polars as pl
+
+from nirs.iptables import IptablesRule, Ruleset
+from nirs.iptables.match import with_ip_int_columns
+from nirs import window as window_module
+from nirs.window import ChunkedWindow
+
+SCHEMA = {"timestamp": pl.Int64, "src_ip": pl.Utf8}
+
+
+def make_chunk(timestamps) -> pl.DataFrame:
+    return pl.DataFrame({
+        "timestamp": timestamps,
+        "src_ip": [f"10.0.0.{t % 256}" for t in timestamps],
+        "is_alert": [0] * len(timestamps),
+    }, schema_overrides={"timestamp": pl.Int64})
+
+
+class TestChunkedWindow(unittest.TestCase):
+
+    def test_same_as_concat_and_filter(self):
+
+        rng = np.random.default_rng(0)
+        window = ChunkedWindow(SCHEMA, max_chunks=4)
+        expected = pl.DataFrame(schema=SCHEMA)
+
+        t = 0
+        for i in range(50):
+            timestamps = t + np.sort(rng.integers(0, 100, size=rng.integers(0, 20)))
+            if i % 7 == 0:
+                # chunks are not required to be sorted
+                timestamps = rng.permutation(timestamps)
+            t += 50
+
+            chunk = make_chunk(timestamps.tolist())
+            window.append(chunk)
+            expected = pl.concat([expected, chunk.select(SCHEMA.keys())])
+
+            t_threshold = t - 300
+            window.evict(t_threshold)
+            expected = expected.filter(pl.col("timestamp") > t_threshold)
+
+            self.assertTrue(window.frame().equals(expected))
+            self.assertEqual(len(window), len(expected))
+            self.assertEqual(window.t_max(), expected["timestamp"].max())
+            self.assertLessEqual(window.frame().n_chunks(), 4)
+
+        window.evict(float("inf"))
+        self.assertEqual(len(window), 0)
+        self.assertIsNone(window.t_max())
+        self.assertEqual(window.frame().schema, pl.Schema(SCHEMA))
+
+    def test_evict_keeps_recent_chunks(self):
+
+        window = ChunkedWindow(SCHEMA)
+        window.append(make_chunk([0, 1, 2]))
+        window.append(make_chunk([3, 4, 5]))
+        recent = window._chunks[-1]
+
+        window.evict(1)
+        self.assertEqual(window.frame()["timestamp"].to_list(), [2, 3, 4, 5])
+        self.assertIs(window._chunks[-1], recent)
+
+        window.replace(make_chunk([10]))
+        self.assertEqual(window.frame()["timestamp"].to_list(), [10])
+
+    def test_max_chunks(self):
+
+        with self.assertRaises(ValueError):
+            ChunkedWindow(SCHEMA, max_chunks=1)
+
+        # the smallest window merges the two most recent chunks but the new one
+        window = ChunkedWindow(SCHEMA, max_chunks=2)
+        for t in range(5):
+            window.append(make_chunk([t]))
+        self.assertEqual(window.frame()["timestamp"].to_list(), [0, 1, 2, 3, 4])
+        self.assertLessEqual(len(window._chunks), 2)
+
+    def test_merge_copies(self):
+
+        # sliding window of 500 chunks of 10 flows, stored in at most 8 chunks
+        n_chunks, chunk_size, n_window_chunks = 2_000, 10, 500
+        window = ChunkedWindow(SCHEMA, max_chunks=8)
+
+        merged_sizes = []
+        concat = pl.concat
+
+        def record_merge(frames, **kwargs):
+            merged_sizes.append(sum(df.height for df in frames))
+            return concat(frames, **kwargs)
+
+        with mock.patch.object(window_module.pl, "concat", side_effect=record_merge):
+            for i in range(n_chunks):
+                window.append(make_chunk(list(range(i * chunk_size, (i + 1) * chunk_size))))
+                window.evict((i + 1 - n_window_chunks) * chunk_size - 1)
+                self.assertLessEqual(len(window._chunks), 8)
+
+        # chunks of the same size tier are merged: a flow is copied about once per tier of the window,
+        # instead of each merge copying the previously merged chunks again
+        self.assertLessEqual(max(merged_sizes), n_window_chunks * chunk_size)
+        self.assertLessEqual(sum(merged_sizes), n_chunks * chunk_size * (math.log2(n_window_chunks) + 2))
+        self.assertEqual(window.frame()["timestamp"].to_list(), list(range((n_chunks - n_window_chunks) * chunk_size, n_chunks * chunk_size)))
+
+    def test_not_blocked(self):
+
+        rng = np.random.default_rng(0)
+        schema = {"timestamp": pl.Int64, "src_ip": pl.Utf8, "dst_ip": pl.Utf8, "dst_port": pl.Int64, "src_port": pl.Int64,
+                  "src_data": pl.Int64, "dst_data": pl.Int64, "protocol": pl.Utf8, "src_ip_int": pl.UInt32, "dst_ip_int": pl.UInt32}
+        window = ChunkedWindow(schema, max_chunks=4)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            rules = [IptablesRule(f"-A FORWARD -s 10.0.{i // 4}.{i % 4} -j DROP") for i in range(8)] + [
+                IptablesRule("-A FORWARD -d 10.0.1.0/24 -p tcp --dport 80 -j DROP"),
+                IptablesRule("-A FORWARD -j DROP"),
+            ]
+
+        ruleset = Ruleset()
+        t = 0
+        for i in range(40):
+            n = int(rng.integers(0, 20))
+            timestamps = t + np.sort(rng.integers(0, 100, size=n))
+            if i % 7 == 0:
+                timestamps = rng.permutation(timestamps)
+            t += 50
+
+            window.append(with_ip_int_columns(pl.DataFrame({
+                "timestamp": timestamps,
+                "src_ip": [f"10.0.{j // 4}.{j % 4}" for j in rng.integers(0, 8, size=n)],
+                "dst_ip": [f"10.0.{j // 4}.{j % 4}" for j in rng.integers(0, 8, size=n)],
+                "dst_port": rng.choice([22, 80], size=n),
+                "src_port": rng.choice([22, 80], size=n),
+                "src_data": rng.integers(0, 2, size=n) * 100,
+                "dst_data": rng.integers(0, 2, size=n) * 100,
+                "protocol": rng.choice(["tcp", "udp"], size=n),
+            }, schema_overrides={"timestamp": pl.Int64, "src_ip": pl.Utf8, "dst_ip": pl.Utf8, "protocol": pl.Utf8})))
+            window.evict(t - 300)
+
+            # rules are added, evicted, and compacted
+            ruleset.add(rules[int(rng.integers(0, 9))] if i != 30 else rules[-1])
+            ruleset.trim(3)
+            if i % 5 == 0:
+                ruleset.compact()
+
+            expected = window.frame().filter(~ruleset.compile().expr)
+            self.assertTrue(window.not_blocked(ruleset).equals(expected), str(ruleset))
+            # (cached)
+            self.assertIs(window.not_blocked(ruleset), window.not_blocked(ruleset))
+
+
+if __name__ == "__main__":
+    unittest.main()